@@ -0,0 +1,75 @@
+'''
+bench_arff_reader.py
+
+Compares the streaming ARFF reader (processing/arff_reader.py) with the line-by-line parsing clean_skincare_ingredients
+used before it: readlines, a re.findall plus a re.sub per field on every line, a DataFrame of strings and the storage
+schema to convert the types. The OpenML skincare ingredients file is enlarged by repeating its data rows, and both parsers
+are timed on it and checked for how many rows they keep.
+
+Usage: python -m benchmarks.bench_arff_reader [--path datasets/raw/openml_dataset_43481.csv] [--copies 1 10 100]
+
+'''
+
+import argparse
+import os
+import re
+import tempfile
+import time
+import pandas as pd
+from processing.arff_reader import iter_arff_batches
+from storage import apply_schema, schemas
+
+legacy_columns = ["Label", "Brand", "Name", "Price", "Rank", "Ingredients", "Combination", "Dry", "Normal", "Oily",
+                  "Sensitive"]
+
+def legacy_parse(path):
+    with open(path, 'r') as file:
+        lines = file.readlines()
+    data_lines = lines[lines.index('@DATA\n') + 1:]
+    cleaned_data = []
+    for line in data_lines:
+        row = re.findall(r"(?:'[^']*'|[^,]+)", line.strip())
+        row = [re.sub(r"^'|'$", '', item.strip()) for item in row]
+        cleaned_data.append(row)
+    cleaned_data = [row for row in cleaned_data if len(row) == len(legacy_columns)]
+    return apply_schema(pd.DataFrame(cleaned_data, columns=legacy_columns), schemas['skincare_ingredients'])
+
+def streaming_parse(path):
+    return pd.concat([apply_schema(batch, schemas['skincare_ingredients']) for batch in iter_arff_batches(path)],
+                     ignore_index=True)
+
+# Write a copy of the ARFF file with its data rows repeated
+def enlarge(path, copies, output_path):
+    with open(path, 'r') as file:
+        lines = file.readlines()
+    data_start = lines.index('@DATA\n') + 1
+    with open(output_path, 'w') as file:
+        file.writelines(lines[:data_start])
+        for _ in range(copies):
+            file.writelines(lines[data_start:])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--path', default='datasets/raw/openml_dataset_43481.csv')
+    parser.add_argument('--copies', type=int, nargs='*', default=[1, 10, 100])
+    args = parser.parse_args()
+
+    print(f"{'copies':>6} {'MB':>7} {'legacy rows':>11} {'legacy s':>9} {'stream rows':>11} {'stream s':>9} {'speedup':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for copies in args.copies:
+            path = os.path.join(tmp, f"skincare_{copies}.arff")
+            enlarge(args.path, copies, path)
+
+            started = time.perf_counter()
+            legacy_rows = len(legacy_parse(path))
+            legacy_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            streaming_rows = len(streaming_parse(path))
+            streaming_seconds = time.perf_counter() - started
+
+            print(f"{copies:>6} {os.path.getsize(path) / 1e6:>7.1f} {legacy_rows:>11} {legacy_seconds:>9.2f} "
+                  f"{streaming_rows:>11} {streaming_seconds:>9.2f} {legacy_seconds / streaming_seconds:>6.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+'''
+bench_catalog_memory.py
+
+Measures the private memory (RssAnon) a worker process needs to serve recommendations from the product catalog,
+building it in process memory versus attaching to the memory-mapped catalog file written by publish_catalog.
+Synthetic merged datasets of growing size are generated, and every measurement runs in a fresh child process
+that loads the catalog and answers a batch of recommendation queries. Linux only (reads /proc/self/status).
+
+Usage: python -m benchmarks.bench_catalog_memory [--rows 20000 80000 320000] [--queries 50]
+
+'''
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import numpy as np
+import pandas as pd
+from storage import write_dataset
+
+labels = ['cleanser', 'eye cream', 'face mask', 'moisturizer', 'sun protect', 'treatment']
+skin_types = ['Combination', 'Dry', 'Normal', 'Oily', 'Sensitive']
+concerns = ['Acne', 'Brightening', 'Hydration', 'Anti_Aging']
+
+# Build a merged dataset with the columns and value shapes process_and_merge_data produces
+def make_synthetic_merged(num_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    vocab = np.array([f"ingredient{i}" for i in range(2000)])
+    brands = np.array([f"brand {i}" for i in range(300)])
+    df = pd.DataFrame({
+        'Label': rng.choice(labels, num_rows),
+        'Brand': rng.choice(brands, num_rows),
+        'Name': [f"product {i}" for i in rng.integers(0, num_rows, num_rows)],
+        'Price': rng.uniform(5, 200, num_rows).round(2),
+        'Rank': rng.uniform(1, 5, num_rows).round(1),
+        'Ingredients': [", ".join(rng.choice(vocab, 40)) for _ in range(num_rows)],
+    })
+    for col in skin_types:
+        df[col] = rng.integers(0, 2, num_rows)
+    df['Brand_Name'] = df['Brand'] + " " + df['Name']
+    df['Product'] = df['Brand_Name'] + " moisturizing cream 1.7 oz"
+    df['Review Count'] = rng.integers(1, 50000, num_rows)
+    df['URL'] = [f"https://www.amazon.com/dp/B{i:09d}" for i in range(num_rows)]
+    df['Rating'] = rng.uniform(1, 5, num_rows).round(1)
+    df['SPF'] = rng.choice([0, 0, 0, 15, 30, 50], num_rows)
+    for col in concerns:
+        df[col] = rng.integers(0, 2, num_rows)
+    return df
+
+def rss_kb():
+    fields = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('RssAnon', 'RssFile'):
+                fields[key] = int(value.split()[0])
+    return fields
+
+# Child process: load the catalog one way, answer queries, and report memory as JSON
+def run_child(mode, dataset_path, catalog_path, num_queries):
+    from catalog import ProductCatalog, get_catalog, load_data
+    from recommendation import recommend_products, filter_exact_matches_by_label, recommend_sunscreens
+
+    before = rss_kb()
+    if mode == 'mapped':
+        catalog = get_catalog(dataset_path, catalog_path)
+        assert type(catalog).__name__ == 'MappedCatalog'
+    else:
+        catalog = ProductCatalog(load_data(dataset_path))
+
+    rng = random.Random(0)
+    for _ in range(num_queries):
+        product_labels = rng.sample(labels, 2)
+        skin = rng.sample(skin_types, 2)
+        selection = recommend_products(catalog, product_labels, skin, rng.choice([1, 6, 9]))
+        filter_exact_matches_by_label(selection, product_labels, skin, rng.sample(concerns, 2), [0, 100], 40)
+        recommend_sunscreens(selection, skin, [0, 100], 9)
+
+    after = rss_kb()
+    print(json.dumps({key: after[key] - before[key] for key in after}))
+
+def measure(mode, dataset_path, catalog_path, num_queries):
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.bench_catalog_memory', '--child', mode,
+                             dataset_path, catalog_path, '--queries', str(num_queries)],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='*', default=[20000, 80000, 320000])
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--child', nargs=3, metavar=('MODE', 'DATASET', 'CATALOG'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(*args.child, args.queries)
+        return
+
+    from catalog import publish_catalog
+
+    print(f"{'rows':>8} {'in-memory RssAnon':>18} {'mapped RssAnon':>15} {'mapped RssFile':>15}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for num_rows in args.rows:
+            dataset_path = os.path.join(tmp_dir, f"merged_{num_rows}.csv")
+            catalog_path = os.path.join(tmp_dir, f"catalog_{num_rows}.arrow")
+            write_dataset(make_synthetic_merged(num_rows), dataset_path, 'merged_data')
+            publish_catalog(dataset_path, catalog_path)
+
+            in_memory = measure('in-memory', dataset_path, catalog_path, args.queries)
+            mapped = measure('mapped', dataset_path, catalog_path, args.queries)
+            print(f"{num_rows:>8} {in_memory['RssAnon'] / 1024:>15.1f} MB {mapped['RssAnon'] / 1024:>12.1f} MB "
+                  f"{mapped['RssFile'] / 1024:>12.1f} MB")
+
+    print("RssAnon is private to each worker; RssFile pages of the mapped catalog are shared through the page cache.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+'''
+bench_fuzzy_matcher.py
+
+Compares the brand-blocked fuzzy matcher (processing/fuzzy_matcher.py) with the exact token-subset matcher used by
+process_and_merge_data, on synthetic skincare products and Amazon titles with known true matches.
+Titles are made from real products with the kinds of noise found in the scraped data (a vowel dropped from a name token
+as in "crme", a misspelled brand as in "lncme", accented letters, a missing name token) plus distractor titles from the
+same brands, and every matcher is scored on precision, recall (overall and per kind of noise) and runtime.
+
+Usage: python -m benchmarks.bench_fuzzy_matcher [--products 10000] [--titles 100000] [--threshold 0.8]
+
+'''
+
+import argparse
+import random
+import time
+from collections import Counter
+from processing.fuzzy_matcher import FuzzyProductMatcher
+from processing.product_matcher import build_token_index, match_token_set
+
+noise_kinds = ['exact', 'dropped vowel', 'brand typo', 'accent', 'missing token']
+noise_weights = [40, 20, 15, 10, 15]
+extra_words = ['1.7', 'oz', 'spf', '30', 'new', 'gentle', 'face', 'cream', 'serum', 'travel', 'size', 'pack']
+
+def make_word(rng):
+    consonants, vowels = 'bcdfghklmnprstvz', 'aeiou'
+    return ''.join(rng.choice(consonants) + rng.choice(vowels) for _ in range(rng.randint(2, 4)))
+
+def drop_vowel(word, rng):
+    positions = [i for i, char in enumerate(word) if char in 'aeiou']
+    if len(positions) < 2:
+        return word
+    i = rng.choice(positions)
+    return word[:i] + word[i + 1:]
+
+def make_synthetic_data(num_products, num_titles, num_brands=300, vocab_size=3000, seed=0):
+    rng = random.Random(seed)
+    vocab = [make_word(rng) for _ in range(vocab_size)]
+    brands = [' '.join(make_word(rng) for _ in range(rng.randint(1, 2))) for _ in range(num_brands)]
+    products = [(rng.choice(brands), ' '.join(rng.sample(vocab[:rng.randint(200, vocab_size)], rng.randint(2, 5))))
+                for _ in range(num_products)]
+
+    titles, truth, kinds = [], [], []
+    for _ in range(num_titles):
+        if rng.random() < 0.3:
+            # Distractor: a known brand with unrelated words
+            brand = rng.choice(brands)
+            words = brand.upper().split() + rng.sample(vocab, rng.randint(2, 4))
+            truth.append(None)
+            kinds.append('distractor')
+        else:
+            product = rng.randrange(num_products)
+            brand, name = products[product]
+            brand_words, name_words = brand.split(), name.split()
+            kind = rng.choices(noise_kinds, noise_weights)[0]
+            if kind == 'dropped vowel':
+                i = rng.randrange(len(name_words))
+                name_words[i] = drop_vowel(name_words[i], rng)
+            elif kind == 'brand typo':
+                i = rng.randrange(len(brand_words))
+                brand_words[i] = drop_vowel(brand_words[i], rng)
+            elif kind == 'accent':
+                i = rng.randrange(len(name_words))
+                name_words[i] = name_words[i].replace('e', 'é', 1) if 'e' in name_words[i] else name_words[i] + 'é'
+            elif kind == 'missing token' and len(name_words) > 2:
+                name_words.pop(rng.randrange(len(name_words)))
+            words = [word.upper() for word in brand_words] + [word.title() for word in name_words]
+            truth.append(product)
+            kinds.append(kind)
+        words += rng.sample(extra_words, 3)
+        rng.shuffle(words)
+        titles.append(' '.join(words))
+    return products, titles, truth, kinds
+
+# Current merge matcher: every token of "Brand Name" must be in the title
+def exact_match(products, titles):
+    token_index = build_token_index([set(title.lower().split()) for title in titles])
+    pairs = []
+    for product, (brand, name) in enumerate(products):
+        for title in match_token_set(set(f"{brand} {name}".lower().split()), token_index, len(titles)):
+            pairs.append((product, title))
+    return pairs
+
+def fuzzy_match(products, titles, threshold):
+    matcher = FuzzyProductMatcher(threshold=threshold)
+    found_products, found_titles, _ = matcher.match([brand for brand, _ in products], [name for _, name in products], titles)
+    return list(zip(found_products.tolist(), found_titles.tolist()))
+
+def report(name, pairs, products, truth, kinds, seconds):
+    # Products with the same brand and name are indistinguishable, so any of them counts as the true match
+    correct_pairs = [truth[title] is not None and products[product] == products[truth[title]] for product, title in pairs]
+    matched_titles = {title for (_, title), correct in zip(pairs, correct_pairs) if correct}
+
+    recall_by_kind = {}
+    for kind in noise_kinds:
+        titles = [title for title, title_kind in enumerate(kinds) if title_kind == kind]
+        recall_by_kind[kind] = sum(title in matched_titles for title in titles) / max(len(titles), 1)
+    num_true = sum(product is not None for product in truth)
+
+    precision = sum(correct_pairs) / max(len(pairs), 1)
+    recall = len(matched_titles) / max(num_true, 1)
+    print(f"{name:<7} {precision:>9.3f} {recall:>7.3f} " + ' '.join(f"{recall_by_kind[kind]:>13.3f}" for kind in noise_kinds)
+          + f" {len(pairs):>8} {seconds:>8.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--titles', type=int, default=100000)
+    parser.add_argument('--threshold', type=float, nargs='*', default=[0.7, 0.8, 0.9])
+    args = parser.parse_args()
+
+    products, titles, truth, kinds = make_synthetic_data(args.products, args.titles)
+    print(f"{args.products} products x {args.titles} titles ({dict(Counter(kinds))})")
+    print(f"{'matcher':<7} {'precision':>9} {'recall':>7} " + ' '.join(f"{kind:>13}" for kind in noise_kinds)
+          + f" {'pairs':>8} {'seconds':>8}")
+
+    start = time.perf_counter()
+    pairs = exact_match(products, titles)
+    report('exact', pairs, products, truth, kinds, time.perf_counter() - start)
+
+    for threshold in args.threshold:
+        start = time.perf_counter()
+        pairs = fuzzy_match(products, titles, threshold)
+        report(f"fz {threshold:.2f}", pairs, products, truth, kinds, time.perf_counter() - start)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+'''
+bench_import_time.py
+
+Tracks the startup import cost of the Streamlit entry point with `python -X importtime`.
+The modules main.py imports at load time are imported in a fresh interpreter (several times, keeping the fastest run),
+and the benchmark fails if their total import time exceeds the budget or if any of them pulls in a stack that should
+only load on first use (scraping, GIS, plotting, scikit-learn). Modules that are not installed here (e.g. streamlit)
+are skipped and reported.
+
+Usage: python -m benchmarks.bench_import_time [--budget-ms 1500] [--repeat 5] [--entry-point main.py]
+
+'''
+
+import argparse
+import ast
+import subprocess
+import sys
+
+# Packages that must not be imported when the app starts
+lazy_packages = ['selenium', 'bs4', 'lxml', 'tqdm', 'sklearn', 'matplotlib', 'geopandas', 'contextily', 'shapely']
+
+# Modules imported at the top level of the entry point script
+def entry_point_imports(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read(), path)
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+def importable(module):
+    result = subprocess.run([sys.executable, '-c', f"import {module}"], capture_output=True, text=True)
+    return result.returncode == 0, result.stderr.strip().splitlines()[-1] if result.returncode else ''
+
+# Parse -X importtime output into (depth, module, self us, cumulative us) rows, in the order they were printed
+def parse_importtime(stderr):
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2 - 1
+        rows.append((depth, name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+# Group the rows by top-level import: rows are printed children first, so a subtree ends at its depth-0 row
+def top_level_imports(rows):
+    groups = []
+    subtree = []
+    for depth, name, self_us, cumulative_us in rows:
+        subtree.append(name)
+        if depth == 0:
+            groups.append((name, cumulative_us, subtree))
+            subtree = []
+    return groups
+
+def run_importtime(statement):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], capture_output=True, text=True, check=True)
+    return top_level_imports(parse_importtime(result.stderr))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entry-point', default='main.py')
+    parser.add_argument('--budget-ms', type=float, default=1500.0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    modules = []
+    for module in entry_point_imports(args.entry_point):
+        ok, error = importable(module)
+        if ok:
+            modules.append(module)
+        else:
+            print(f"Skipping {module}: {error}")
+
+    # Interpreter startup imports (site, encodings, ...) are not part of the app's cost
+    startup = {name for name, _, _ in run_importtime('pass')}
+
+    best = None
+    for _ in range(args.repeat):
+        groups = [group for group in run_importtime(f"import {', '.join(modules)}") if group[0] not in startup]
+        total_us = sum(cumulative_us for _, cumulative_us, _ in groups)
+        if best is None or total_us < best[0]:
+            best = (total_us, groups)
+    total_us, groups = best
+
+    print(f"Imported {len(modules)} entry point modules: {', '.join(modules)}")
+    print(f"\nHeaviest top-level imports (fastest of {args.repeat} runs):")
+    for name, cumulative_us, _ in sorted(groups, key=lambda group: -group[1])[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    loaded = sorted({name.split('.')[0] for _, _, subtree in groups for name in subtree} & set(lazy_packages))
+    print(f"\nTotal import time: {total_us / 1000:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    failures = []
+    if total_us / 1000 > args.budget_ms:
+        failures.append("startup import time is over budget")
+    if loaded:
+        failures.append(f"lazily loaded packages imported at startup: {', '.join(loaded)}")
+    if failures:
+        raise SystemExit("FAIL: " + "; ".join(failures))
+    print("OK: within budget and no lazily loaded packages imported at startup")
+
+if __name__ == "__main__":
+    main()
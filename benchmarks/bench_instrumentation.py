@@ -0,0 +1,76 @@
+'''
+bench_instrumentation.py
+
+Measures what the instrumentation spans (instrumentation.py) cost: the time one span adds to a call that does nothing,
+and the time of a full recommendation request (recommend_products, filter_exact_matches_by_label and
+recommend_sunscreens, each run in its span) with the spans turned on and off. The catalog comes from synthetic cleaned
+datasets merged with bench_parallel_merge's generator, and the metrics file (SKINWIZ_METRICS_FILE=1) is written to a
+temporary directory.
+
+Usage: python -m benchmarks.bench_instrumentation [--products 5000] [--titles 50000] [--requests 2000]
+
+'''
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+import instrumentation
+from benchmarks.bench_parallel_merge import write_synthetic_datasets
+from config import merged_dataset_path
+from processing.process_data import process_and_merge_data
+from recommendation import get_catalog, recommend_products, filter_exact_matches_by_label, recommend_sunscreens
+
+def time_calls(function, calls):
+    started = time.perf_counter()
+    for i in range(calls):
+        function(i)
+    return (time.perf_counter() - started) / calls
+
+def time_requests(catalog, labels, requests):
+    started = time.perf_counter()
+    for i in range(requests):
+        uv_index_max = i % 12
+        recommended = recommend_products(catalog, labels, ['Dry', 'Oily'], uv_index_max)
+        filter_exact_matches_by_label(recommended, labels, ['Dry', 'Oily'], ['Hydration'], (0, 150), 25)
+        recommend_sunscreens(recommended, ['Dry', 'Oily'], (0, 150), uv_index_max)
+    return (time.perf_counter() - started) / requests
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--titles', type=int, default=50000)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            write_synthetic_datasets(args.products, args.titles)
+            # The merge reports its progress on stdout and stderr
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                process_and_merge_data()
+            catalog = get_catalog(merged_dataset_path)
+            labels = catalog.labels[:3]
+
+            bare = time_calls(lambda i: i, args.requests * 10)
+            spanned = time_calls(instrumentation.instrumented('bench_noop')(lambda i: i), args.requests * 10)
+            print(f"empty call: {bare * 1e6:.2f} us, in a span: {spanned * 1e6:.2f} us "
+                  f"(+{(spanned - bare) * 1e6:.2f} us per span)")
+
+            timings = {}
+            for enabled in (False, True):
+                instrumentation.instrumentation_enabled = enabled
+                time_requests(catalog, labels, 50)  # Warm up
+                timings[enabled] = time_requests(catalog, labels, args.requests)
+            print(f"request over {len(catalog)} products: {timings[False] * 1e3:.3f} ms without spans, "
+                  f"{timings[True] * 1e3:.3f} ms with spans ({timings[True] / timings[False] - 1:+.1%})")
+        finally:
+            instrumentation.flush_metrics()
+            os.chdir(cwd)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+'''
+bench_parallel_merge.py
+
+Times process_and_merge_data with growing numbers of worker processes on synthetic cleaned datasets, and checks that
+every run writes a merged dataset byte-identical to the serial run. The skincare products and Amazon titles come from
+bench_fuzzy_matcher's generator, with ingredient lists that mention the concern ingredients and SPF values in the names.
+Speedups are bounded by the cores of the machine (reported) and by the parts of the merge that stay serial: loading,
+tokenizing, combining the matched rows, deduplicating and writing.
+
+Usage: python -m benchmarks.bench_parallel_merge [--products 20000] [--titles 200000] [--workers 1 2 4 8 16]
+
+'''
+
+import argparse
+import contextlib
+import hashlib
+import io
+import os
+import random
+import tempfile
+import time
+import pandas as pd
+from benchmarks.bench_fuzzy_matcher import make_synthetic_data
+from config import cleaned_dataset_folder_path, merged_dataset_path
+from processing.process_data import process_and_merge_data, load_concern_rules
+from storage import write_dataset, resolve_path
+
+labels = ['Cleanser', 'Eye cream', 'Face Mask', 'Moisturizer', 'Sun protect', 'Treatment']
+filler_ingredients = [f"ingredient {i}" for i in range(500)]
+
+# Write cleaned skincare, Amazon and banned ingredient datasets into the current directory
+def write_synthetic_datasets(num_products, num_titles, seed=0):
+    rng = random.Random(seed)
+    products, titles, _, _ = make_synthetic_data(num_products, num_titles, seed=seed)
+    concern_ingredients = sorted({ingredient for group in load_concern_rules().values() for ingredient in group})
+
+    skincare = pd.DataFrame({
+        'Label': [rng.choice(labels) for _ in products],
+        'Brand': [brand for brand, _ in products],
+        'Name': [name + (f" spf {rng.choice([15, 30, 50])}" if rng.random() < 0.1 else '') for _, name in products],
+        'Price': [rng.randint(5, 200) for _ in products],
+        'Rank': [round(rng.uniform(1, 5), 1) for _ in products],
+        'Ingredients': [', '.join(rng.sample(filler_ingredients, 20) + rng.sample(concern_ingredients, rng.randint(0, 3)))
+                        for _ in products],
+        **{skin_type: [rng.randint(0, 1) for _ in products] for skin_type in ['Combination', 'Dry', 'Normal', 'Oily', 'Sensitive']},
+    })
+    amazon = pd.DataFrame({
+        'Product': titles,
+        'Review Count': [rng.randint(0, 5000) for _ in titles],
+        'Price': [f"${rng.uniform(5, 200):.2f}" for _ in titles],
+        'URL': [f"https://www.amazon.com/dp/{i:010d}" for i in range(len(titles))],
+        'Rating': [round(rng.uniform(1, 5), 1) for _ in titles],
+    })
+    banned = pd.DataFrame({'Name': ['ingredient 499'], 'EC No.': [None], 'CAS No.': [None], 'Restriction(s)': [None]})
+
+    write_dataset(skincare, os.path.join(cleaned_dataset_folder_path, 'skincare_ingredients.csv'), 'skincare_ingredients')
+    write_dataset(amazon, os.path.join(cleaned_dataset_folder_path, 'amazon_data.csv'), 'amazon_data')
+    write_dataset(banned, os.path.join(cleaned_dataset_folder_path, 'banned_skincare_ings.csv'), 'banned_skincare_ings')
+
+def merged_digest():
+    digest = hashlib.sha256()
+    for path in sorted({merged_dataset_path, resolve_path(merged_dataset_path)}):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--titles', type=int, default=200000)
+    parser.add_argument('--workers', type=int, nargs='*', default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            write_synthetic_datasets(args.products, args.titles)
+            print(f"{args.products} products x {args.titles} titles, {os.cpu_count()} cores")
+            print(f"{'workers':>7} {'seconds':>8} {'speedup':>7} {'identical':>9}")
+
+            baseline_seconds = baseline_digest = None
+            for workers in args.workers:
+                started = time.perf_counter()
+                # The merge reports its progress on stdout and stderr
+                with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                    process_and_merge_data(workers)
+                seconds = time.perf_counter() - started
+
+                digest = merged_digest()
+                if baseline_digest is None:
+                    baseline_seconds, baseline_digest = seconds, digest
+                print(f"{workers:>7} {seconds:>8.2f} {baseline_seconds / seconds:>6.2f}x {str(digest == baseline_digest):>9}")
+        finally:
+            os.chdir(cwd)
+
+if __name__ == "__main__":
+    main()
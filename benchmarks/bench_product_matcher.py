@@ -0,0 +1,76 @@
+'''
+bench_product_matcher.py
+
+Benchmarks the inverted token index used by process_and_merge_data against the previous full-scan issubset matcher.
+Synthetic skincare names and Amazon titles are generated so the benchmark runs without any scraped data.
+The full scan is timed on a sample of skincare rows and extrapolated, since scanning 10k x 100k rows takes hours.
+
+Usage: python -m benchmarks.bench_product_matcher [--skincare-rows 10000] [--amazon-rows 100000]
+
+'''
+
+import argparse
+import itertools
+import random
+import time
+import pandas as pd
+from processing.product_matcher import build_token_index, match_token_set
+
+# Generate skincare 'Brand Name' token sets and Amazon title token sets sharing a Zipf-like vocabulary
+def make_synthetic_data(num_skincare, num_amazon, vocab_size=20000, seed=0):
+    rng = random.Random(seed)
+    vocab = [f"w{i}" for i in range(vocab_size)]
+    cum_weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(vocab_size)))
+
+    skincare_sets = [set(rng.choices(vocab, cum_weights=cum_weights, k=rng.randint(3, 6))) for _ in range(num_skincare)]
+
+    amazon_sets = []
+    for _ in range(num_amazon):
+        title = set(rng.choices(vocab, cum_weights=cum_weights, k=rng.randint(8, 15)))
+        # Make roughly a third of the titles contain a real skincare product
+        if rng.random() < 0.3:
+            title |= rng.choice(skincare_sets)
+        amazon_sets.append(title)
+
+    return skincare_sets, amazon_sets
+
+# Previous matcher: scan every Amazon title for every skincare product
+def full_scan_match(skincare_sets, amazon_series):
+    return [amazon_series.index[amazon_series.apply(lambda x: skincare_set.issubset(x))].tolist()
+            for skincare_set in skincare_sets]
+
+# Current matcher: build the index once, then intersect posting lists per product
+def indexed_match(skincare_sets, amazon_sets):
+    token_index = build_token_index(amazon_sets)
+    return [match_token_set(skincare_set, token_index, len(amazon_sets)) for skincare_set in skincare_sets]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--skincare-rows', type=int, default=10000)
+    parser.add_argument('--amazon-rows', type=int, default=100000)
+    parser.add_argument('--scan-sample', type=int, default=50, help="skincare rows timed with the full scan")
+    args = parser.parse_args()
+
+    skincare_sets, amazon_sets = make_synthetic_data(args.skincare_rows, args.amazon_rows)
+    amazon_series = pd.Series(amazon_sets)
+
+    start = time.perf_counter()
+    indexed_results = indexed_match(skincare_sets, amazon_sets)
+    indexed_seconds = time.perf_counter() - start
+
+    sample = skincare_sets[:args.scan_sample]
+    start = time.perf_counter()
+    scan_results = full_scan_match(sample, amazon_series)
+    scan_seconds = (time.perf_counter() - start) * len(skincare_sets) / len(sample)
+
+    if scan_results != indexed_results[:len(sample)]:
+        raise SystemExit("Indexed matcher disagrees with the full scan")
+
+    total_matches = sum(len(matches) for matches in indexed_results)
+    print(f"{args.skincare_rows} skincare x {args.amazon_rows} Amazon rows, {total_matches} matches")
+    print(f"Full scan (extrapolated from {len(sample)} rows): {scan_seconds:10.2f} s")
+    print(f"Inverted index (build + match):            {indexed_seconds:10.2f} s")
+    print(f"Speedup: {scan_seconds / indexed_seconds:.0f}x")
+
+if __name__ == "__main__":
+    main()
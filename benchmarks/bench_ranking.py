@@ -0,0 +1,117 @@
+'''
+bench_ranking.py
+
+Offline evaluation of ranking weight vectors (see ranking.py).
+Random user profiles are answered with filter_exact_matches_by_label under each weight vector, and the top k lists are
+compared on the quality of what they surface: average raw and smoothed rating, review counts, price percentile within the
+label, how many of the user's requested concerns each product covers, how much of the catalog gets recommended at all,
+and the overlap with the Rating-only ranking. Request latency is reported alongside, plus the one-time cost of scoring
+the catalog for a weight vector.
+
+Usage: python -m benchmarks.bench_ranking [--dataset PATH] [--rows 20000] [--profiles 300] [--k 5] [--weights NAME=JSON ...]
+
+'''
+
+import argparse
+import json
+import random
+import time
+import numpy as np
+from benchmarks.bench_catalog_memory import make_synthetic_merged, labels, skin_types, concerns
+from catalog import ProductCatalog, get_catalog, concern_columns
+from ranking import add_ranking_features, ranking_keys
+from recommendation import recommend_products, filter_exact_matches_by_label
+
+presets = {
+    'rating': {'Rating': 1.0},
+    'smoothed': {'Smoothed Rating': 1.0},
+    'weighted': {'Smoothed Rating': 1.0, 'Review Score': 0.5, 'Price Percentile': -0.25, 'Concern Count': 0.1},
+}
+
+def random_profiles(num_profiles, catalog_labels, seed=0):
+    rng = random.Random(seed)
+    return [{
+        'labels': rng.sample(catalog_labels, rng.randint(1, 3)),
+        'skin_types': rng.sample(skin_types, rng.randint(1, 2)),
+        'improvements': rng.sample(concerns, rng.randint(1, 2)),
+        'price_range': [0, rng.choice([25, 50, 100, 200])],
+        'age': rng.randint(16, 65),
+        'uv_index_max': rng.choice([1, 4, 6, 8, 11]),
+    } for _ in range(num_profiles)]
+
+# Top k lists of every (profile, label) under a weight vector, with the latency of each request in seconds
+def run_rankings(catalog, profiles, weights, k):
+    lists, latencies = [], []
+    for profile in profiles:
+        started = time.perf_counter()
+        recommended = recommend_products(catalog, profile['labels'], profile['skin_types'], profile['uv_index_max'])
+        results = filter_exact_matches_by_label(recommended, profile['labels'], profile['skin_types'],
+                                                profile['improvements'], profile['price_range'], profile['age'], k,
+                                                weights=weights)
+        latencies.append(time.perf_counter() - started)
+        for label in profile['labels']:
+            lists.append((profile, results[label]))
+    return lists, np.array(latencies)
+
+def quality(lists, catalog_size, baseline=None):
+    rows = [(profile, df) for profile, df in lists if not df.empty]
+    products = [df for _, df in rows]
+    coverage = []
+    for profile, df in rows:
+        requested = [col for col in concern_columns if col in profile['improvements']]
+        coverage.extend(df[requested].sum(axis=1) / len(requested))
+
+    metrics = {
+        'rating': np.mean([df['Rating'].mean() for df in products]),
+        'smoothed': np.mean([df['Smoothed Rating'].mean() for df in products]),
+        'reviews': np.median([df['Review Count'].median() for df in products]),
+        'price_pct': np.mean([df['Price Percentile'].mean() for df in products]),
+        'concerns': np.mean(coverage),
+        'catalog': len({url for df in products for url in df['URL']}) / catalog_size,
+    }
+    if baseline is not None:
+        overlaps = [len(set(a['URL']) & set(b['URL'])) / max(len(set(a['URL']) | set(b['URL'])), 1)
+                    for (_, a), (_, b) in zip(lists, baseline) if not (a.empty and b.empty)]
+        metrics['overlap'] = np.mean(overlaps)
+    return metrics
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dataset', help="merged dataset to evaluate on (default: a synthetic one)")
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--profiles', type=int, default=300)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--weights', nargs='*', default=[], metavar='NAME=JSON', help="extra weight vectors to evaluate")
+    args = parser.parse_args()
+
+    if args.dataset:
+        catalog = get_catalog(args.dataset)
+    else:
+        catalog = ProductCatalog(add_ranking_features(make_synthetic_merged(args.rows), concerns))
+    weight_vectors = dict(presets)
+    for item in args.weights:
+        name, _, weights = item.partition('=')
+        weight_vectors[name] = json.loads(weights)
+
+    profiles = random_profiles(args.profiles, catalog.labels if args.dataset else labels)
+    print(f"{len(catalog)} products, {len(profiles)} profiles, top {args.k}")
+    print(f"{'weights':<10} {'rating':>6} {'smooth':>6} {'reviews':>8} {'price%':>6} {'concern':>7} {'catalog':>7} "
+          f"{'overlap':>7} {'score ms':>8} {'p50 ms':>7} {'p95 ms':>7}")
+
+    baseline = None
+    for name, weights in weight_vectors.items():
+        started = time.perf_counter()
+        ranking_keys(catalog, weights)
+        scoring_ms = (time.perf_counter() - started) * 1000
+
+        lists, latencies = run_rankings(catalog, profiles, weights, args.k)
+        metrics = quality(lists, len(catalog), baseline)
+        if baseline is None:
+            baseline = lists
+        print(f"{name:<10} {metrics['rating']:>6.2f} {metrics['smoothed']:>6.2f} {metrics['reviews']:>8.0f} "
+              f"{metrics['price_pct']:>6.2f} {metrics['concerns']:>7.2f} {metrics['catalog']:>7.1%} "
+              f"{metrics.get('overlap', 1.0):>7.2f} {scoring_ms:>8.2f} {np.percentile(latencies, 50) * 1000:>7.2f} "
+              f"{np.percentile(latencies, 95) * 1000:>7.2f}")
+
+if __name__ == "__main__":
+    main()
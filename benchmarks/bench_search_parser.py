@@ -0,0 +1,86 @@
+'''
+bench_search_parser.py
+
+Benchmarks the lxml search-result parser in scrapers/amazon_search.py against the previous BeautifulSoup
+('html.parser') extraction, and checks that both return the same rows for every page.
+Pass saved Amazon search pages to benchmark on real HTML; without arguments a synthetic results page is generated.
+
+Usage: python -m benchmarks.bench_search_parser [saved_page.html ...] [--repeat 20]
+
+'''
+
+import argparse
+import random
+import time
+from bs4 import BeautifulSoup
+from scrapers.amazon_search import parse_search_results
+
+# Previous extraction from scrape_page, kept here as the reference implementation
+def parse_search_results_soup(html_content, base_url="https://www.amazon.com"):
+    soup = BeautifulSoup(html_content, 'html.parser')
+    a_tags = soup.find_all('a', class_=["a-size-base-plus", "a-color-base", "a-text-normal", "s-underline-text"])
+    i_tags = soup.find_all('i', class_=["a-icon", "a-icon-star-small", "a-star-small-4", "aok-align-bottom"])
+    ratings = [i.find('span', class_='a-icon-alt').text.strip() if i.find('span', 'a-icon-alt') else None for i in
+               i_tags]
+    min_length = min(len(a_tags), len(i_tags))
+    return [{'Link Text': a_tags[i].text.strip(), 'Rating': ratings[i], 'URL': f"{base_url}{a_tags[i]['href']}"}
+            for i in range(min_length)]
+
+# Build a page shaped like an Amazon search result listing, padded with unrelated markup
+def make_synthetic_page(num_results=60, seed=0):
+    rng = random.Random(seed)
+    parts = ["<!doctype html><html><head><title>Amazon.com : cream</title>",
+             "<script>" + "var x = 1;" * 2000 + "</script></head><body>"]
+    parts.append('<div id="nav">' + '<a class="nav-a" href="/x">Nav link</a>' * 200 + '</div>')
+    for index in range(num_results):
+        rating = f"{rng.uniform(3, 5):.1f}"
+        parts.append(
+            f'<div class="s-result-item" data-index="{index}"><div class="a-section">'
+            f'<h2><a class="a-link-normal s-underline-text s-underline-link-text s-link-style a-text-normal" '
+            f'href="/Brand-Product-{index}/dp/B0{index:08d}?ref=sr_1_{index}"><span>Brand Product {index} Moisturizing Cream, 1.7 oz</span></a></h2>'
+            f'<i class="a-icon a-icon-star-small a-star-small-4-5 aok-align-bottom"><span class="a-icon-alt">{rating} out of 5 stars</span></i>'
+            f'<a class="a-link-normal s-underline-text s-underline-link-text s-link-style" href="/dp/B0{index:08d}#customerReviews">'
+            f'<span class="a-size-base s-underline-text">{rng.randint(1, 50000):,}</span></a>'
+            f'<a class="a-size-base a-link-normal s-no-hover s-underline-text s-underline-link-text s-link-style a-text-normal" '
+            f'href="/gp/product/B0{index:08d}?psc=1"><span class="a-price"><span class="a-offscreen">${rng.randint(5, 150)}.99</span></span></a>'
+            + '<div class="filler"><span>filler</span></div>' * 40 +
+            '</div></div>')
+    parts.append("</body></html>")
+    return "".join(parts)
+
+def time_parser(parser, pages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            parser(page)
+    return (time.perf_counter() - start) / (repeat * len(pages))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pages', nargs='*', help="saved search result pages")
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.pages:
+        pages = []
+        for path in args.pages:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                pages.append(f.read())
+    else:
+        pages = [make_synthetic_page(seed=seed) for seed in range(3)]
+
+    for index, page in enumerate(pages):
+        if parse_search_results(page) != parse_search_results_soup(page):
+            raise SystemExit(f"Parsers disagree on page {index}")
+
+    soup_seconds = time_parser(parse_search_results_soup, pages, args.repeat)
+    lxml_seconds = time_parser(parse_search_results, pages, args.repeat)
+    average_kb = sum(len(page) for page in pages) / len(pages) / 1024
+
+    print(f"{len(pages)} pages, {average_kb:.0f} KB on average, identical rows from both parsers")
+    print(f"BeautifulSoup (html.parser): {soup_seconds * 1000:8.2f} ms/page")
+    print(f"lxml + compiled XPath:       {lxml_seconds * 1000:8.2f} ms/page")
+    print(f"Speedup: {soup_seconds / lxml_seconds:.1f}x")
+
+if __name__ == "__main__":
+    main()
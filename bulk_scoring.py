@@ -0,0 +1,226 @@
+'''
+bulk_scoring.py
+
+Batch recommendation engine for scoring many user profiles at once (e.g. for email campaigns).
+Profiles are read in chunks and every chunk is scored against the catalog as one array operation: the users' packed
+skin type and concern flags are broadcast against the catalog's flag columns, together with the price, SPF and label
+constraints, giving a (users x products) match mask per label. The mask columns are in ranking order (see ranking.py), so
+the top k of every user is the first k matching products with distinct names, read off the mask with a cumulative count
+instead of a sort. Results are the same as filter_exact_matches_by_label and recommend_sunscreens for each profile, and are
+written to the output file chunk by chunk, so memory stays bounded however many profiles are scored.
+
+Input: a CSV file with the columns user_id, labels, skin_types, improvements (lists separated by ';'), max_price, age
+and uv_index_max, and optionally min_price. Output: one row per recommended product with user_id, kind ('product' or
+'sunscreen'), label and rank. service.py scores its batch requests through score_profiles too.
+
+Usage: python bulk_scoring.py PROFILES_CSV OUTPUT_CSV [--k 5] [--chunk-size 10000]
+
+'''
+
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from config import merged_dataset_path, bulk_profile_chunk_size, bulk_max_mask_cells
+from catalog import get_catalog, flag_mask, popcount_table, skin_type_columns, concern_columns
+from ranking import ranking_keys
+from recommendation import get_spf_recommendation
+
+# Catalog columns written for every recommended product
+output_columns = ['Brand', 'Name', 'Product', 'Price', 'Rating', 'Review Count', 'SPF', 'URL']
+
+# Lists come separated by ';' in files, and as lists from the service
+def _split_list(value):
+    if isinstance(value, list):
+        return value
+    if not isinstance(value, str):
+        return []
+    return [item.strip() for item in value.split(';') if item.strip()]
+
+
+class ProfileMatrix:
+    """Per-user constraint arrays for a chunk of profiles, aligned with the catalog's packed flag columns."""
+
+    def __init__(self, profiles, catalog):
+        self.user_ids = profiles['user_id'].to_numpy()
+        self.labels = [_split_list(value) for value in profiles['labels']]
+        skin_types = [_split_list(value) for value in profiles['skin_types']]
+        improvements = [_split_list(value) for value in profiles['improvements']]
+
+        self.skin_masks = np.array([flag_mask(values, skin_type_columns) for values in skin_types], dtype=np.uint8)
+        self.concern_masks = np.array([flag_mask(values, concern_columns) for values in improvements], dtype=np.uint8)
+        self.max_price = pd.to_numeric(profiles['max_price'], errors='coerce').to_numpy(dtype=float)
+        self.min_price = (pd.to_numeric(profiles['min_price'], errors='coerce').fillna(0).to_numpy(dtype=float)
+                          if 'min_price' in profiles else np.zeros(len(profiles)))
+        # Users above 30 also need anti-aging products
+        self.needs_anti_aging = pd.to_numeric(profiles['age'], errors='coerce').fillna(0).to_numpy() > 30
+        uv_index_max = pd.to_numeric(profiles['uv_index_max'], errors='coerce').fillna(0).to_numpy()
+        self.spf_tiers = np.array([get_spf_recommendation(uv) for uv in uv_index_max], dtype=float)
+
+        # Bit i of a user's label mask is set when the user asked for catalog.labels[i], and label_positions[user, i]
+        # is where the user listed it (results follow that order)
+        self.label_masks = np.zeros(len(profiles), dtype=np.int64)
+        self.label_positions = np.full((len(profiles), len(catalog.labels)), len(catalog.labels), dtype=np.int16)
+        for user, user_labels in enumerate(self.labels):
+            for position, label in enumerate(user_labels):
+                code = catalog.labels.index(label) if label in catalog.label_ranges else None
+                if code is not None and not (self.label_masks[user] >> code) & 1:
+                    self.label_masks[user] |= 1 << code
+                    self.label_positions[user, code] = position
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    # Match mask of some users (rows) against the catalog rows at positions for the exact-match conditions
+    def exact_match_mask(self, users, catalog, positions):
+        skin_masks = self.skin_masks[users, None]
+        concern_flags = catalog.concern_flags[None, positions]
+        mask = (catalog.skin_flags[None, positions] & skin_masks) == skin_masks
+        concern_masks = self.concern_masks[users, None]
+        mask &= ((concern_flags & concern_masks) != 0) | (concern_masks == 0)
+        anti_aging = flag_mask(['Anti_Aging'], concern_columns)
+        mask &= ((concern_flags & anti_aging) != 0) | ~self.needs_anti_aging[users, None]
+        prices = catalog.price[None, positions]
+        mask &= (prices >= self.min_price[users, None]) & (prices <= self.max_price[users, None])
+        mask &= catalog.spf[None, positions] >= self.spf_tiers[users, None]
+        return mask
+
+    # Match mask of some users against the catalog rows at positions for the sunscreen conditions
+    def sunscreen_mask(self, users, catalog, positions):
+        mask = (catalog.skin_flags[None, positions] & self.skin_masks[users, None]) != 0
+        mask &= catalog.spf[None, positions] >= self.spf_tiers[users, None]
+        prices = catalog.price[None, positions]
+        mask &= (prices >= self.min_price[users, None]) & (prices <= self.max_price[users, None])
+        mask &= ((self.label_masks[users, None] >> catalog.label_codes[None, positions]) & 1) != 0
+        return mask
+
+# For every row of a match mask, the columns of its first k matches with distinct names, as (row, column) arrays.
+# Only a window of the first matches is examined, widened for the rows where duplicate names leave it short
+def first_k_distinct(mask, name_codes, k):
+    found_rows, found_cols = [], []
+    rows = np.arange(len(mask))
+    window = k
+    while len(rows):
+        ranks = np.cumsum(mask[rows], axis=1)
+        row_index, cols = np.nonzero(mask[rows] & (ranks <= window))
+        names = name_codes[cols]
+
+        # Keep the first column of every (row, name) pair, then the first k of those per row
+        order = np.lexsort((cols, names, row_index))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = (row_index[order][1:] != row_index[order][:-1]) | (names[order][1:] != names[order][:-1])
+        keep = np.sort(order[first])
+        row_index, cols = row_index[keep], cols[keep]
+        starts = np.searchsorted(row_index, np.arange(len(rows)))
+        rank_in_row = np.arange(len(row_index)) - starts[row_index]
+        keep = rank_in_row < k
+        row_index, cols = row_index[keep], cols[keep]
+
+        # Rows with k names, or with no matches past the window, are done
+        counts = np.bincount(row_index, minlength=len(rows))
+        done = (counts == k) | (ranks[:, -1] <= window) if ranks.shape[1] else np.ones(len(rows), dtype=bool)
+        in_done = done[row_index]
+        found_rows.append(rows[row_index[in_done]])
+        found_cols.append(cols[in_done])
+        rows = rows[~done]
+        window *= 2
+
+    found_rows, found_cols = np.concatenate(found_rows), np.concatenate(found_cols)
+    order = np.lexsort((found_cols, found_rows))
+    return found_rows[order], found_cols[order]
+
+# Number of users scored together against a block of catalog rows, keeping the match mask under bulk_max_mask_cells
+def _user_block_size(num_rows, max_cells):
+    return max(1, max_cells // max(num_rows, 1))
+
+def _result_frame(catalog, profiles, users, positions, kind, labels, ranks, order, columns):
+    df = catalog.rows(positions)
+    # The number of the user's skin types a product suits, as recommend_products scores it
+    df['Skin Type Match Score'] = popcount_table[catalog.skin_flags[positions] & profiles.skin_masks[users]].astype(int)
+    df = df[columns]
+    df.insert(0, 'user_id', profiles.user_ids[users])
+    df.insert(1, 'kind', kind)
+    df.insert(2, 'label', labels)
+    df.insert(3, 'rank', ranks)
+    df['_user'] = users
+    df['_order'] = order
+    return df
+
+def _ranks(users):
+    starts = np.searchsorted(users, users, side='left')
+    return np.arange(len(users)) - starts + 1
+
+# Score a chunk of profiles (a DataFrame with the input columns) and return one DataFrame of recommendations with the
+# given catalog columns (or 'Skin Type Match Score'). Sunscreens are only recommended on sunny days unless all_sunscreens
+def score_profiles(profiles_df, catalog, k=5, max_cells=bulk_max_mask_cells, weights=None, columns=output_columns,
+                   all_sunscreens=False):
+    profiles = ProfileMatrix(profiles_df, catalog)
+    keys = ranking_keys(catalog, weights)
+    frames = []
+
+    # Top k products of every requested label
+    for code, label in enumerate(catalog.labels):
+        users = np.flatnonzero((profiles.label_masks >> code) & 1)
+        start, stop = catalog.label_ranges[label]
+        label_order = start + np.argsort(keys[start:stop])
+        block = _user_block_size(stop - start, max_cells)
+        for block_start in range(0, len(users), block):
+            block_users = users[block_start:block_start + block]
+            mask = profiles.exact_match_mask(block_users, catalog, label_order)
+            rows, cols = first_k_distinct(mask, catalog.name_codes[label_order], k)
+            if len(rows):
+                frames.append(_result_frame(catalog, profiles, block_users[rows], label_order[cols], 'product', label,
+                                            _ranks(rows), profiles.label_positions[block_users[rows], code], columns))
+
+    # Top sunscreens over the requested labels, for users on sunny days
+    sun_order = np.argsort(keys)
+    users = np.flatnonzero(((profiles.spf_tiers >= 30) | all_sunscreens) & (profiles.label_masks != 0))
+    block = _user_block_size(len(sun_order), max_cells)
+    for block_start in range(0, len(users), block):
+        block_users = users[block_start:block_start + block]
+        mask = profiles.sunscreen_mask(block_users, catalog, sun_order)
+        rows, cols = first_k_distinct(mask, catalog.name_codes[sun_order], k)
+        if len(rows):
+            frames.append(_result_frame(catalog, profiles, block_users[rows], sun_order[cols], 'sunscreen',
+                                        np.array(catalog.labels, dtype=object)[catalog.label_codes[sun_order[cols]]],
+                                        _ranks(rows), len(catalog.labels), columns))
+
+    if not frames:
+        return pd.DataFrame(columns=['user_id', 'kind', 'label', 'rank'] + list(columns))
+
+    # Group the output by user in input order, with the products in the order the user listed the labels, then sunscreens
+    df = pd.concat(frames, ignore_index=True)
+    order = np.lexsort((df['rank'].to_numpy(), df['_order'].to_numpy(), df['_user'].to_numpy()))
+    return df.iloc[order].drop(columns=['_user', '_order']).reset_index(drop=True)
+
+# Score a profiles CSV file chunk by chunk against the current catalog, streaming the recommendations to output_path
+def score_profile_file(profiles_path, output_path, k=5, chunk_size=bulk_profile_chunk_size, dataset_path=merged_dataset_path,
+                       weights=None):
+    catalog = get_catalog(dataset_path)
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    num_profiles = num_results = 0
+    try:
+        header = True
+        for chunk in pd.read_csv(profiles_path, chunksize=chunk_size, dtype={'user_id': str}):
+            results = score_profiles(chunk, catalog, k, weights=weights)
+            results.to_csv(tmp_path, mode='w' if header else 'a', header=header, index=False)
+            header = False
+            num_profiles += len(chunk)
+            num_results += len(results)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    print(f"Scored {num_profiles} profiles: {num_results} recommendations saved to '{output_path}'")
+    return num_profiles, num_results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score a file of user profiles against the product catalog.")
+    parser.add_argument('profiles_path')
+    parser.add_argument('output_path')
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--chunk-size', type=int, default=bulk_profile_chunk_size)
+    args = parser.parse_args()
+
+    score_profile_file(args.profiles_path, args.output_path, args.k, args.chunk_size)
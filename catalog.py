@@ -0,0 +1,267 @@
+'''
+catalog.py
+
+This module holds the merged product catalog in memory so recommendation requests do not re-read the dataset.
+The catalog is loaded once per process and reloaded only when the dataset file changes (by mtime, then by content hash).
+It keeps integer-coded labels, the skin type and concern flags packed as bitmasks, and per-label row ranges presorted by Rating,
+so the recommendation functions can answer queries with NumPy masks instead of rebuilding pandas columns.
+publish_catalog writes the presorted catalog to a read-only Arrow IPC file; worker processes memory-map that file instead of
+building their own copy, so the catalog lives once in the OS page cache however many workers attach to it.
+A new version is published by atomically renaming a new file over the old one, and workers swap to it on their next lookup.
+
+'''
+
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+import pandas as pd
+from config import merged_dataset_path, catalog_file_path
+from storage import read_dataset, stored_path
+from instrumentation import instrumented, set_span_rows
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+skin_type_columns = ['Combination', 'Dry', 'Normal', 'Oily', 'Sensitive']
+concern_columns = ['Acne', 'Brightening', 'Hydration', 'Anti_Aging']
+
+# Per-row NumPy arrays every catalog provides, in catalog (label, then Rating) order
+catalog_arrays = ['label_codes', 'rating', 'price', 'spf', 'name_codes', 'skin_flags', 'concern_flags']
+
+# Number of set bits for every possible uint8 bitmask
+popcount_table = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+# Load product data (already typed by the storage schema), keeping only rated products
+@instrumented(rows_out=len)
+def load_data(file_path):
+    df = read_dataset(file_path, 'merged_data')
+    set_span_rows(rows_in=len(df))
+    return df[df['Rating'].notnull()]
+
+# Pack 0/1 flag columns into one uint8 per row, with bit i set when columns[i] == 1
+def pack_flags(df, columns):
+    flags = np.zeros(len(df), dtype=np.uint8)
+    for bit, col in enumerate(columns):
+        flags |= (df[col].to_numpy() == 1).astype(np.uint8) << bit
+    return flags
+
+# Build the bitmask matching pack_flags for the selected column names
+def flag_mask(selected, columns):
+    mask = 0
+    for bit, col in enumerate(columns):
+        if col in selected:
+            mask |= 1 << bit
+    return mask
+
+# Hash the dataset file contents to detect real changes behind an mtime bump
+def file_fingerprint(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Sort the products by label, then by Rating (highest first), and compute the catalog arrays for the sorted rows
+def build_catalog_arrays(df):
+    # Sorted distinct labels and each row's index into them (what LabelEncoder.fit_transform computes)
+    labels, label_codes = np.unique(df['Label'].to_numpy(dtype=object), return_inverse=True)
+    rating = pd.to_numeric(df['Rating'], errors='coerce').to_numpy(dtype=float)
+
+    # lexsort is stable so ties keep file order
+    order = np.lexsort((-rating, label_codes))
+    df = df.iloc[order].reset_index(drop=True)
+
+    arrays = {
+        'label_codes': label_codes[order].astype(np.int32),
+        'rating': rating[order],
+        'price': df['Price'].to_numpy(dtype=float),
+        'spf': pd.to_numeric(df['SPF'], errors='coerce').fillna(0).to_numpy(dtype=float),
+        # Products are told apart by name, so equal names share a code (missing names share -1)
+        'name_codes': pd.factorize(df['Name'])[0].astype(np.int32),
+        'skin_flags': pack_flags(df, skin_type_columns),
+        'concern_flags': pack_flags(df, concern_columns),
+    }
+    return df, [str(label) for label in labels], arrays
+
+
+class ProductCatalog:
+    """Read-only, query-ready view of the merged product dataset."""
+
+    def __init__(self, df, fingerprint=None):
+        self.df, labels, arrays = build_catalog_arrays(df)
+        self.fingerprint = fingerprint
+        self._set_arrays(labels, arrays)
+
+    def _set_arrays(self, labels, arrays):
+        self.labels = labels
+        self.label_codes = arrays['label_codes']
+        self.rating = arrays['rating']
+        self.price = arrays['price']
+        self.spf = arrays['spf']
+        self.name_codes = arrays['name_codes']
+        self.skin_flags = arrays['skin_flags']
+        self.concern_flags = arrays['concern_flags']
+
+        # Rows of each label are contiguous, so a label maps to a [start, stop) range
+        bounds = np.searchsorted(self.label_codes, np.arange(len(self.labels) + 1))
+        self.label_ranges = {label: (int(bounds[code]), int(bounds[code + 1])) for code, label in enumerate(self.labels)}
+
+    def __len__(self):
+        return len(self.df)
+
+    # Return the [start, stop) row range of a label, raising ValueError for unknown labels (as LabelEncoder did)
+    def label_range(self, label):
+        if label not in self.label_ranges:
+            raise ValueError(f"y contains previously unseen labels: '{label}'")
+        return self.label_ranges[label]
+
+    # Materialize only the requested rows as a new DataFrame
+    def rows(self, positions):
+        return self.df.iloc[positions].reset_index(drop=True)
+
+    # Values of one dataset column for every row, in catalog order
+    def column(self, name):
+        return self.df[name].to_numpy()
+
+
+# Return a column of a single-chunk Arrow table as a NumPy view of the mapped buffer (copying only if it can't be viewed)
+def _mapped_array(table, name):
+    column = table.column(name)
+    if column.num_chunks == 1:
+        try:
+            return column.chunk(0).to_numpy(zero_copy_only=True)
+        except pa.ArrowInvalid:
+            pass
+    return column.to_numpy()
+
+
+class MappedCatalog(ProductCatalog):
+    """ProductCatalog attached to a memory-mapped catalog file written by publish_catalog, without copying its data."""
+
+    def __init__(self, path, table, metadata):
+        self.path = path
+        self.df = None
+        self.fingerprint = metadata['fingerprint']
+        self.table = table.select(metadata['columns'])
+        self._set_arrays(metadata['labels'], {name: _mapped_array(table, f"__{name}") for name in catalog_arrays})
+
+    def __len__(self):
+        return self.table.num_rows
+
+    # Only the requested rows are copied out of the mapped file
+    def rows(self, positions):
+        return self.table.take(np.asarray(positions, dtype=np.intp)).to_pandas()
+
+    def column(self, name):
+        return _mapped_array(self.table, name)
+
+# Write the presorted catalog of the merged dataset to a memory-mappable Arrow IPC file, replacing the old one atomically
+def publish_catalog(dataset_path=merged_dataset_path, catalog_path=catalog_file_path):
+    if pa is None:
+        raise RuntimeError("Publishing the catalog file requires pyarrow")
+    file_path = stored_path(dataset_path)
+    df, labels, arrays = build_catalog_arrays(load_data(file_path))
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for name in catalog_arrays:
+        table = table.append_column(f"__{name}", pa.array(arrays[name]))
+    metadata = {'fingerprint': file_fingerprint(file_path), 'labels': labels, 'columns': list(df.columns)}
+    table = table.replace_schema_metadata({**table.schema.metadata, b'skinwiz_catalog': json.dumps(metadata)})
+
+    # One uncompressed record batch, so every column can be viewed in place once mapped
+    os.makedirs(os.path.dirname(catalog_path) or '.', exist_ok=True)
+    tmp_path = f"{catalog_path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table.combine_chunks(), max_chunksize=max(1, table.num_rows))
+    os.replace(tmp_path, catalog_path)
+    print(f"Catalog of {len(df)} products published to '{catalog_path}'")
+    return catalog_path
+
+# Map the published catalog file, or return None if there is none for this dataset version
+def attach_catalog(catalog_path, fingerprint):
+    if pa is None or not os.path.exists(catalog_path):
+        return None
+    table = pa.ipc.open_file(pa.memory_map(catalog_path, 'r')).read_all()
+    metadata = json.loads(table.schema.metadata[b'skinwiz_catalog'])
+    if metadata['fingerprint'] != fingerprint:
+        return None  # Published from another version of the dataset
+    return MappedCatalog(catalog_path, table, metadata)
+
+
+class CatalogSelection:
+    """A subset of catalog rows (by position) together with each row's skin type match score."""
+
+    def __init__(self, catalog, positions, scores):
+        self.catalog = catalog
+        self.positions = positions
+        self.scores = scores
+
+    def __len__(self):
+        return len(self.positions)
+
+    @property
+    def empty(self):
+        return len(self.positions) == 0
+
+    # Materialize the selected rows in the given order, with their 'Skin Type Match Score'
+    def rows(self, indices=None):
+        if indices is None:
+            indices = np.arange(len(self.positions))
+        df = self.catalog.rows(self.positions[indices])
+        df['Skin Type Match Score'] = self.scores[indices]
+        return df
+
+    # Materialize the whole selection, ordered by skin type match score within each label block
+    def to_frame(self):
+        return self.rows(np.argsort(-self.scores, kind='stable'))
+
+
+_catalogs = {}
+_catalog_lock = threading.Lock()
+
+def _file_state(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+# Return the process-wide catalog for file_path, reloading it only when the dataset or the published catalog file changes.
+# A published catalog file for the current dataset is memory-mapped; otherwise the catalog is built in process memory
+def get_catalog(file_path, catalog_path=catalog_file_path):
+    file_path = stored_path(file_path)
+    stat = os.stat(file_path)
+    file_state = (stat.st_mtime_ns, stat.st_size)
+    catalog_state = _file_state(catalog_path)
+
+    with _catalog_lock:
+        cached = _catalogs.get(file_path)
+        if cached is not None and cached[0] == (file_state, catalog_state):
+            return cached[1]
+
+        if cached is not None and cached[0][0] == file_state:
+            fingerprint = cached[1].fingerprint
+        else:
+            fingerprint = file_fingerprint(file_path)
+
+        catalog = attach_catalog(catalog_path, fingerprint)
+        if catalog is None:
+            if cached is not None and cached[1].fingerprint == fingerprint:
+                catalog = cached[1]  # Touched but unchanged
+            else:
+                catalog = ProductCatalog(load_data(file_path), fingerprint=fingerprint)
+
+        _catalogs[file_path] = ((file_state, catalog_state), catalog)
+        return catalog
+
+# Accept either a ProductCatalog or a plain DataFrame (wrapped in a throwaway catalog)
+def as_catalog(data):
+    if isinstance(data, ProductCatalog):
+        return data
+    return ProductCatalog(data)
@@ -4,12 +4,88 @@ This file centralizes all configuration-related information to make it easier to
 
 '''
 
+import os
 
 # Paths for datasets
 raw_dataset_folder_path = 'datasets/raw'
 cleaned_dataset_folder_path = 'datasets/cleaned'
 merged_dataset_path = 'datasets/merged/merged_data.csv'
 
+# Storage format of the cleaned and merged datasets: 'parquet' (typed and columnar, needs pyarrow) or 'csv'.
+# The dataset paths above name the CSV files; with Parquet each dataset is stored next to its CSV as a .parquet file
+# (see storage.py), and export_csv_copies keeps the CSV copies up to date for humans
+dataset_storage_format = 'parquet'
+export_csv_copies = True
+
+# How the merge matches skincare products to Amazon titles: 'exact' (every Brand Name token appears in the title) or
+# 'fuzzy' (brand-blocked character n-gram containment, see processing/fuzzy_matcher.py) with its threshold and n-gram size
+product_matching = 'exact'
+fuzzy_match_threshold = 0.8
+fuzzy_ngram_size = 3
+
+# Table of the ingredients that tag a product with each skincare concern (one "concern,ingredient" row per ingredient)
+concern_rules_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'processing', 'concern_rules.csv')
+
+# Processes the merge runs its product matching and attribute extraction on (1 runs them in the merging process), and
+# how many brand shards each process gets, so the shards balance out
+merge_workers = 1
+merge_shards_per_worker = 4
+
+# Presorted, memory-mappable catalog of the merged dataset shared by all app worker processes (see catalog.py)
+catalog_file_path = 'datasets/merged/catalog.arrow'
+
+# Ranking model (see ranking.py): weight of each ranking feature in a product's score ({'Rating': 1.0} ranks by Rating alone),
+# and the number of average ratings a product's rating is smoothed with
+ranking_weights = {'Rating': 1.0}
+ranking_prior_reviews = 50
+
+# Maximum number of recommendation results kept in each app process (see recommendation_cache.py)
+recommendation_cache_size = 1024
+
+# Headless recommendation service (see service.py): listen address, request body size limit (bytes) and batch size limit
+service_host = '127.0.0.1'
+service_port = 8502
+service_max_body_bytes = 8 * 1024 * 1024
+service_max_batch_profiles = 10000
+
+# Bulk scoring (see bulk_scoring.py): profiles read per chunk, and the largest (users x products) match mask built at once
+bulk_profile_chunk_size = 10000
+bulk_max_mask_cells = 1 << 24
+
+# Rendered statistics figures, cached per dataset version (see plots/figure_cache.py), and their resolution
+figure_cache_dir = 'datasets/figures'
+figure_dpi = 200
+
+# OpenStreetMap basemap tiles for the city maps: tile server, local tile cache directory and its size cap (bytes), request
+# timeout (seconds), and offline mode (set SKINWIZ_OFFLINE_TILES=1 to use only tiles already in the cache directory)
+tile_url = 'https://tile.openstreetmap.org/{z}/{x}/{y}.png'
+tile_cache_dir = 'datasets/tiles'
+tile_cache_max_bytes = 200 * 1024 * 1024
+tile_request_timeout = 10
+tile_offline = os.environ.get('SKINWIZ_OFFLINE_TILES', '0') == '1'
+
+# Pre-rendered city location maps and their basemap zoom level
+city_map_dir = 'datasets/figures/cities'
+city_map_zoom = 4
+
+# Fingerprints and timings of the last data pipeline run, and how many stages may run at once
+pipeline_state_path = 'datasets/pipeline_state.json'
+pipeline_workers = 4
+
+# Instrumentation spans of the hot paths (see instrumentation.py): on unless SKINWIZ_INSTRUMENTATION=0, with their totals
+# kept in each process. With SKINWIZ_METRICS_FILE=1 the finished spans are also appended to the local metrics file (one
+# JSON line each) with its size cap (bytes, one older file is kept) and how many spans are buffered per write, and each
+# pipeline run leaves the Prometheus text file for a textfile collector
+instrumentation_enabled = os.environ.get('SKINWIZ_INSTRUMENTATION', '1') == '1'
+metrics_file_enabled = os.environ.get('SKINWIZ_METRICS_FILE', '0') == '1'
+metrics_path = 'datasets/metrics/spans.jsonl'
+metrics_max_bytes = 50 * 1024 * 1024
+metrics_flush_spans = 100
+metrics_prometheus_path = 'datasets/metrics/skinwiz.prom'
+
+# Per-request span breakdown panel in the app (set SKINWIZ_DEBUG_PANEL=1 to show it)
+debug_panel = os.environ.get('SKINWIZ_DEBUG_PANEL', '0') == '1'
+
 # User's Downloads directory path (change accordingly)
 download_dir = '/Users/rishika/Downloads'
 
@@ -19,6 +95,18 @@ HEADERS = {
     'Accept-Language': 'en-US, en;q=0.5'
 }
 
+# Amazon scraping: site URL, page fetch backend ('http' with Selenium as fallback, or 'selenium'), worker pool size,
+# global spacing between requests (seconds, plus random jitter), retries per search term
+# and the append-only checkpoint files used to resume interrupted scrapes
+amazon_base_url = 'https://www.amazon.com'
+amazon_fetch_backend = 'http'
+amazon_scrape_workers = 3
+amazon_request_interval = 5.0
+amazon_request_jitter = 5.0
+amazon_scrape_retries = 3
+amazon_scrape_checkpoint_path = 'datasets/raw/amazon_data.checkpoint.jsonl'
+demo_amazon_scrape_checkpoint_path = 'datasets/raw/demo_amazon_data.checkpoint.jsonl'
+
 # Centralized latitude and longitude data for major cities in the US
 cities = {
     "New York City, NY": {"latitude": 40.7128, "longitude": -74.0060},
@@ -36,3 +124,13 @@ cities = {
 # Base URL for the weather API used to fetch weather data
 api_url = "https://api.open-meteo.com/v1/forecast"
 
+# Weather provider: 'open-meteo' for live data or 'stub' to serve fixed readings with no network
+weather_provider = os.environ.get('SKINWIZ_WEATHER_PROVIDER', 'open-meteo')
+
+# Weather request timeout (seconds), cache TTL (seconds) and the timezone that defines "today" for the daily UV index
+weather_request_timeout = 5
+weather_cache_ttl = 3 * 60 * 60
+weather_timezone = "America/New_York"
+
+# Precomputed city -> (temperature, uv_index_max, recommended_spf) table refreshed in bulk for all cities
+weather_table_path = 'datasets/weather/uv_spf_table.json'
@@ -0,0 +1,299 @@
+'''
+instrumentation.py
+
+Lightweight spans for the hot paths of the app and the data pipeline.
+A span times one call of an instrumented function (or a `with span(...)` block): wall time, CPU time of the calling
+thread, the rows it read and produced where the function reports them, and peak memory. Peak memory is the traced
+Python allocation peak above the span's start when tracemalloc is running (python -X tracemalloc), and the process's peak
+RSS otherwise. Spans nest per thread (and per asyncio task), so a request's spans form a tree below its root span.
+Finished spans are summed up per name in this process (see prometheus_text, served by service.py at GET /metrics). With
+SKINWIZ_METRICS_FILE=1 they are also appended as JSON lines to the local metrics file, in batches and at exit, and
+python -m instrumentation turns that file into Prometheus text for any process that wrote to it, e.g. for a node
+exporter textfile collector.
+
+Usage: python -m instrumentation [--metrics PATH] [--output PATH]
+
+'''
+
+import argparse
+import atexit
+import bisect
+import contextvars
+import functools
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from config import instrumentation_enabled, metrics_file_enabled, metrics_path, metrics_flush_spans, metrics_max_bytes
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Upper bounds (seconds) of the wall time histogram buckets
+span_buckets = [0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0, 120.0, 600.0]
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+_captured_spans = contextvars.ContextVar('captured_spans', default=None)
+
+
+class Span:
+    """One timed call: the timings and counts of a span while it runs, then its finished record."""
+
+    def __init__(self, name, parent, rows_in=None):
+        self.name = name
+        self.parent = parent
+        self.depth = parent.depth + 1 if parent is not None else 0
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.start_time = time.time()
+        self._traced_start = self._traced_peak = None
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            if parent is not None:
+                # The peak is reset for this span, so the parent keeps the peak it saw so far
+                parent._traced_peak = max(parent._traced_peak or 0, peak)
+            tracemalloc.reset_peak()
+            self._traced_start = self._traced_peak = current
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.thread_time()
+
+    def finish(self, error=None):
+        wall = time.perf_counter() - self._wall_start
+        cpu = time.thread_time() - self._cpu_start
+        record = {'name': self.name, 'parent': self.parent.name if self.parent is not None else None, 'depth': self.depth,
+                  'start': self.start_time, 'wall_s': wall, 'cpu_s': cpu,
+                  'rows_in': self.rows_in, 'rows_out': self.rows_out, 'peak_memory_bytes': None,
+                  'memory': None, 'pid': os.getpid()}
+        if self._traced_start is not None and tracemalloc.is_tracing():
+            peak = max(self._traced_peak, tracemalloc.get_traced_memory()[1])
+            record['peak_memory_bytes'], record['memory'] = peak - self._traced_start, 'traced'
+            if self.parent is not None and self.parent._traced_peak is not None:
+                self.parent._traced_peak = max(self.parent._traced_peak, peak)
+        elif resource is not None:
+            max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+            record['peak_memory_bytes'], record['memory'] = max_rss * (1 if sys.platform == 'darwin' else 1024), 'rss'
+        if error is not None:
+            record['error'] = type(error).__name__
+        return record
+
+
+class NullSpan:
+    """What span() yields while instrumentation is off: it takes the rows a block reports and records nothing."""
+
+    def __init__(self, rows_in=None):
+        self.rows_in = rows_in
+        self.rows_out = None
+
+
+class SpanStats:
+    """Running totals of the finished spans of one name, with a wall time histogram."""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.wall_s = 0.0
+        self.cpu_s = 0.0
+        self.rows_in = 0
+        self.rows_out = 0
+        self.peak_memory_bytes = 0
+        # Spans per histogram bucket (the last one past the largest bound), summed up into Prometheus' cumulative buckets
+        self.buckets = [0] * (len(span_buckets) + 1)
+
+    def add(self, record):
+        self.count += 1
+        self.errors += 'error' in record
+        self.wall_s += record['wall_s']
+        self.cpu_s += record['cpu_s']
+        self.rows_in += record['rows_in'] or 0
+        self.rows_out += record['rows_out'] or 0
+        self.peak_memory_bytes = max(self.peak_memory_bytes, record['peak_memory_bytes'] or 0)
+        self.buckets[bisect.bisect_left(span_buckets, record['wall_s'])] += 1
+
+
+class MetricsRecorder:
+    """Sums up finished spans per name and appends them to the metrics file (if any) in batches."""
+
+    def __init__(self, path=metrics_path, flush_spans=metrics_flush_spans, max_bytes=metrics_max_bytes):
+        self.path = path
+        self.flush_spans = flush_spans
+        self.max_bytes = max_bytes
+        self.stats = {}
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def record(self, record):
+        with self._lock:
+            self.stats.setdefault(record['name'], SpanStats()).add(record)
+            if not self.path:
+                return
+            self._pending.append(record)
+            if len(self._pending) < self.flush_spans:
+                return
+            pending, self._pending = self._pending, []
+        self._write(pending)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        self._write(pending)
+
+    def _write(self, records):
+        if not records or not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            # Keep one previous file once the metrics file reaches its size cap
+            if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                os.replace(self.path, f"{self.path}.1")
+            # One write per batch of whole lines, so processes appending to the same file do not interleave lines
+            with open(self.path, 'a') as f:
+                f.write(''.join(json.dumps(record) + '\n' for record in records))
+        except OSError as e:
+            print(f"Could not write metrics to '{self.path}': {e}")
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def reset(self):
+        with self._lock:
+            self.stats = {}
+            self._pending = []
+
+# Only the in-process totals unless the metrics file is turned on
+_recorder = MetricsRecorder(path=metrics_path if metrics_file_enabled else None)
+atexit.register(_recorder.flush)
+
+# Time a block as a span; the yielded Span takes the rows the block read and produced (span.rows_in, span.rows_out)
+@contextmanager
+def span(name, rows_in=None):
+    if not instrumentation_enabled:
+        yield NullSpan(rows_in)
+        return
+    current = Span(name, _current_span.get(), rows_in)
+    token = _current_span.set(current)
+    error = None
+    try:
+        yield current
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current_span.reset(token)
+        record = current.finish(error)
+        _recorder.record(record)
+        captured = _captured_spans.get()
+        if captured is not None:
+            captured.append(record)
+
+# Decorator running every call of a function in a span named after the function. rows_in(*args, **kwargs) and
+# rows_out(result) count the rows the call read and produced
+def instrumented(name=None, rows_in=None, rows_out=None):
+    def decorate(function):
+        span_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(span_name, rows_in(*args, **kwargs) if rows_in is not None else None) as current:
+                result = function(*args, **kwargs)
+                if rows_out is not None:
+                    current.rows_out = rows_out(result)
+                return result
+        return wrapper
+    return decorate
+
+# Report the rows read and/or produced by the innermost running span, for functions that only know them at the end
+def set_span_rows(rows_in=None, rows_out=None):
+    current = _current_span.get()
+    if current is None:
+        return
+    if rows_in is not None:
+        current.rows_in = rows_in
+    if rows_out is not None:
+        current.rows_out = rows_out
+
+# Collect the records of every span that finishes in this thread inside the block, innermost first (for a
+# per-request breakdown)
+@contextmanager
+def capture_spans():
+    records = []
+    token = _captured_spans.set(records)
+    try:
+        yield records
+    finally:
+        _captured_spans.reset(token)
+
+def flush_metrics():
+    _recorder.flush()
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# Prometheus text exposition of span totals ({name: SpanStats}, by default this process's)
+def prometheus_text(stats=None):
+    stats = _recorder.snapshot() if stats is None else stats
+    lines = []
+
+    def family(metric, metric_type, help_text):
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {metric_type}")
+
+    family('skinwiz_span_seconds', 'histogram', "Wall time of instrumented spans.")
+    for name, totals in sorted(stats.items()):
+        for bound, count in zip(span_buckets, itertools.accumulate(totals.buckets)):
+            lines.append(f'skinwiz_span_seconds_bucket{{span="{_label(name)}",le="{bound}"}} {count}')
+        lines.append(f'skinwiz_span_seconds_bucket{{span="{_label(name)}",le="+Inf"}} {totals.count}')
+        lines.append(f'skinwiz_span_seconds_sum{{span="{_label(name)}"}} {totals.wall_s:.6f}')
+        lines.append(f'skinwiz_span_seconds_count{{span="{_label(name)}"}} {totals.count}')
+
+    for metric, metric_type, attribute, help_text in [
+        ('skinwiz_span_cpu_seconds_total', 'counter', 'cpu_s', "CPU time of the threads running instrumented spans."),
+        ('skinwiz_span_errors_total', 'counter', 'errors', "Instrumented spans that raised an exception."),
+        ('skinwiz_span_rows_in_total', 'counter', 'rows_in', "Rows read by instrumented spans."),
+        ('skinwiz_span_rows_out_total', 'counter', 'rows_out', "Rows produced by instrumented spans."),
+        ('skinwiz_span_peak_memory_bytes', 'gauge', 'peak_memory_bytes', "Largest peak memory of an instrumented span."),
+    ]:
+        family(metric, metric_type, help_text)
+        for name, totals in sorted(stats.items()):
+            value = getattr(totals, attribute)
+            lines.append(f'{metric}{{span="{_label(name)}"}} {value:.6f}' if isinstance(value, float)
+                         else f'{metric}{{span="{_label(name)}"}} {value}')
+    return '\n'.join(lines) + '\n'
+
+# Span totals of every record in a metrics file
+def load_metrics(path=metrics_path):
+    stats = {}
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # A line cut short by a crash
+            stats.setdefault(record['name'], SpanStats()).add(record)
+    return stats
+
+# Write Prometheus text atomically (e.g. for a node exporter textfile collector)
+def write_prometheus(path, stats=None):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(f"{path}.tmp", 'w') as f:
+        f.write(prometheus_text(stats))
+    os.replace(f"{path}.tmp", path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--metrics', default=metrics_path, help="metrics file to summarize")
+    parser.add_argument('--output', help="file to write the Prometheus text to (default: print it)")
+    args = parser.parse_args()
+
+    stats = load_metrics(args.metrics)
+    if args.output:
+        write_prometheus(args.output, stats)
+    else:
+        print(prometheus_text(stats), end='')
@@ -12,21 +12,26 @@ Lydia Abebe - labebe@andrew.cmu.edu
 
 '''
 
-from scrapers.run_scrapers import run_all_scrapers
-from processing.run_cleaners import run_all_cleaners
-from processing.process_data import process_and_merge_data
 import streamlit as st
+import pandas as pd
 from user_input import get_user_input
-from recommendation import load_data, recommend_products, filter_exact_matches, recommend_sunscreens
-from weather_api import get_weather_data
-from config import merged_dataset_path, cities
+from recommendation_cache import get_recommendations
+from weather_api import get_weather_data, prefetch_weather_data
+from config import cities, debug_panel
 from streamlit_extras.stylable_container import stylable_container
-from plots.plot_location import plot_city_location
-from plots.plot_stats import plot_top_rated_reviewed, plot_price_dist_product_types
+from plots.figure_cache import get_figure, get_city_map
+from instrumentation import span, capture_spans
 
 # Page Configuration
 st.set_page_config(page_title="Skin Wiz App")
 
+# Warm the weather cache for every city once per server process
+@st.cache_resource
+def start_weather_prefetch():
+    return prefetch_weather_data()
+
+start_weather_prefetch()
+
 # Custom styles for the background and UI elements
 page_bg_img = f"""
 <style>
@@ -91,7 +96,8 @@ with header:
 # User Input Section
 user_input_container = st.container()
 
-with user_input_container:
+# Each run of the script (one per click or input change) is timed as one request, with the spans of everything it calls
+with user_input_container, capture_spans() as request_spans, span('app_request'):
     st.header("Fill out your information below")
 
    # Collecting user inputs
@@ -125,12 +131,13 @@ with user_input_container:
             if run_all_processes:
                 try:
                     st.write("Scraping and cleaning data from the web. Please wait...")
-                    run_all_scrapers()
-                    st.write("Scrapers ran successfully.")
-                    run_all_cleaners()
-                    st.write("Cleaners ran successfully.")
-                    process_and_merge_data()
-                    st.write("Data merged successfully.")
+                    # Re-scrape, then re-run only the cleaners and merge whose inputs actually changed
+                    # (the pipeline and its scraping stack are imported only when a refresh is requested)
+                    from pipeline import run_pipeline
+                    stage_results = run_pipeline(refresh_sources=True)
+                    for stage_name, record in stage_results.items():
+                        st.write(f"{stage_name}: {record['status']} ({record['seconds']:.1f}s)")
+                    st.write("Data pipeline ran successfully.")
                 except Exception as e:
                     st.write(f"Error running scrapers/cleaners/merge: {e}")
 
@@ -143,20 +150,19 @@ with user_input_container:
             except Exception as e:
                 st.write(f"Error fetching weather data: {e}")
 
-            # Recommend products
+            # Recommend products for every label, and sunscreens, served from the recommendation cache for repeated requests
+            # (no products are listed if the recommendations fail)
+            filtered_products_by_label = {label: pd.DataFrame() for label in user_input_labels}
+            sunscreen_products = pd.DataFrame()
             try:
-                recommended_df = recommend_products(load_data(merged_dataset_path), user_input_labels, user_input_skin_type, uv_index_max)
+                filtered_products_by_label, sunscreen_products = get_recommendations(user_input_labels, user_input_skin_type, user_input_skincare_improvement, user_input_price_range, age, uv_index_max)
             except Exception as e:
                 st.write(f"Error generating recommendations: {e}")
 
-            # Fetching recommendations
             for label in user_input_labels:
                 capitalized_label = label.title()
                 st.write(f"**Recommended Products for {capitalized_label}:**")
-                try:
-                    filtered_products = filter_exact_matches(recommended_df, [label], user_input_skin_type, user_input_skincare_improvement, user_input_price_range, age)
-                except Exception as e:
-                    st.write(f"Error filtering products: {e}")
+                filtered_products = filtered_products_by_label[label]
 
                 if not filtered_products.empty:
                     st.dataframe(filtered_products[['Product', 'Price', 'Rating', 'Review Count', 'Ingredients', 'URL']])
@@ -168,12 +174,8 @@ with user_input_container:
                 st.markdown(f"### <span style='font-size: 0.85em;'>You are from</span> **{location_name}**!", unsafe_allow_html=True)
 
                 if location_name in cities:
-                    lat = cities[location_name]["latitude"]
-                    lon = cities[location_name]["longitude"]
-
-                    # Plotting the city location
-                    fig = plot_city_location(lat, lon)
-                    st.pyplot(fig)
+                    # Showing the pre-rendered map of the city location
+                    st.image(get_city_map(location_name), use_container_width=True)
                 else:
                     st.write(f"Coordinates for {location_name} not found.")
 
@@ -184,10 +186,6 @@ with user_input_container:
             if uv_index_max > 5:
                 st.write("It’s sunny out there, so don’t forget your sunscreen! ☀️🧴")
                 st.write(f"**Recommended Sunscreen Products:**")
-                try:
-                    sunscreen_products = recommend_sunscreens(recommended_df, user_input_skin_type, user_input_price_range, uv_index_max)
-                except Exception as e:
-                    st.write(f"Error generating sunscreen recommendations: {e}")
 
                 if not sunscreen_products.empty:
                     st.dataframe(sunscreen_products[['Product', 'SPF', 'Price', 'Rating', 'Review Count', 'Ingredients', 'URL']])
@@ -200,9 +198,21 @@ with user_input_container:
         st.write("")   
         st.subheader("Check out some popular skincare statistics! ✨")
         st.write("##### Top 10 Most Highly Rated and Reviewed Products on Amazon")
-        fig_top_rated = plot_top_rated_reviewed()
-        st.pyplot(fig_top_rated)
+        st.image(get_figure('top_rated_reviewed'), use_container_width=True)
         st.write("")
         st.write("##### Price Distribution of Skincare products by Type")
-        fig_price_dist = plot_price_dist_product_types()
-        st.pyplot(fig_price_dist)
+        st.image(get_figure('price_dist_product_types'), use_container_width=True)
+
+# Per-request breakdown of the instrumented calls (set SKINWIZ_DEBUG_PANEL=1 to show it)
+if debug_panel:
+    with st.expander("Debug: where this request spent its time"):
+        st.dataframe([{'span': '    ' * record['depth'] + record['name'],
+                       'wall ms': round(record['wall_s'] * 1000, 2),
+                       'cpu ms': round(record['cpu_s'] * 1000, 2),
+                       'rows in': record['rows_in'],
+                       'rows out': record['rows_out'],
+                       'peak memory MB': round(record['peak_memory_bytes'] / 2 ** 20, 1) if record['peak_memory_bytes'] else None,
+                       'memory': record['memory'],
+                       'error': record.get('error')}
+                      for record in sorted(request_spans, key=lambda record: (record['start'], record['depth']))],
+                     use_container_width=True)
@@ -0,0 +1,210 @@
+'''
+pipeline.py
+
+Incremental runner for the data pipeline: the scrapers, the cleaners in processing/, the merge, the published catalog
+and the cached statistics figures and city maps.
+Each stage declares the files it reads and writes, and is fingerprinted by the content hash of those files.
+Only stale stages re-run, independent stages run in parallel, and every stage's timing is recorded in a state file.
+With the metrics file turned on (SKINWIZ_METRICS_FILE=1), the instrumentation spans of the run (see instrumentation.py)
+are flushed to it at the end, and the totals of the whole metrics file are written as Prometheus text for a textfile
+collector.
+
+Usage: python pipeline.py [--refresh-sources] [--force STAGE ...] [--workers N]
+
+'''
+
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from config import (raw_dataset_folder_path, cleaned_dataset_folder_path, merged_dataset_path, catalog_file_path, figure_cache_dir,
+                    city_map_dir, concern_rules_path, pipeline_state_path, pipeline_workers, metrics_file_enabled,
+                    metrics_path, metrics_prometheus_path)
+from storage import resolve_path
+from instrumentation import span, flush_metrics, load_metrics, write_prometheus
+
+
+class Stage:
+    """A pipeline step: a function (imported lazily from 'module:function') with its input and output files."""
+
+    def __init__(self, name, target, inputs, outputs, source=False):
+        self.name = name
+        self.target = target
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        # Source stages (scrapers) read the web, so their inputs can't tell whether they are stale
+        self.source = source
+
+    def run(self):
+        module_name, function_name = self.target.split(':')
+        getattr(importlib.import_module(module_name), function_name)()
+
+
+class PipelineError(Exception):
+    """Raised when one or more stages failed; dependents of a failed stage are not run."""
+
+
+def _raw(filename):
+    return os.path.join(raw_dataset_folder_path, filename)
+
+# Cleaned and merged datasets are tracked by the file they are stored in (Parquet or CSV, see storage.py)
+def _cleaned(filename):
+    return resolve_path(os.path.join(cleaned_dataset_folder_path, filename))
+
+# The stages and the files they read and write
+stages = [
+    Stage('scrape_skincare_ings', 'scrapers.skincare_ings_scrape:scrape_skincare_ingredients_dataset',
+          inputs=[], outputs=[_raw('openml_dataset_43481.csv')], source=True),
+    Stage('scrape_banned_ings', 'scrapers.banned_ings_scrape:scrape_banned_ingredients_dataset',
+          inputs=[], outputs=[_raw('banned_skincare_ings.csv')], source=True),
+    Stage('scrape_amazon', 'scrapers.demo_amazon_scrape:demo_scrape_amazon_products',
+          inputs=[_raw('openml_dataset_43481.csv')], outputs=[_raw('demo_amazon_data.csv')], source=True),
+    Stage('clean_skincare_ings', 'processing.skincare_ings_clean:clean_skincare_ingredients',
+          inputs=[_raw('openml_dataset_43481.csv')], outputs=[_cleaned('skincare_ingredients.csv')]),
+    Stage('clean_banned_ings', 'processing.banned_skincare_ings_clean:clean_banned_skincare_ingredients',
+          inputs=[_raw('banned_skincare_ings.csv')], outputs=[_cleaned('banned_skincare_ings.csv')]),
+    Stage('clean_amazon', 'processing.amazon_data_clean:clean_amazon_data',
+          inputs=[_raw('amazon_data.csv')], outputs=[_cleaned('amazon_data.csv')]),
+    Stage('merge', 'processing.process_data:process_and_merge_data',
+          inputs=[_cleaned('banned_skincare_ings.csv'), _cleaned('skincare_ingredients.csv'), _cleaned('amazon_data.csv'),
+                  concern_rules_path],
+          outputs=[resolve_path(merged_dataset_path)]),
+    Stage('publish_catalog', 'catalog:publish_catalog',
+          inputs=[resolve_path(merged_dataset_path)], outputs=[catalog_file_path]),
+    Stage('render_figures', 'plots.figure_cache:render_all_figures',
+          inputs=[catalog_file_path], outputs=[os.path.join(figure_cache_dir, 'manifest.json')]),
+    Stage('render_city_maps', 'plots.figure_cache:render_city_maps',
+          inputs=['config.py'], outputs=[os.path.join(city_map_dir, 'manifest.json')]),
+]
+
+# Content hash of a file, or None if it does not exist
+def file_hash(path):
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_state(state_path=pipeline_state_path):
+    try:
+        with open(state_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_state(state, state_path=pipeline_state_path):
+    os.makedirs(os.path.dirname(state_path) or '.', exist_ok=True)
+    tmp_path = f"{state_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp_path, state_path)
+
+# Map each stage to the stages that produce its inputs
+def stage_dependencies(stage_list):
+    producers = {output: stage.name for stage in stage_list for output in stage.outputs}
+    return {stage.name: {producers[path] for path in stage.inputs if path in producers and producers[path] != stage.name}
+            for stage in stage_list}
+
+# Decide whether a stage has to run, given its last recorded fingerprints
+def is_stale(stage, stage_state, refresh_sources=False):
+    if any(not os.path.exists(path) for path in stage.outputs):
+        return True
+    if stage.source:
+        return refresh_sources  # Existing scraped files are trusted until a refresh is requested
+    if not stage_state:
+        return True
+    if any(file_hash(path) != stage_state['inputs'].get(path) for path in stage.inputs):
+        return True
+    return any(file_hash(path) != stage_state['outputs'].get(path) for path in stage.outputs)
+
+# Flush this run's spans, then write the span totals of the whole metrics file (every run and process) as Prometheus text
+def write_pipeline_metrics(metrics_file=metrics_path, prometheus_path=metrics_prometheus_path):
+    if not metrics_file_enabled:
+        return
+    flush_metrics()
+    if not os.path.exists(metrics_file):
+        return  # Instrumentation is turned off
+    try:
+        write_prometheus(prometheus_path, load_metrics(metrics_file))
+    except OSError as e:
+        print(f"Could not write pipeline metrics to '{prometheus_path}': {e}")
+
+# Run every stale stage, in parallel where the dependencies allow it, and return {stage: record}
+def run_pipeline(refresh_sources=False, force=(), workers=pipeline_workers, stage_list=None, state_path=pipeline_state_path):
+    stage_list = stage_list or stages
+    by_name = {stage.name: stage for stage in stage_list}
+    dependencies = stage_dependencies(stage_list)
+    state = load_state(state_path)
+    state_lock = threading.Lock()
+
+    def run_stage(stage):
+        record = {'status': 'skipped', 'seconds': 0.0}
+        if stage.name in force or is_stale(stage, state.get(stage.name), refresh_sources):
+            print(f"Running stage '{stage.name}'...")
+            start = time.perf_counter()
+            with span(f"stage:{stage.name}"):
+                stage.run()
+            record = {'status': 'ran', 'seconds': round(time.perf_counter() - start, 3)}
+
+        # Record the fingerprints the stage is now up to date with
+        with state_lock:
+            stage_state = state.setdefault(stage.name, {})
+            stage_state['inputs'] = {path: file_hash(path) for path in stage.inputs}
+            stage_state['outputs'] = {path: file_hash(path) for path in stage.outputs}
+            if record['status'] == 'ran':
+                stage_state['last_run'] = time.time()
+                stage_state['seconds'] = record['seconds']
+        return record
+
+    results = {}
+    pending = dict(dependencies)
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while pending or running:
+            # Submit every stage whose upstream stages have all finished
+            ready = [name for name, deps in pending.items() if deps <= results.keys()]
+            for name in ready:
+                deps = pending.pop(name)
+                if any(results[dep]['status'] in ('failed', 'blocked') for dep in deps):
+                    results[name] = {'status': 'blocked', 'seconds': 0.0}
+                else:
+                    running[executor.submit(run_stage, by_name[name])] = name
+
+            if not running:
+                if ready:
+                    continue  # Blocked stages may have released their dependents
+                raise PipelineError(f"Circular stage dependencies between: {', '.join(pending)}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    print(f"Stage '{name}' failed: {e}")
+                    results[name] = {'status': 'failed', 'seconds': 0.0, 'error': str(e)}
+
+    save_state(state, state_path)
+    write_pipeline_metrics()
+
+    failed = [name for name, record in results.items() if record['status'] == 'failed']
+    if failed:
+        raise PipelineError(f"Pipeline stages failed: {', '.join(failed)}")
+    return {stage.name: results[stage.name] for stage in stage_list}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the stale stages of the SkinWiz data pipeline.")
+    parser.add_argument('--refresh-sources', action='store_true', help="re-run the scrapers")
+    parser.add_argument('--force', nargs='*', default=[], help="stages to run even if they are up to date")
+    parser.add_argument('--workers', type=int, default=pipeline_workers)
+    args = parser.parse_args()
+
+    for stage_name, record in run_pipeline(args.refresh_sources, args.force, args.workers).items():
+        print(f"{stage_name:<22} {record['status']:<8} {record['seconds']:8.3f} s")
@@ -0,0 +1,202 @@
+'''
+figure_cache.py
+
+Cache of the rendered statistics figures, so the app serves image bytes instead of re-rendering matplotlib plots per click.
+Figures only change with the dataset, so each one is stored under a key made of the dataset fingerprint and the plot
+parameters (figure name, format, dpi). The pipeline renders every figure right after the merge, and the app reads
+the bytes from memory or from the cache directory, rendering a missing figure once on demand.
+The city location maps are pre-rendered the same way for every configured city, keyed on the city's coordinates.
+matplotlib and the plot modules are only imported when a figure actually has to be rendered.
+
+'''
+
+import functools
+import hashlib
+import importlib
+import io
+import json
+import os
+import threading
+from importlib.metadata import version
+from config import merged_dataset_path, figure_cache_dir, figure_dpi, cities, city_map_dir, city_map_zoom
+from catalog import get_catalog
+from instrumentation import instrumented
+
+# Bump when a plot function changes, so figures rendered by the old code are not served
+figure_version = 1
+
+# Figure name -> 'module:function' of the plot function, imported on first render
+figures = {
+    'top_rated_reviewed': 'plots.plot_stats:plot_top_rated_reviewed',
+    'price_dist_product_types': 'plots.plot_stats:plot_price_dist_product_types',
+}
+
+# Installed matplotlib version, part of every cache key; looked up on the first key so importing this module never
+# touches matplotlib
+@functools.lru_cache(maxsize=None)
+def matplotlib_version():
+    return version('matplotlib')
+
+_figure_bytes = {}
+_figure_lock = threading.Lock()
+# pyplot keeps global state (the current figure), so figures are drawn and saved one at a time across threads
+_render_lock = threading.Lock()
+
+# Cache file name for a figure of a dataset version rendered with the given parameters
+def figure_file_name(name, fingerprint, fmt='png', dpi=figure_dpi):
+    params = {'name': name, 'fingerprint': fingerprint, 'format': fmt, 'dpi': dpi, 'version': figure_version,
+              'matplotlib': matplotlib_version()}
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+    return f"{name}-{digest[:16]}.{fmt}"
+
+def _import_pyplot():
+    import matplotlib
+
+    # Figures are only rendered to bytes, possibly from pipeline worker threads, so no GUI backend is needed
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+def _plot_function(target):
+    _import_pyplot()
+    module_name, function_name = target.split(':')
+    return getattr(importlib.import_module(module_name), function_name)
+
+def _figure_bytes_of(fig, fmt, dpi):
+    plt = _import_pyplot()
+    buffer = io.BytesIO()
+    try:
+        fig.savefig(buffer, format=fmt, dpi=dpi, bbox_inches='tight')
+    finally:
+        plt.close(fig)
+    return buffer.getvalue()
+
+# Render a figure to PNG or SVG bytes, with the same settings st.pyplot uses
+def render_figure(name, fmt='png', dpi=figure_dpi, dataset_path=merged_dataset_path):
+    plot = _plot_function(figures[name])
+    with _render_lock:
+        return _figure_bytes_of(plot(dataset_path), fmt, dpi)
+
+def _write_atomic(path, data):
+    # One temporary file per thread, as app sessions and pipeline stages may write the same figure at once
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+# Return the rendered bytes of a figure for the current dataset, from memory, the cache directory, or a fresh render
+@instrumented()
+def get_figure(name, fmt='png', dpi=figure_dpi, dataset_path=merged_dataset_path, cache_dir=figure_cache_dir):
+    file_name = figure_file_name(name, get_catalog(dataset_path).fingerprint, fmt, dpi)
+
+    with _figure_lock:
+        data = _figure_bytes.get(file_name)
+    if data is not None:
+        return data
+
+    path = os.path.join(cache_dir, file_name)
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        data = render_figure(name, fmt, dpi, dataset_path)
+        os.makedirs(cache_dir, exist_ok=True)
+        _write_atomic(path, data)
+
+    # Keep only the current dataset version of each figure in memory
+    with _figure_lock:
+        for key in [key for key in _figure_bytes if key.startswith(f"{name}-") and key.endswith(f".{fmt}")]:
+            del _figure_bytes[key]
+        _figure_bytes[file_name] = data
+    return data
+
+# Render every figure for the current dataset into the cache directory and drop the files of older versions
+def render_all_figures(fmt='png', dpi=figure_dpi, dataset_path=merged_dataset_path, cache_dir=figure_cache_dir):
+    fingerprint = get_catalog(dataset_path).fingerprint
+    os.makedirs(cache_dir, exist_ok=True)
+
+    manifest = {'fingerprint': fingerprint, 'figures': {}}
+    for name in figures:
+        file_name = figure_file_name(name, fingerprint, fmt, dpi)
+        _write_atomic(os.path.join(cache_dir, file_name), render_figure(name, fmt, dpi, dataset_path))
+        manifest['figures'][name] = file_name
+
+    for file_name in os.listdir(cache_dir):
+        if file_name.endswith(('.png', '.svg')) and file_name not in manifest['figures'].values():
+            os.remove(os.path.join(cache_dir, file_name))
+
+    # The manifest is the pipeline stage's output, so it is written last
+    _write_atomic(os.path.join(cache_dir, 'manifest.json'), json.dumps(manifest, indent=1).encode())
+    print(f"Rendered {len(manifest['figures'])} figures to '{cache_dir}'")
+    return manifest
+
+# Cache file name for the map of a city, keyed on its coordinates and the rendering parameters
+def city_map_file_name(selected_city, zoom=city_map_zoom, dpi=figure_dpi):
+    params = {'city': selected_city, 'latitude': cities[selected_city]['latitude'],
+              'longitude': cities[selected_city]['longitude'], 'zoom': zoom, 'dpi': dpi, 'version': figure_version,
+              'matplotlib': matplotlib_version()}
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+    slug = ''.join(char if char.isalnum() else '_' for char in selected_city.lower())
+    return f"{slug}-{digest[:16]}.png"
+
+# Render the map of a city to PNG bytes, returning them with the number of basemap tiles that were unavailable
+def render_city_map(selected_city, zoom=city_map_zoom, dpi=figure_dpi, tile_cache=None):
+    draw_city_location = _plot_function('plots.plot_location:draw_city_location')
+    with _render_lock:
+        fig, missing_tiles = draw_city_location(cities[selected_city]['latitude'], cities[selected_city]['longitude'],
+                                                zoom, tile_cache)
+        return _figure_bytes_of(fig, 'png', dpi), missing_tiles
+
+# Return the map image of a configured city, from memory or the cache directory, rendering it if needed.
+# Maps with missing basemap tiles are served but not cached, so they are completed once the tiles are available
+@instrumented()
+def get_city_map(selected_city, zoom=city_map_zoom, dpi=figure_dpi, cache_dir=city_map_dir):
+    file_name = city_map_file_name(selected_city, zoom, dpi)
+
+    with _figure_lock:
+        data = _figure_bytes.get(file_name)
+    if data is not None:
+        return data
+
+    path = os.path.join(cache_dir, file_name)
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        data, missing_tiles = render_city_map(selected_city, zoom, dpi)
+        if missing_tiles:
+            return data
+        os.makedirs(cache_dir, exist_ok=True)
+        _write_atomic(path, data)
+
+    with _figure_lock:
+        _figure_bytes[file_name] = data
+    return data
+
+# Pre-render the map of every configured city (basemap tiles come through the tile cache) and drop stale map files
+def render_city_maps(zoom=city_map_zoom, dpi=figure_dpi, cache_dir=city_map_dir):
+    os.makedirs(cache_dir, exist_ok=True)
+
+    manifest = {'maps': {}, 'incomplete': []}
+    for selected_city in cities:
+        file_name = city_map_file_name(selected_city, zoom, dpi)
+        data, missing_tiles = render_city_map(selected_city, zoom, dpi)
+        if missing_tiles:
+            manifest['incomplete'].append(selected_city)
+            continue
+        _write_atomic(os.path.join(cache_dir, file_name), data)
+        manifest['maps'][selected_city] = file_name
+
+    for file_name in os.listdir(cache_dir):
+        if file_name.endswith('.png') and file_name not in manifest['maps'].values():
+            os.remove(os.path.join(cache_dir, file_name))
+
+    _write_atomic(os.path.join(cache_dir, 'manifest.json'), json.dumps(manifest, indent=1).encode())
+    print(f"Rendered {len(manifest['maps'])} city maps to '{cache_dir}'")
+    if manifest['incomplete']:
+        print(f"Basemap tiles missing for: {', '.join(manifest['incomplete'])}")
+    return manifest
+
+if __name__ == "__main__":
+    render_all_figures()
+    render_city_maps()
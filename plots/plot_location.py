@@ -2,34 +2,50 @@
 plot_location.py
 
 This module helps plot the input city location using its latitude and longitude coordinates.
+The OpenStreetMap basemap comes from the local tile cache (see tile_cache.py), so no GIS libraries are needed and
+maps can be drawn offline.
 
 '''
 
-import geopandas as gpd
+import numpy as np
 import matplotlib.pyplot as plt
-import contextily as ctx
-from shapely.geometry import Point
+from config import city_map_zoom
+from plots.tile_cache import TileCache, basemap_image
+from instrumentation import instrumented
 
-# Function to plot the latitude and longitude of a city and return the figure
-def plot_city_location(lat, lon):
-    # Create a GeoDataFrame for the city location
-    city = gpd.GeoDataFrame(geometry=[Point(lon, lat)], crs="EPSG:4326")
+_tile_cache = None
+
+def get_tile_cache():
+    global _tile_cache
+    if _tile_cache is None:
+        _tile_cache = TileCache()
+    return _tile_cache
+
+# Plot a city location on its basemap and return the figure with the number of basemap tiles that were unavailable
+@instrumented()
+def draw_city_location(lat, lon, zoom=city_map_zoom, tile_cache=None):
+    # Zoom out around the city
+    west, east = lon - 10, lon + 10
+    south, north = lat - 6, lat + 6
 
     # Plot the city on a map with smaller figure size
     fig, ax = plt.subplots(figsize=(4, 4))  # Adjust figsize for a smaller plot
-    
+
     # Remove white background
     fig.patch.set_alpha(0)
 
-    # Plot the city location with a custom marker resembling a location dropper
-    city.plot(ax=ax, color='red', marker='v', markersize=100)  # 'v' resembles a location marker
+    # Add a lightweight OpenStreetMap basemap at a lower zoom, resampled to longitude/latitude
+    basemap, missing_tiles = basemap_image(west, south, east, north, zoom, tile_cache or get_tile_cache())
+    ax.imshow(basemap, extent=(west, east, south, north), interpolation='bilinear', zorder=0)
+    ax.text(0.99, 0.01, '© OpenStreetMap contributors', transform=ax.transAxes, ha='right', va='bottom', fontsize=3.5)
 
-    # Set the limits to zoom out (increase the range around the city)
-    ax.set_xlim([lon - 10, lon + 10])  # Zoom out horizontally
-    ax.set_ylim([lat - 6, lat + 6])    # Zoom out vertically
+    # Plot the city location with a custom marker resembling a location dropper
+    ax.scatter([lon], [lat], color='red', marker='v', s=100, zorder=1)  # 'v' resembles a location marker
 
-    # Add a lightweight OpenStreetMap basemap at a lower zoom
-    ctx.add_basemap(ax, zoom=4, source=ctx.providers.OpenStreetMap.Mapnik, crs=city.crs.to_string())
+    # Set the limits and keep degrees of longitude and latitude in proportion, like a geographic plot
+    ax.set_xlim([west, east])
+    ax.set_ylim([south, north])
+    ax.set_aspect(1 / np.cos(np.radians(lat)))
 
     # Set x and y axis labels with increased font size
     ax.set_xlabel("Longitude", fontsize=6.5)
@@ -41,4 +57,10 @@ def plot_city_location(lat, lon):
     # Add a title with larger font size
     ax.set_title('City Location in America', fontsize=8)
 
+    return fig, missing_tiles
+
+# Function to plot the latitude and longitude of a city and return the figure
+@instrumented()
+def plot_city_location(lat, lon):
+    fig, _ = draw_city_location(lat, lon)
     return fig
@@ -2,23 +2,27 @@
 plot_stats.py
 
 This module helps plot visualizations to display some skincare statistics.
+The plots read the shared product catalog (see catalog.py) and copy out only the rows they draw.
 
 '''
 
-import pandas as pd
+import numpy as np
 import matplotlib.pyplot as plt
+from catalog import get_catalog
 from config import merged_dataset_path
+from instrumentation import instrumented, set_span_rows
 
 # Function to plot Top 10 Most Highly Rated and Reviewed Products
-def plot_top_rated_reviewed():
-    df = pd.read_csv(merged_dataset_path)
+@instrumented()
+def plot_top_rated_reviewed(dataset_path=merged_dataset_path):
+    catalog = get_catalog(dataset_path)
 
-    df['Review Count'] = pd.to_numeric(df['Review Count'], errors='coerce')
-    df['Rating'] = pd.to_numeric(df['Rating'], errors='coerce')
+    # Highest Rating first, then most reviews
+    top_positions = np.lexsort((-catalog.column('Review Count'), -catalog.rating))[:10]
+    top_10_products = catalog.rows(top_positions)
+    set_span_rows(rows_in=len(catalog), rows_out=len(top_10_products))
 
-    df['Brand_Name'] = df['Brand_Name'].str.title()
-
-    top_10_products = df.sort_values(by=['Rating', 'Review Count'], ascending=[False, False]).head(10)
+    top_10_products['Brand_Name'] = top_10_products['Brand_Name'].str.title()
 
     fig, ax = plt.subplots(figsize=(10, 6), facecolor='none')
 
@@ -32,26 +36,33 @@ def plot_top_rated_reviewed():
 
     ax.set_title('Top 10 Most Highly Rated and Reviewed Products')
     ax.legend()
-    plt.tight_layout()
+    fig.tight_layout()
 
     return fig
 
 # Function to plot Boxplot of Price for Each Product Type
-def plot_price_dist_product_types():
-    df = pd.read_csv(merged_dataset_path)
-
-    df['Label'] = df['Label'].str.title()
+@instrumented()
+def plot_price_dist_product_types(dataset_path=merged_dataset_path):
+    catalog = get_catalog(dataset_path)
+
+    # The rows of a label are contiguous in the catalog, so each box reads a slice of the price column
+    prices = []
+    for label in catalog.labels:
+        start, stop = catalog.label_range(label)
+        label_prices = catalog.price[start:stop]
+        prices.append(label_prices[~np.isnan(label_prices)])
+    set_span_rows(rows_in=len(catalog), rows_out=sum(len(label_prices) for label_prices in prices))
 
     fig, ax = plt.subplots(figsize=(10, 6), facecolor='none')
 
-    df.boxplot(column='Price', by='Label', grid=False, vert=False, patch_artist=True,
-               ax=ax, boxprops=dict(facecolor='pink'),
+    ax.boxplot(prices, vert=False, patch_artist=True,
+               boxprops=dict(facecolor='pink'),
                flierprops=dict(marker='o', color='red', markersize=6))
+    ax.set_yticks(range(1, len(prices) + 1), [label.title() for label in catalog.labels])
 
     ax.set_title('Boxplot of Price for Each Product Type')
     ax.set_xlabel('Price (in $)')
     ax.set_ylabel('Product Type')
-    plt.suptitle('')
-    plt.tight_layout()
+    fig.tight_layout()
 
     return fig
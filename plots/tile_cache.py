@@ -0,0 +1,152 @@
+'''
+tile_cache.py
+
+Local disk cache of OpenStreetMap basemap tiles, used to draw the city location maps without a GIS stack.
+Tiles are stored as {z}/{x}/{y}.png under the cache directory, which is capped in size by evicting the least recently
+used tiles. In offline mode only tiles already in the directory are used, so maps render with the network disabled
+from a pre-filled (or copied-in) tile directory.
+The stitched Web Mercator tiles are resampled to a plain longitude/latitude grid with NumPy.
+
+'''
+
+import io
+import math
+import os
+import threading
+import numpy as np
+import matplotlib.image as mpimg
+import requests
+from config import tile_url, tile_cache_dir, tile_cache_max_bytes, tile_offline, tile_request_timeout
+
+tile_size = 256
+
+
+class TileUnavailableError(Exception):
+    """Raised when a tile is neither in the cache nor downloadable (offline mode or a failed request)."""
+
+
+class TileCache:
+    """Tile store on local disk with a least-recently-used size cap (file mtime marks the last use)."""
+
+    def __init__(self, cache_dir=tile_cache_dir, max_bytes=tile_cache_max_bytes, url=tile_url, offline=tile_offline,
+                 timeout=tile_request_timeout):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.url = url
+        self.offline = offline
+        self.timeout = timeout
+        self._session = None
+        self._total_bytes = None
+        self._lock = threading.Lock()
+
+    def tile_path(self, z, x, y):
+        return os.path.join(self.cache_dir, str(z), str(x), f"{y}.png")
+
+    def _tile_files(self):
+        for root, _, file_names in os.walk(self.cache_dir):
+            for file_name in file_names:
+                if file_name.endswith('.png'):
+                    path = os.path.join(root, file_name)
+                    stat = os.stat(path)
+                    yield stat.st_mtime, stat.st_size, path
+
+    # Delete the least recently used tiles until the cache fits its size cap
+    def evict(self):
+        with self._lock:
+            files = sorted(self._tile_files())
+            self._total_bytes = sum(size for _, size, _ in files)
+            for _, size, path in files:
+                if self._total_bytes <= self.max_bytes:
+                    break
+                os.remove(path)
+                self._total_bytes -= size
+            return self._total_bytes
+
+    def _download(self, z, x, y):
+        if self._session is None:
+            self._session = requests.Session()
+            # The OpenStreetMap tile usage policy asks clients to identify themselves
+            self._session.headers['User-Agent'] = 'SkinWiz basemap tile cache'
+        response = self._session.get(self.url.format(z=z, x=x, y=y), timeout=self.timeout)
+        response.raise_for_status()
+        return response.content
+
+    # Return the PNG bytes of a tile from the cache, downloading it first unless offline
+    def get(self, z, x, y):
+        path = self.tile_path(z, x, y)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # Mark as recently used
+            return data
+        except FileNotFoundError:
+            pass
+
+        if self.offline:
+            raise TileUnavailableError(f"Tile {z}/{x}/{y} is not in '{self.cache_dir}' (offline mode)")
+        try:
+            data = self._download(z, x, y)
+        except requests.RequestException as e:
+            raise TileUnavailableError(f"Tile {z}/{x}/{y} could not be downloaded: {e}") from e
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes += len(data)
+            over_cap = self._total_bytes is None or self._total_bytes > self.max_bytes
+        if over_cap:
+            self.evict()
+        return data
+
+    # Return a tile as an RGBA float array
+    def get_image(self, z, x, y):
+        image = mpimg.imread(io.BytesIO(self.get(z, x, y)), format='png')
+        if image.ndim == 2:
+            image = np.stack([image] * 3, axis=-1)
+        if image.shape[2] == 3:
+            image = np.concatenate([image, np.ones(image.shape[:2] + (1,), dtype=image.dtype)], axis=-1)
+        return image
+
+# Fractional Web Mercator tile coordinates of a longitude / latitude at a zoom level
+def lon_to_tile_x(lon, zoom):
+    return (np.asarray(lon) + 180.0) / 360.0 * 2 ** zoom
+
+def lat_to_tile_y(lat, zoom):
+    lat = np.radians(np.clip(lat, -85.0511, 85.0511))
+    return (1.0 - np.arcsinh(np.tan(lat)) / math.pi) / 2.0 * 2 ** zoom
+
+# Stitch the tiles covering a lon/lat box and resample them onto an evenly spaced lon/lat grid.
+# Returns the RGBA image (north up) and the number of tiles that were unavailable and left blank
+def basemap_image(west, south, east, north, zoom, tile_cache):
+    num_tiles = 2 ** zoom
+    x_min = max(0, int(math.floor(lon_to_tile_x(west, zoom))))
+    x_max = min(num_tiles - 1, int(math.floor(lon_to_tile_x(east, zoom))))
+    y_min = max(0, int(math.floor(lat_to_tile_y(north, zoom))))
+    y_max = min(num_tiles - 1, int(math.floor(lat_to_tile_y(south, zoom))))
+
+    # Missing tiles stay light grey
+    mosaic = np.full(((y_max - y_min + 1) * tile_size, (x_max - x_min + 1) * tile_size, 4), 0.9, dtype=np.float32)
+    missing_tiles = 0
+    for tile_x in range(x_min, x_max + 1):
+        for tile_y in range(y_min, y_max + 1):
+            try:
+                tile = tile_cache.get_image(zoom, tile_x, tile_y)
+            except TileUnavailableError as e:
+                print(e)
+                missing_tiles += 1
+                continue
+            row, col = (tile_y - y_min) * tile_size, (tile_x - x_min) * tile_size
+            mosaic[row:row + tile_size, col:col + tile_size] = tile[:tile_size, :tile_size]
+
+    # Mercator x is linear in longitude, y is not: look up the source pixel of every output row and column
+    height, width = mosaic.shape[:2]
+    lons = np.linspace(west, east, width)
+    lats = np.linspace(north, south, height)
+    cols = np.clip(((lon_to_tile_x(lons, zoom) - x_min) * tile_size).astype(int), 0, width - 1)
+    rows = np.clip(((lat_to_tile_y(lats, zoom) - y_min) * tile_size).astype(int), 0, height - 1)
+    return mosaic[rows[:, None], cols[None, :]], missing_tiles
@@ -2,84 +2,111 @@
 amazon_data_clean.py
 
 Cleans the scraped amazon_data.csv file
+The raw scrape is streamed in chunks and the cleaned rows are written out as they are produced (see storage.py),
+so memory stays flat however big the scrape gets.
 
 '''
 
-import pandas as pd
-import numpy as np
 import os
+import re
+from collections import deque
+import pandas as pd
 from config import raw_dataset_folder_path, cleaned_dataset_folder_path
-
-def clean_amazon_data():
-    
-    raw_file_path = os.path.join(raw_dataset_folder_path, 'amazon_data.csv')
-    cleaned_file_path = os.path.join(cleaned_dataset_folder_path, 'amazon_data.csv')
-
-    # Read the raw CSV file
-    df = pd.read_csv(raw_file_path)
-
-    # Create a table containing Link Text and URL
-    df_link_text = df[['Link Text', 'URL']].copy()  # Copy Link Text and URL columns
-
-    # Remove unwanted rows based on specific keywords
-    unwanted_phrases = [
-        'new offer', 'Learn more', 'Visit the help section', 'contact us', 
-        'Remove', 'Leave ad feedback', 'Refresh Your BeautyRefresh Your Beauty',
-        'CleansersCleansers', 'Best SellersBest Sellers', 'MasksMasks'
-    ]
-    for phrase in unwanted_phrases:
-        df_link_text = df_link_text[~df_link_text['Link Text'].str.contains(phrase, na=False)]
-
-    # Initialize a list to store the transposed data
-    transposed_data = []
-    i = 0  # Initialize the index to 0
-
-    # Iterate over the DataFrame until all rows are processed
-    while i < len(df_link_text):
-        product, review_count, price, url = None, np.nan, np.nan, None
+from storage import DatasetWriter
+from instrumentation import instrumented, set_span_rows
+
+# Link texts containing any of these phrases are navigation or ads, not product data
+unwanted_phrases = [
+    'new offer', 'Learn more', 'Visit the help section', 'contact us',
+    'Remove', 'Leave ad feedback', 'Refresh Your BeautyRefresh Your Beauty',
+    'CleansersCleansers', 'Best SellersBest Sellers', 'MasksMasks'
+]
+unwanted_pattern = re.compile('|'.join(re.escape(phrase) for phrase in unwanted_phrases))
+
+cleaned_columns = ['Product', 'Review Count', 'Price', 'URL', 'Rating']
+
+# Regroup the filtered (link text, URL) rows into (product, review count, price, URL) tuples
+def regroup_products(link_rows):
+    link_rows = iter(link_rows)
+    window = deque()
+
+    def fill_window():
+        while len(window) < 3:
+            next_row = next(link_rows, None)
+            if next_row is None:
+                return
+            window.append(next_row)
+
+    fill_window()
+    while window:
+        product, review_count, price, url = window[0][0], None, None, None
 
         # Extract product, review count, and price in groups of 3
-        if i < len(df_link_text):
-            product = df_link_text.iloc[i]['Link Text']
-        if i + 1 < len(df_link_text):
-            review_count_value = df_link_text.iloc[i + 1]['Link Text']
-            if pd.notna(review_count_value) and str(review_count_value).replace(',', '').isdigit():
+        if len(window) > 1:
+            review_count_value = window[1][0]
+            if isinstance(review_count_value, str) and review_count_value.replace(',', '').isdigit():
                 review_count = review_count_value.replace(',', '')  # Clean commas in review count
-        if i + 2 < len(df_link_text):
-            price_value = df_link_text.iloc[i + 2]['Link Text']
-            if pd.notna(price_value) and str(price_value).startswith('$'):
+        if len(window) > 2:
+            price_value, url_value = window[2]
+            if isinstance(price_value, str) and price_value.startswith('$'):
                 price = price_value.split('(')[0]  # Remove nested details in parentheses
                 price = '$' + price.split('$')[1] if '$' in price else price  # Keep only one price
-                url = df_link_text.iloc[i + 2]['URL'].split('?')[0]  # Clean URL to remove query parameters
+                if isinstance(url_value, str):
+                    url = url_value.split('?')[0]  # Clean URL to remove query parameters
 
-                # Fix for malformed URLs
-                if pd.notna(url):
+                    # Fix for malformed URLs
                     if url.count('https://') > 1:
                         url = url[url.find('https://', url.find('https://') + 1):]  # Keep the second part of malformed URL
 
-        # Append the transposed data
-        transposed_data.append([product, review_count, price, url])
+        yield product, review_count, price, url
 
         # Move to the next group of rows
-        next_group_size = 3 if pd.notna(review_count) and pd.notna(price) else 2 if pd.isna(review_count) or pd.isna(price) else 1
-        i += next_group_size
+        next_group_size = 3 if review_count is not None and price is not None else 2
+        for _ in range(min(next_group_size, len(window))):
+            window.popleft()
+        fill_window()
 
-    # Convert the transposed data to a DataFrame
-    transposed_df = pd.DataFrame(transposed_data, columns=['Product', 'Review Count', 'Price', 'URL'])
+@instrumented()
+def clean_amazon_data(chunk_size=50000):
 
-    # Clean the Rating column
-    df_rating = df[['Rating']].copy().dropna().reset_index(drop=True)
-    df_rating['Rating'] = df_rating['Rating'].apply(lambda x: x.split(' ')[0] if pd.notna(x) else x)  # Extract numeric rating
-
-    # Ensure both transposed_df and df_rating have the same number of rows
-    if len(transposed_df) > len(df_rating):
-        transposed_df = transposed_df.iloc[:len(df_rating)]
-    elif len(df_rating) > len(transposed_df):
-        df_rating = df_rating.iloc[:len(transposed_df)]
+    raw_file_path = os.path.join(raw_dataset_folder_path, 'amazon_data.csv')
+    cleaned_file_path = os.path.join(cleaned_dataset_folder_path, 'amazon_data.csv')
 
-    # Combine the two DataFrames
-    final_df = pd.concat([transposed_df.reset_index(drop=True), df_rating.reset_index(drop=True)], axis=1).dropna()
+    # Ratings are paired with products by position, in the order both appear in the scrape
+    pending_ratings = deque()
+    rows_read = 0
+
+    # Stream (Link Text, URL) rows from the raw CSV, dropping unwanted rows with one compiled regex
+    def link_rows():
+        nonlocal rows_read
+        for chunk in pd.read_csv(raw_file_path, usecols=['Link Text', 'Rating', 'URL'], dtype=str, chunksize=chunk_size):
+            rows_read += len(chunk)
+            # Clean the Rating column
+            pending_ratings.extend(rating.split(' ')[0] for rating in chunk['Rating'].dropna())  # Extract numeric rating
+
+            for link_text, url in zip(chunk['Link Text'].tolist(), chunk['URL'].tolist()):
+                if not isinstance(link_text, str) or not unwanted_pattern.search(link_text):
+                    yield link_text, url
+
+    # Cleaned rows are written in batches, and the files replace the old ones only once the whole scrape is done
+    with DatasetWriter(cleaned_file_path, 'amazon_data', cleaned_columns) as writer:
+        pending_products = deque()
+        batch = []
+        for product_row in regroup_products(link_rows()):
+            pending_products.append(product_row)
+
+            # Products beyond the last rating are never paired, and rows with any missing field are dropped
+            while pending_products and pending_ratings:
+                row = pending_products.popleft() + (pending_ratings.popleft(),)
+                if all(isinstance(value, str) for value in row):
+                    batch.append(row)
+
+            if len(batch) >= chunk_size:
+                writer.write(pd.DataFrame(batch, columns=cleaned_columns))
+                batch = []
+
+        if batch:
+            writer.write(pd.DataFrame(batch, columns=cleaned_columns))
+    set_span_rows(rows_in=rows_read, rows_out=writer.rows_written)
 
-    # Save the cleaned data to a new CSV file
-    final_df.to_csv(cleaned_file_path, index=False)
     print(f"Data cleaned and saved to '{cleaned_file_path}'")
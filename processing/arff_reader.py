@@ -0,0 +1,136 @@
+'''
+arff_reader.py
+
+Streaming reader for ARFF files, the format of the OpenML skincare ingredients dataset (openml_dataset_43481.csv).
+The @ATTRIBUTE lines of the header are parsed into a typed schema (STRING, NUMERIC/INTEGER/REAL, nominal {a,b,...} and
+DATE attributes), and the @DATA section is read in batches of rows. Every data line is split into its fields by one
+precompiled regular expression that keeps commas inside quoted values (\\' escapes a quote) and flags lines with an
+unclosed quote, and every batch is returned as a DataFrame with the column types of the schema. An unquoted ? is a missing
+value, and lines with another number of fields than the header declares (including sparse {index value} rows) are skipped.
+
+'''
+
+import re
+from operator import itemgetter
+import pandas as pd
+
+# One field of a data line: a single or double quoted value, or an unquoted value up to the next comma. Anything else
+# (an unclosed quote, or a quote inside an unquoted value) is captured by the last group, which marks the line malformed
+_field_pattern = re.compile(r"""\s*(?:'([^'\\]*(?:\\.[^'\\]*)*)'|"([^"\\]*(?:\\.[^"\\]*)*)"|([^,'"]*?)|([^,]+?))\s*,""")
+_malformed = itemgetter(3)
+_escape_pattern = re.compile(r"\\(.)")
+_attribute_pattern = re.compile(r"""@attribute\s+('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|\S+)\s+(.+)""", re.IGNORECASE)
+
+_numeric_types = {'numeric', 'integer', 'real'}
+
+
+class ArffAttribute:
+    """Name, type ('string', 'numeric', 'integer', 'real', 'nominal' or 'date') and nominal values of an ARFF column."""
+
+    def __init__(self, name, type, values=None):
+        self.name = name
+        self.type = type
+        self.values = values
+
+    def __repr__(self):
+        return f"ArffAttribute({self.name!r}, {self.type!r})"
+
+# Split a data line into its field values (None for missing values), or None if the line is not a list of fields
+def split_fields(line):
+    line = line.strip()
+    if not line or line.startswith('%'):
+        return None
+    fields = _field_pattern.findall(line + ',')
+    if any(map(_malformed, fields)):
+        return None
+    if '\\' in line:
+        return [_escape_pattern.sub(r'\1', single or double) if single or double else (None if plain == '?' else plain)
+                for single, double, plain, _ in fields]
+    return [single or double or (None if plain == '?' else plain) for single, double, plain, _ in fields]
+
+def _unquote(name):
+    if len(name) > 1 and name[0] == name[-1] and name[0] in '\'"':
+        return _escape_pattern.sub(r'\1', name[1:-1])
+    return name
+
+# Parse the attribute type of an @ATTRIBUTE line into an ArffAttribute
+def _parse_attribute(line):
+    match = _attribute_pattern.match(line)
+    if match is None:
+        raise ValueError(f"Malformed ARFF attribute: {line!r}")
+    name, type_spec = _unquote(match.group(1)), match.group(2).strip()
+    if type_spec.startswith('{'):
+        values = split_fields(type_spec.strip('{}'))
+        return ArffAttribute(name, 'nominal', values or [])
+    type_name = type_spec.split()[0].lower()
+    if type_name in _numeric_types or type_name in ('string', 'date'):
+        return ArffAttribute(name, type_name)
+    raise ValueError(f"Unsupported ARFF attribute type '{type_spec}' of '{name}'")
+
+# Read the header of an open ARFF file up to and including the @DATA line, and return its attributes
+def read_arff_header(file):
+    attributes = []
+    for line in file:
+        stripped = line.strip()
+        keyword = stripped.split(None, 1)[0].lower() if stripped else ''
+        if keyword == '@attribute':
+            attributes.append(_parse_attribute(stripped))
+        elif keyword == '@data':
+            return attributes
+    raise ValueError("The ARFF file has no @DATA section")
+
+# Attributes of an ARFF file
+def read_arff_attributes(path):
+    with open(path, 'r', encoding='utf-8', errors='replace') as file:
+        return read_arff_header(file)
+
+# Positions of the requested columns among the attributes (all of them for None)
+def _column_positions(attributes, columns):
+    names = [attribute.name for attribute in attributes]
+    if columns is None:
+        return range(len(names))
+    missing = [name for name in columns if name not in names]
+    if missing:
+        raise ValueError(f"The ARFF file has no {', '.join(missing)} attribute(s)")
+    return [names.index(name) for name in columns]
+
+# Build a DataFrame with the schema's column types from a batch of split rows
+def _typed_batch(rows, attributes, positions):
+    columns = list(zip(*rows)) if rows else [()] * len(attributes)
+    data = {}
+    for position in positions:
+        attribute, values = attributes[position], columns[position]
+        if attribute.type in _numeric_types:
+            data[attribute.name] = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce')
+        elif attribute.type == 'nominal':
+            data[attribute.name] = pd.Categorical(values, categories=attribute.values)
+        elif attribute.type == 'date':
+            data[attribute.name] = pd.to_datetime(pd.Series(values, dtype=object), errors='coerce')
+        else:
+            data[attribute.name] = pd.Series(values, dtype='string')
+    return pd.DataFrame(data)
+
+# Yield the rows of an ARFF file as typed DataFrames of up to batch_size rows, optionally with only some of the columns
+def iter_arff_batches(path, batch_size=50000, columns=None):
+    with open(path, 'r', encoding='utf-8', errors='replace') as file:
+        attributes = read_arff_header(file)
+        positions = _column_positions(attributes, columns)
+
+        batch = []
+        for line in file:
+            row = split_fields(line)
+            if row is not None and len(row) == len(attributes):
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    yield _typed_batch(batch, attributes, positions)
+                    batch = []
+        if batch:
+            yield _typed_batch(batch, attributes, positions)
+
+# Read a whole ARFF file into one typed DataFrame
+def read_arff(path, columns=None):
+    batches = list(iter_arff_batches(path, columns=columns))
+    if not batches:
+        attributes = read_arff_attributes(path)
+        return _typed_batch([], attributes, _column_positions(attributes, columns))
+    return pd.concat(batches, ignore_index=True)
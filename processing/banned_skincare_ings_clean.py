@@ -5,56 +5,75 @@ Cleans the scraped banned_skincare_ings.csv file
 
 '''
 
-import pandas as pd
-import re
 import os
+import pandas as pd
 from config import raw_dataset_folder_path, cleaned_dataset_folder_path
+from storage import DatasetWriter
+from instrumentation import instrumented, set_span_rows
+
+# Columns of the ECHA export kept in the cleaned dataset
+banned_columns = ['Name', 'EC No.', 'CAS No.', 'Restriction(s)']
+
+# Only substances with this restriction are screened out of the skincare products
+banned_restriction_prefix = 'Not permitted for all products'
+
+# Split a line of the tab-separated export into its fields, without the quotes around them
+def _split_row(line):
+    return line.rstrip('\r\n').replace('"', '').split('\t')
+
+# Collapse whitespace, and turn the export's empty and '-' placeholders into missing values
+def _normalize(value):
+    value = ' '.join(value.split())
+    return None if value in ('', '-') else value
 
-def clean_banned_skincare_ingredients():
+# Yield the banned_columns values of every substance with the restriction, reading the export line by line
+def iter_banned_substances(path, restriction_prefix=banned_restriction_prefix):
+    with open(path, 'r', encoding='utf-8') as file:
+        # The export starts with a few lines about the regulation before the header row
+        for line in file:
+            header = _split_row(line)
+            if 'Name' in header and 'EC No.' in header:
+                break
+        else:
+            raise ValueError(f"No header row with 'Name' and 'EC No.' columns in '{path}'")
+
+        # Columns are taken at their first position (the export repeats 'Name' in its identification columns)
+        positions = [header.index(column) for column in banned_columns]
+        restriction_position = header.index('Restriction(s)')
+
+        for line in file:
+            # Most substances have other restrictions, so their lines are skipped before being split
+            if restriction_prefix not in line:
+                continue
+            fields = _split_row(line)
+            if len(fields) == len(header) and fields[restriction_position].startswith(restriction_prefix):
+                yield tuple(_normalize(fields[position]) for position in positions)
+
+@instrumented()
+def clean_banned_skincare_ingredients(batch_size=50000):
     raw_file_path = os.path.join(raw_dataset_folder_path, 'banned_skincare_ings.csv')
     cleaned_file_path = os.path.join(cleaned_dataset_folder_path, 'banned_skincare_ings.csv')
 
-    # Ensure the cleaned directory exists
-    os.makedirs(os.path.dirname(cleaned_file_path), exist_ok=True)
-
-    # Read the file line by line
-    with open(raw_file_path, 'r', encoding='utf-8') as f:
-        raw_data = f.read()
-
-    # Split the raw data into rows
-    rows = raw_data.split("\n")
-    
-    # Locate the actual start of the data by skipping any irrelevant rows
-    start_data_index = 0
-    for i, row in enumerate(rows):
-        if "Name" in row and "EC No." in row:
-            start_data_index = i
-            break
-    
-    # Extract the actual header from the identified row
-    header_row = rows[start_data_index].replace('"', '').split("\t")
-    
-    # Get the actual data starting from the row after the header
-    data_rows = rows[start_data_index + 1:]
-    
-    # Clean the rows by splitting and removing extra quotes
-    cleaned_rows = []
-    for row in data_rows:
-        columns = row.replace('"', '').split("\t")
-        if len(columns) == len(header_row):  # Ensure the number of columns matches the headers
-            cleaned_rows.append(columns)
-    
-    # Create DataFrame using the identified header row
-    df = pd.DataFrame(cleaned_rows, columns=header_row)
-    
-    # Drop any rows that are completely empty
-    df = df.dropna(how='all')
-
-    # Reset index to ensure it's clean
-    df = df.reset_index(drop=True)
-
-    df = df[df['Restriction(s)'].str.startswith('Not permitted for all products', na=False)]
-
-    df.to_csv(cleaned_file_path, index=False)
-
-    print(f"Data cleaned and saved to '{cleaned_file_path}'")
\ No newline at end of file
+    # Every substance is kept once, by its case-insensitive name and identifiers (the export lists a substance once per
+    # restricted use), so only the keys seen so far are held in memory
+    seen = set()
+    rows_read = 0
+    with DatasetWriter(cleaned_file_path, 'banned_skincare_ings', banned_columns) as writer:
+        batch = []
+        for row in iter_banned_substances(raw_file_path):
+            rows_read += 1
+            name, ec_number, cas_number, _ = row
+            key = (name.lower(), ec_number, cas_number) if name is not None else None
+            if key is None or key in seen:
+                continue
+            seen.add(key)
+            batch.append(row)
+            if len(batch) >= batch_size:
+                writer.write(pd.DataFrame(batch, columns=banned_columns))
+                batch = []
+
+        if batch:
+            writer.write(pd.DataFrame(batch, columns=banned_columns))
+    set_span_rows(rows_in=rows_read, rows_out=writer.rows_written)
+
+    print(f"Data cleaned and saved to '{cleaned_file_path}'")
@@ -0,0 +1,145 @@
+'''
+fuzzy_matcher.py
+
+Fuzzy matching of skincare products to Amazon listings, for merges where the exact token-subset match misses near-matches
+such as a dropped accent ("crme" / "creme") or a misspelled brand ("lncme" / "lancome").
+Candidate pairs are blocked by brand: every skincare product is keyed by the consonant skeleton of its longest brand token,
+and an Amazon title joins the block of every skeleton among its own tokens, so misspellings that only differ in vowels
+still meet. Within a block, product names (the brand is already settled by the block) and titles are compared by character
+n-gram containment: the share of a name's TF-IDF weighted n-grams found in the title, computed as one sparse matrix product
+per block. Each title keeps the product(s) with its best score above the threshold. A product whose tokens all appear in a
+title scores 1, so every exact match is kept.
+
+'''
+
+import re
+import unicodedata
+import numpy as np
+from scipy import sparse
+from config import fuzzy_match_threshold, fuzzy_ngram_size
+
+_vowels = str.maketrans('', '', 'aeiou')
+
+# Lowercase, strip accents and keep only alphanumeric tokens
+def normalize_text(text):
+    text = str(text).lower()
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(re.findall(r'[a-z0-9]+', text))
+
+# Blocking key of a token: its consonants (the token itself if it has none)
+def skeleton(token):
+    return token.translate(_vowels) or token
+
+# Blocking key of a brand: the skeleton of its longest token, or None for brands without any alphanumeric token
+def brand_key(brand):
+    tokens = normalize_text(brand).split()
+    if not tokens:
+        return None
+    return skeleton(max(tokens, key=len))
+
+# Character n-grams of every token of a normalized text, with the token boundaries marked by spaces
+def char_ngrams(text, n=fuzzy_ngram_size):
+    for token in text.split():
+        padded = f" {token} "
+        if len(padded) <= n:
+            yield padded
+        else:
+            for i in range(len(padded) - n + 1):
+                yield padded[i:i + n]
+
+
+class FuzzyProductMatcher:
+    """Brand-blocked character n-gram matcher between skincare products and Amazon titles."""
+
+    def __init__(self, threshold=fuzzy_match_threshold, ngram_size=fuzzy_ngram_size):
+        self.threshold = threshold
+        self.ngram_size = ngram_size
+
+    # Sparse product matrix with TF-IDF n-gram weights scaled to sum to 1 per row, and the n-gram vocabulary
+    def _product_matrix(self, texts):
+        vocabulary = {}
+        rows, cols, counts = [], [], []
+        for row, text in enumerate(texts):
+            row_counts = {}
+            for ngram in char_ngrams(text, self.ngram_size):
+                col = vocabulary.setdefault(ngram, len(vocabulary))
+                row_counts[col] = row_counts.get(col, 0) + 1
+            rows.extend([row] * len(row_counts))
+            cols.extend(row_counts.keys())
+            counts.extend(row_counts.values())
+
+        matrix = sparse.csr_matrix((np.array(counts, dtype=float), (rows, cols)), shape=(len(texts), len(vocabulary)))
+        document_frequency = np.bincount(cols, minlength=len(vocabulary))
+        idf = np.log((1 + len(texts)) / (1 + document_frequency)) + 1
+        matrix = matrix @ sparse.diags(idf)
+        row_sums = np.asarray(matrix.sum(axis=1)).ravel()
+        row_sums[row_sums == 0] = 1
+        return sparse.diags(1 / row_sums) @ matrix, vocabulary
+
+    # Sparse 0/1 matrix of which vocabulary n-grams every title contains
+    def _title_matrix(self, texts, vocabulary):
+        # Titles share most of their tokens, so the n-grams of each distinct token are looked up once
+        token_cols = {}
+        rows, cols = [], []
+        for row, text in enumerate(texts):
+            row_cols = set()
+            for token in text.split():
+                token_ngrams = token_cols.get(token)
+                if token_ngrams is None:
+                    token_ngrams = token_cols[token] = [vocabulary[ngram] for ngram in char_ngrams(token, self.ngram_size)
+                                                        if ngram in vocabulary]
+                row_cols.update(token_ngrams)
+            rows.extend([row] * len(row_cols))
+            cols.extend(row_cols)
+        return sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(texts), len(vocabulary)))
+
+    # Return (product positions, title positions, scores) of the best matches, ordered by product then title position
+    def match(self, brands, product_names, titles):
+        # Products named after their brand alone are compared by the brand
+        product_texts = [normalize_text(name) or normalize_text(brand) for brand, name in zip(brands, product_names)]
+        title_texts = [normalize_text(title) for title in titles]
+
+        # Block products by brand key, and titles by the brand keys among their token skeletons
+        product_blocks = {}
+        for position, brand in enumerate(brands):
+            key = brand_key(brand)
+            if key is not None:
+                product_blocks.setdefault(key, []).append(position)
+        title_blocks = {}
+        for position, text in enumerate(title_texts):
+            for key in {skeleton(token) for token in text.split()}:
+                if key in product_blocks:
+                    title_blocks.setdefault(key, []).append(position)
+
+        product_matrix, vocabulary = self._product_matrix(product_texts)
+        title_matrix = self._title_matrix(title_texts, vocabulary)
+
+        found_products, found_titles, found_scores = [], [], []
+        for key, title_positions in title_blocks.items():
+            product_positions = np.array(product_blocks[key])
+            title_positions = np.array(title_positions)
+            scores = (product_matrix[product_positions] @ title_matrix[title_positions].T).tocoo()
+            # Containment scores of exact matches can land a rounding error below 1
+            keep = scores.data >= self.threshold - 1e-9
+            found_products.append(product_positions[scores.row[keep]])
+            found_titles.append(title_positions[scores.col[keep]])
+            found_scores.append(scores.data[keep])
+
+        if not found_products:
+            return np.array([], dtype=int), np.array([], dtype=int), np.array([])
+        products, title_ids, scores = (np.concatenate(found_products), np.concatenate(found_titles),
+                                       np.concatenate(found_scores))
+
+        # A title can sit in several blocks: keep each (product, title) pair once, then each title's best product(s)
+        order = np.lexsort((title_ids, products))
+        products, title_ids, scores = products[order], title_ids[order], scores[order]
+        first = np.ones(len(products), dtype=bool)
+        first[1:] = (products[1:] != products[:-1]) | (title_ids[1:] != title_ids[:-1])
+        products, title_ids, scores = products[first], title_ids[first], scores[first]
+
+        best = np.zeros(len(title_texts))
+        np.maximum.at(best, title_ids, scores)
+        keep = scores >= best[title_ids] - 1e-9
+        return products[keep], title_ids[keep], scores[keep]
@@ -0,0 +1,90 @@
+'''
+ingredient_matcher.py
+
+Multi-pattern (Aho-Corasick) matcher for ingredient lists.
+The automaton is compiled once from a set of ingredient names and then scans each ingredient string in a single pass,
+reporting every pattern that occurs in it (including overlapping ones).
+It is used for banned-ingredient screening.
+
+'''
+
+from collections import deque
+
+try:
+    import ahocorasick  # pyahocorasick: C implementation of the same automaton
+except ImportError:
+    ahocorasick = None
+
+
+class IngredientMatcher:
+    """Aho-Corasick automaton over lowercase ingredient names."""
+
+    def __init__(self, patterns):
+        # Distinct patterns, in the order they were given
+        self.patterns = list(dict.fromkeys(pattern.lower() for pattern in patterns))
+
+        # The empty string occurs in every text, just like `'' in text`
+        self._always = [pattern for pattern in self.patterns if not pattern]
+
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for pattern in self.patterns:
+                if pattern:
+                    self._automaton.add_word(pattern, pattern)
+            if len(self._automaton):
+                self._automaton.make_automaton()
+            else:
+                self._automaton = None
+        else:
+            self._build_automaton()
+
+    # Pure-Python fallback: goto/fail/output tables built breadth-first
+    def _build_automaton(self):
+        self._goto = [{}]
+        self._out = [()]
+        for pattern in self.patterns:
+            if not pattern:
+                continue
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._out.append(())
+                state = next_state
+            self._out[state] = (pattern,)
+
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail_state = self._fail[state]
+                while fail_state and char not in self._goto[fail_state]:
+                    fail_state = self._fail[fail_state]
+                self._fail[next_state] = self._goto[fail_state].get(char, 0)
+                # A state also emits every pattern that ends at its fail state
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+    # Return the set of patterns that occur in text
+    def find(self, text):
+        text = text.lower()
+        found = set(self._always)
+
+        if ahocorasick is not None:
+            if self._automaton is not None:
+                found.update(pattern for _, pattern in self._automaton.iter(text))
+            return found
+
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
@@ -2,30 +2,56 @@
 process_data.py
 
 Filters and merges all the cleaned datasets into one large dataframe and stores it.
+With more than one worker (--workers or config.merge_workers), the product matching and the SPF and concern extraction run
+on a process pool, over shards of the skincare products grouped by brand, and the partial results are put back in the
+order of the serial run, so the merged dataset is byte-identical.
 
 '''
 
+import argparse
 import pandas as pd
 import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, repeat
+from operator import itemgetter
 from tqdm import tqdm
-from config import cleaned_dataset_folder_path, merged_dataset_path
+from config import (cleaned_dataset_folder_path, merged_dataset_path, product_matching, concern_rules_path, merge_workers,
+                    merge_shards_per_worker)
+from processing.product_matcher import build_token_index, match_token_set
+from processing.fuzzy_matcher import FuzzyProductMatcher
+from processing.ingredient_matcher import IngredientMatcher
+from storage import read_dataset, write_dataset
+from ranking import add_ranking_features
+from instrumentation import instrumented, span, set_span_rows
 import re
 
+# SPF followed by a number, e.g. "SPF 30" or "spf50"
+spf_pattern = re.compile(r'spf\s*(\d+)', re.IGNORECASE)
+
+# Compile the cleaned banned ingredient list into a matcher that scans each ingredient string once
+def build_banned_matcher(banned_ings):
+    banned_ings_list = banned_ings['Name'].dropna().unique()
+    return IngredientMatcher([ing.lower() for ing in banned_ings_list])
+
+# Return, for every ingredient string, the sorted list of banned substances found in it
+def screen_banned_ingredients(ingredients, banned_matcher):
+    return ingredients.apply(lambda ing: sorted(banned_matcher.find(ing)))
+
 def filter_skincare_ings(skincare_ings, banned_ings):
     # Remove duplicates from both datasets
     banned_ings_cleaned = banned_ings.drop_duplicates()
     skincare_ings_cleaned = skincare_ings.drop_duplicates()
 
-    # Extract relevant banned ingredients and convert to lowercase
-    banned_ings_list = banned_ings_cleaned['Name'].dropna().unique()
-    banned_ings_list = [ing.lower() for ing in banned_ings_list]
+    # Compile the banned ingredient names into a single matcher
+    banned_matcher = build_banned_matcher(banned_ings_cleaned)
 
     # Convert the entire dataframe to lowercase for case-insensitive matching
     skincare_ings_cleaned = skincare_ings_cleaned.apply(lambda x: x.astype(str).str.lower())
 
     # Filter the dataframe to exclude products with banned ingredients
-    filtered_skincare_df = skincare_ings_cleaned[~skincare_ings_cleaned['Ingredients'].apply(
-        lambda ing: any(banned_ing in ing for banned_ing in banned_ings_list))]
+    banned_hits = screen_banned_ingredients(skincare_ings_cleaned['Ingredients'], banned_matcher)
+    filtered_skincare_df = skincare_ings_cleaned[banned_hits.map(len) == 0]
+    print(f"Excluded {len(skincare_ings_cleaned) - len(filtered_skincare_df)} products containing banned ingredients")
 
     # Replace "lncme" with "lancome" in the 'Brand' column
     filtered_skincare_df['Brand'] = filtered_skincare_df['Brand'].str.replace('lncme', 'lancome', case=False)
@@ -35,27 +61,109 @@ def filter_skincare_ings(skincare_ings, banned_ings):
 
     return filtered_skincare_df
 
-def extract_spf(text):
-    # Regular expression to find 'SPF' followed by a number
-    spf_match = re.search(r'spf\s*(\d+)', text, re.IGNORECASE)
-    if spf_match:
-        # If SPF is found, return the number
-        return int(spf_match.group(1))
-    else:
-        # If no SPF is found, return 0
-        return 0
-    
-def check_ingredients(ingredients, ingredient_list):
-    ingredients = ingredients.lower()  # Make the search case-insensitive
-    return int(any(ingredient in ingredients for ingredient in ingredient_list))
-
-def process_and_merge_data():
+# Read the concern rules table into {concern: [ingredient, ...]}, both in the order of the table
+def load_concern_rules(path=concern_rules_path):
+    table = pd.read_csv(path, dtype=str, keep_default_na=False)
+    if list(table.columns) != ['concern', 'ingredient']:
+        raise ValueError(f"'{path}' must have the columns concern,ingredient")
+
+    rules = {}
+    for line, (concern, ingredient) in enumerate(zip(table['concern'].str.strip(), table['ingredient'].str.strip()), 2):
+        if not concern or not ingredient:
+            raise ValueError(f"'{path}' line {line}: every rule needs a concern and an ingredient")
+        ingredients = rules.setdefault(concern, [])
+        if ingredient.lower() not in ingredients:
+            ingredients.append(ingredient.lower())
+    return rules
+
+# Return the SPF and a 0/1 flag per concern of rows with Brand_Name, Product and Ingredients columns, computed column-wise:
+# the SPF is the highest one found in the skincare or Amazon product name (0 without any), and a concern is flagged when
+# any of its ingredients occurs in the ingredient list
+def extract_attributes(df, concern_rules):
+    spf_values = pd.concat([df['Brand_Name'].str.extract(spf_pattern)[0], df['Product'].str.extract(spf_pattern)[0]],
+                           axis=1).apply(pd.to_numeric)
+    attributes = pd.DataFrame({'SPF': spf_values.max(axis=1).fillna(0).astype('int64')}, index=df.index)
+
+    ingredients = df['Ingredients'].str.lower()
+    for concern, concern_ingredients in concern_rules.items():
+        # One alternation of the concern's ingredients, matched as plain substrings
+        pattern = '|'.join(re.escape(ingredient) for ingredient in concern_ingredients)
+        attributes[concern] = ingredients.str.contains(pattern, regex=True, na=False).astype('int64')
+    return attributes
+
+# Split row positions into at most num_shards shards of whole brands with similar row counts.
+# Brands are dealt out largest first, each to the smallest shard so far, so the same rows always give the same shards
+def shard_by_brand(brands, num_shards):
+    positions_by_brand = {}
+    for position, brand in enumerate(brands):
+        positions_by_brand.setdefault(brand, []).append(position)
+
+    shards = [[] for _ in range(num_shards)]
+    for brand in sorted(positions_by_brand, key=lambda brand: (-len(positions_by_brand[brand]), str(brand))):
+        min(shards, key=len).extend(positions_by_brand[brand])
+    return [sorted(shard) for shard in shards if shard]
+
+_match_worker = {}
+
+# Hand the token index to every matching process (inherited without a copy where processes are forked)
+def _init_match_worker(token_index, num_rows):
+    _match_worker['token_index'] = token_index
+    _match_worker['num_rows'] = num_rows
+
+def _match_shard(shard):
+    token_index, num_rows = _match_worker['token_index'], _match_worker['num_rows']
+    return [(position, amazon_pos) for position, token_set in shard
+            for amazon_pos in match_token_set(token_set, token_index, num_rows)]
+
+# Return {position: row record} for the given row positions of a dataframe
+def matched_records(df, positions):
+    positions = sorted(set(positions))
+    return dict(zip(positions, df.iloc[positions].to_dict('records')))
+
+# Return the (skincare position, Amazon position) pairs of every exact match, in skincare row order
+def match_exact(skin_token_sets, amazon_token_sets, brands, workers=1):
+    # Build the token -> Amazon row id index once for the whole merge
+    token_index = build_token_index(amazon_token_sets)
+
+    if workers <= 1:
+        # Look up candidate Amazon rows through the index instead of scanning every title
+        return [(position, amazon_pos)
+                for position, token_set in enumerate(tqdm(skin_token_sets, total=len(skin_token_sets), desc="Skincare Products"))
+                for amazon_pos in match_token_set(token_set, token_index, len(amazon_token_sets))]
+
+    shards = shard_by_brand(brands, workers * merge_shards_per_worker)
+    with ProcessPoolExecutor(workers, initializer=_init_match_worker,
+                             initargs=(token_index, len(amazon_token_sets))) as executor:
+        shard_pairs = executor.map(_match_shard, [[(position, skin_token_sets[position]) for position in shard]
+                                                  for shard in shards])
+        # Put the pairs back in the serial order: by skincare row, then in the order the index returned them
+        return sorted(chain.from_iterable(shard_pairs), key=itemgetter(0))
+
+# Return the SPF and concern flags of every merged row (see extract_attributes), indexed like matched_df
+def tag_matches(matched_df, concern_rules, workers=1):
+    columns = matched_df[['Brand_Name', 'Product', 'Ingredients']]
+    if workers <= 1:
+        return extract_attributes(columns, concern_rules)
+
+    shards = shard_by_brand(matched_df['Brand'].tolist(), workers * merge_shards_per_worker)
+    with ProcessPoolExecutor(workers) as executor:
+        parts = executor.map(extract_attributes, [columns.iloc[shard] for shard in shards], repeat(concern_rules))
+        # Put the rows back in the order of matched_df
+        return pd.concat(list(parts)).reindex(columns.index)
+
+@instrumented()
+def process_and_merge_data(workers=merge_workers):
     # Load datasets
-    banned_ings = pd.read_csv(os.path.join(cleaned_dataset_folder_path, "banned_skincare_ings.csv"))
-    skincare_ings = pd.read_csv(os.path.join(cleaned_dataset_folder_path, "skincare_ingredients.csv"))
-    
-    skincare_df = filter_skincare_ings(skincare_ings, banned_ings)
-    amazon_df = pd.read_csv(os.path.join(cleaned_dataset_folder_path, "amazon_data.csv"))
+    with span('merge_load') as load_span:
+        banned_ings = read_dataset(os.path.join(cleaned_dataset_folder_path, "banned_skincare_ings.csv"), 'banned_skincare_ings',
+                                   columns=['Name'])
+        skincare_ings = read_dataset(os.path.join(cleaned_dataset_folder_path, "skincare_ingredients.csv"), 'skincare_ingredients')
+
+        skincare_df = filter_skincare_ings(skincare_ings, banned_ings)
+        amazon_df = read_dataset(os.path.join(cleaned_dataset_folder_path, "amazon_data.csv"), 'amazon_data')
+        load_span.rows_in = len(banned_ings) + len(skincare_ings) + len(amazon_df)
+        load_span.rows_out = len(skincare_df) + len(amazon_df)
+    set_span_rows(rows_in=load_span.rows_in)
 
     # Combine 'Brand' and 'Name' from skincare_df to create a matching field
     skincare_df['Brand_Name'] = skincare_df['Brand'] + " " + skincare_df['Name']
@@ -68,21 +176,24 @@ def process_and_merge_data():
     skincare_df['Tokenized_Set'] = skincare_df['Tokenized'].apply(set)
     amazon_df['Tokenized_Set'] = amazon_df['Tokenized'].apply(set)
 
-    # Use tqdm progress bar for faster processing
-    print("Processing matches:")
-    matched_rows = []
-
-    # Efficiently perform the matching with apply and set intersections
-    for i, skin_row in tqdm(skincare_df.iterrows(), total=skincare_df.shape[0], desc="Skincare Products"):
-        skincare_set = skin_row['Tokenized_Set']
-        # Create a mask to filter matching rows from amazon_df
-        mask = amazon_df['Tokenized_Set'].apply(lambda x: skincare_set.issubset(x))
-        matched_amazon_rows = amazon_df[mask]
-        
-        # If matches are found, combine the rows
-        for _, amazon_row in matched_amazon_rows.iterrows():
-            combined_row = {**skin_row.to_dict(), **amazon_row.to_dict()}
-            matched_rows.append(combined_row)
+    with span('merge_match', rows_in=len(skincare_df) + len(amazon_df)) as match_span:
+        if product_matching == 'fuzzy':
+            # Match near-misses too, comparing each title only with the products of the brands it mentions
+            print("Processing fuzzy matches...")
+            skin_positions, amazon_positions, _ = FuzzyProductMatcher().match(skincare_df['Brand'], skincare_df['Name'],
+                                                                              amazon_df['Product'])
+            matched_pairs = list(zip(skin_positions.tolist(), amazon_positions.tolist()))
+        else:
+            # Use tqdm progress bar for faster processing
+            print("Processing matches:" if workers <= 1 else f"Processing matches on {workers} processes...")
+            matched_pairs = match_exact(skincare_df['Tokenized_Set'].tolist(), amazon_df['Tokenized_Set'].tolist(),
+                                        skincare_df['Brand'].tolist(), workers)
+        match_span.rows_out = len(matched_pairs)
+
+    # If matches are found, combine the rows; only the matched rows of each side are turned into records
+    skin_records = matched_records(skincare_df, [skin_pos for skin_pos, _ in matched_pairs])
+    amazon_records = matched_records(amazon_df, [amazon_pos for _, amazon_pos in matched_pairs])
+    matched_rows = [{**skin_records[skin_pos], **amazon_records[amazon_pos]} for skin_pos, amazon_pos in matched_pairs]
 
     # Convert the matched rows into a new dataframe
     matched_df = pd.DataFrame(matched_rows)
@@ -95,23 +206,20 @@ def process_and_merge_data():
     # Drop duplicates by keeping the row with the lowest price for each 'Product'
     matched_df = matched_df.drop_duplicates(subset='Product', keep='first')
 
-    matched_df['SPF'] = matched_df.apply(lambda row: max(extract_spf(row['Brand_Name']), extract_spf(row['Product'])), axis=1)
-
-    acne_ingredients = ['salicylic acid', 'benzoyl peroxide', 'retinol']
-    brightening_ingredients = ['vitamin c', 'vitamin-c' 'niacinamide', 'alpha-arbutin']
-    hydration_ingredients = ['hyaluronic acid', 'glycerin', 'ceramide']
-    anti_aging_ingredients = ['retinol', 'peptides', 'vitamin c', 'vitamin-c']
-
-    # Add new columns to the dataframe
-    matched_df['Acne'] = matched_df['Ingredients'].apply(lambda x: check_ingredients(x, acne_ingredients))
-    matched_df['Brightening'] = matched_df['Ingredients'].apply(lambda x: check_ingredients(x, brightening_ingredients))
-    matched_df['Hydration'] = matched_df['Ingredients'].apply(lambda x: check_ingredients(x, hydration_ingredients))
-    matched_df['Anti_Aging'] = matched_df['Ingredients'].apply(lambda x: check_ingredients(x, anti_aging_ingredients))
+    # Add the SPF and the concern flags of the ingredients in the concern rules table
+    concern_rules = load_concern_rules()
+    with span('merge_tag', rows_in=len(matched_df)) as tag_span:
+        matched_df = matched_df.join(tag_matches(matched_df, concern_rules, workers))
+        tag_span.rows_out = len(matched_df)
 
     matched_df = matched_df.drop(columns=['Tokenized', 'Tokenized_Set'], errors='ignore')
 
-    matched_df.to_csv(merged_dataset_path, index=False)
-    print(f"Data processed and saved to '{merged_dataset_path}'")
+    # Compute the ranking features once here, so requests only combine them with the ranking weights
+    matched_df = add_ranking_features(matched_df, list(concern_rules))
+
+    stored_path = write_dataset(matched_df, merged_dataset_path, 'merged_data')
+    set_span_rows(rows_out=len(matched_df))
+    print(f"Data processed and saved to '{stored_path}'")
 
     # Print the shapes of the dataframes
     # print("\nDataframe shapes:")
@@ -119,5 +227,10 @@ def process_and_merge_data():
     # print(f"Amazon DataFrame shape: {amazon_df.shape}")
     # print(f"Merged DataFrame shape: {matched_df.shape}")
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge the cleaned datasets into the merged dataset.")
+    parser.add_argument('--workers', type=int, default=merge_workers,
+                        help="processes for the matching and tagging (1 runs them in this process)")
+    args = parser.parse_args()
 
-
+    process_and_merge_data(args.workers)
@@ -0,0 +1,42 @@
+'''
+product_matcher.py
+
+Matches skincare products to Amazon listings using an inverted index from title tokens to Amazon row ids.
+The index is built once per merge, so each skincare product only looks at the rows that share its rarest tokens.
+
+'''
+
+# Build an inverted index that maps every token to the set of row ids whose token set contains it
+def build_token_index(token_sets):
+    token_index = {}
+    for row_id, token_set in enumerate(token_sets):
+        for token in token_set:
+            posting = token_index.get(token)
+            if posting is None:
+                token_index[token] = {row_id}
+            else:
+                posting.add(row_id)
+    return token_index
+
+# Return the sorted row ids whose token set contains every token of query_set
+def match_token_set(query_set, token_index, num_rows):
+    # An empty set is a subset of every row
+    if not query_set:
+        return list(range(num_rows))
+
+    postings = []
+    for token in query_set:
+        posting = token_index.get(token)
+        if posting is None:
+            return []
+        postings.append(posting)
+
+    # Intersect starting from the rarest tokens so the candidate set shrinks as fast as possible
+    postings.sort(key=len)
+    candidates = set(postings[0])
+    for posting in postings[1:]:
+        candidates &= posting
+        if not candidates:
+            return []
+
+    return sorted(candidates)
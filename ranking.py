@@ -0,0 +1,81 @@
+'''
+ranking.py
+
+Weighted ranking model for the recommendation results.
+Ranking features are computed once when the datasets are merged (see process_and_merge_data) and stored as numeric columns:
+a Bayesian-smoothed rating that pulls products with few reviews towards the average rating, a review count score,
+the price percentile within the product's label and the number of skincare concerns a product targets.
+A product's score is the dot product of its feature values with a configurable weight vector ({feature: weight} in
+config.ranking_weights), computed for the whole catalog in one matrix-vector product per dataset version and weight
+vector, and turned into one rank per catalog row that the recommendation functions sort by.
+The default weights rank by Rating alone, which keeps the original ranking.
+
+'''
+
+import threading
+import weakref
+import numpy as np
+import pandas as pd
+from config import ranking_weights, ranking_prior_reviews
+
+# Numeric catalog columns a weight vector can use
+ranking_features = ['Rating', 'Smoothed Rating', 'Review Score', 'Price Percentile', 'Concern Count', 'Rank']
+
+# Add the ranking feature columns to the merged dataset
+def add_ranking_features(df, concern_columns, prior_reviews=ranking_prior_reviews):
+    rating = pd.to_numeric(df['Rating'], errors='coerce')
+    reviews = pd.to_numeric(df['Review Count'], errors='coerce').fillna(0).clip(lower=0)
+
+    # Each product's rating is averaged with prior_reviews ratings at the mean of all products
+    mean_rating = rating.mean()
+    df['Smoothed Rating'] = (prior_reviews * mean_rating + reviews * rating) / (prior_reviews + reviews)
+
+    # Review counts are heavy-tailed, so they are compared on a log scale, from 0 to 1
+    log_reviews = np.log1p(reviews)
+    df['Review Score'] = log_reviews / log_reviews.max() if log_reviews.max() > 0 else 0.0
+
+    # 0 for the cheapest products of a label up to 1 for the most expensive
+    df['Price Percentile'] = df.groupby('Label', observed=True)['Price'].rank(pct=True)
+
+    df['Concern Count'] = df[concern_columns].sum(axis=1)
+    return df
+
+def _weights_key(weights):
+    return tuple(sorted((name, float(weight)) for name, weight in weights.items() if weight))
+
+# Score every catalog row as the dot product of its features with the weights
+def score_catalog(catalog, weights=None):
+    weights = ranking_weights if weights is None else weights
+    names = [name for name, _ in _weights_key(weights)]
+    unknown = [name for name in names if name not in ranking_features]
+    if unknown:
+        raise ValueError(f"Unknown ranking features: {', '.join(unknown)} (available: {', '.join(ranking_features)})")
+
+    features = np.zeros((len(catalog), len(names)))
+    for i, name in enumerate(names):
+        try:
+            values = catalog.column(name)
+        except KeyError:
+            raise ValueError(f"The dataset has no '{name}' column; re-run the merge to compute the ranking features")
+        # Missing values (e.g. products without an OpenML Rank) contribute nothing
+        features[:, i] = np.nan_to_num(np.asarray(values, dtype=float))
+    return features @ np.array([weight for _, weight in _weights_key(weights)])
+
+
+_ranking_keys = weakref.WeakKeyDictionary()
+_ranking_lock = threading.Lock()
+
+# Rank of every catalog row under a weight vector (0 for the best score, ties by catalog position), cached per catalog
+def ranking_keys(catalog, weights=None):
+    key = _weights_key(ranking_weights if weights is None else weights)
+    with _ranking_lock:
+        cached = _ranking_keys.get(catalog, {}).get(key)
+    if cached is not None:
+        return cached
+
+    order = np.lexsort((np.arange(len(catalog)), -score_catalog(catalog, weights)))
+    keys = np.empty(len(order), dtype=np.intp)
+    keys[order] = np.arange(len(order))
+    with _ranking_lock:
+        _ranking_keys.setdefault(catalog, {})[key] = keys
+    return keys
@@ -6,8 +6,12 @@ It processes and loads data, calculates skin type compatibility, and applies fil
 
 '''
 
+import numpy as np
 import pandas as pd
-from sklearn.preprocessing import LabelEncoder
+from catalog import (load_data, get_catalog, as_catalog, flag_mask, popcount_table, CatalogSelection,
+                     skin_type_columns, concern_columns)
+from ranking import ranking_keys
+from instrumentation import instrumented
 
 # Get recommended SPF based on UV index
 def get_spf_recommendation(uv_index_max):
@@ -22,103 +26,136 @@ def get_spf_recommendation(uv_index_max):
     else:
         return 50
 
-# Load and clean product data
-def load_data(file_path):
-    df = pd.read_csv(file_path)
-    df = df[pd.to_numeric(df['Rating'], errors='coerce').notnull()]
-    df['Price'] = df['Price'].astype(float)
-    skin_type_columns = ['Combination', 'Dry', 'Normal', 'Oily', 'Sensitive']
-    for col in skin_type_columns:
-        df[col] = df[col].astype(int)
-    return df
-
 # Recommend products based on skin type, product type, and UV index
-def recommend_products(df, product_labels, skin_type_suitability, uv_index_max):
+@instrumented(rows_in=lambda catalog, *args, **kwargs: len(catalog), rows_out=len)
+def recommend_products(catalog, product_labels, skin_type_suitability, uv_index_max):
+    catalog = as_catalog(catalog)
     spf_recommended = get_spf_recommendation(uv_index_max)
 
-    label_encoder_product = LabelEncoder()
-    df['Label'] = label_encoder_product.fit_transform(df['Label'])
-
-    skin_type_columns = ['Combination', 'Dry', 'Normal', 'Oily', 'Sensitive']
-    user_skin_type_binary = [1 if skin_type in skin_type_suitability else 0 for skin_type in skin_type_columns]
-
-    df['Skin Type Match Score'] = df[skin_type_columns].dot(user_skin_type_binary)
-
-    all_filtered_products = pd.DataFrame()
-
+    # Collect the rows of each requested label that meet the SPF recommendation
+    label_positions = []
     for product_label in product_labels:
-        product_label_encoded = label_encoder_product.transform([product_label])[0]
-        filtered_products = df[df['Label'] == product_label_encoded].copy()
-        filtered_products = filtered_products[filtered_products['SPF'] >= spf_recommended]
-        filtered_products = filtered_products.sort_values(by='Skin Type Match Score', ascending=False)
-        filtered_products['Label'] = label_encoder_product.inverse_transform(filtered_products['Label'])
-        all_filtered_products = pd.concat([all_filtered_products, filtered_products], ignore_index=True)
-
-    return all_filtered_products
-
-# Filter products based on exact matches for skin type, price range, and skincare improvements
-def filter_exact_matches(recommended_df, product_labels, skin_type_suitability, skincare_improvement, price_range, age):
-    conditions = [(recommended_df[skin_type] == 1) for skin_type in skin_type_suitability]
-
-    skin_type_condition = conditions[0]
-    for condition in conditions[1:]:
-        skin_type_condition &= condition
-
-    skincare_columns = ['Acne', 'Brightening', 'Hydration', 'Anti_Aging']
-
+        start, stop = catalog.label_range(product_label)
+        positions = np.arange(start, stop)
+        label_positions.append(positions[catalog.spf[start:stop] >= spf_recommended])
+    positions = np.concatenate(label_positions) if label_positions else np.array([], dtype=np.intp)
+
+    # Skin type match score is the number of the user's skin types a product is suitable for
+    user_skin_mask = flag_mask(skin_type_suitability, skin_type_columns)
+    scores = popcount_table[catalog.skin_flags[positions] & user_skin_mask].astype(int)
+
+    return CatalogSelection(catalog, positions, scores)
+
+# Accept the result of recommend_products or a plain DataFrame of products
+def _as_selection(recommended):
+    if isinstance(recommended, CatalogSelection):
+        return recommended
+    catalog = as_catalog(recommended)
+    return CatalogSelection(catalog, np.arange(len(catalog)), np.zeros(len(catalog), dtype=int))
+
+# Take the first k rows (in the given order) with distinct product names
+def _top_distinct_names(selection, indices, k=5):
+    name_codes = selection.catalog.name_codes[selection.positions]
+    seen = set()
+    top = []
+    for index in indices:
+        if name_codes[index] not in seen:
+            seen.add(name_codes[index])
+            top.append(index)
+            if len(top) == k:
+                break
+    return np.array(top, dtype=np.intp)
+
+# Keep the k best rows of a label group (lowest ranking keys), distinct by product name, without sorting the whole group
+def _top_k_distinct(selection, group, k, keys):
+    keys = keys[selection.positions[group]]
+    window = k
+    while True:
+        if len(group) > window:
+            part = np.argpartition(keys, window - 1)[:window]
+        else:
+            part = np.arange(len(group))
+        part = part[np.argsort(keys[part])]
+        top = _top_distinct_names(selection, group[part], k)
+        # Duplicate names can leave the window short, so widen it until k names are found or the group runs out
+        if len(top) == k or len(part) == len(group):
+            return top
+        window *= 2
+
+# Combined mask of the exact-match conditions over every row of the selection
+def _exact_match_condition(selection, skin_type_suitability, skincare_improvement, price_range, age):
+    catalog = selection.catalog
+    positions = selection.positions
+
+    # Products must suit every selected skin type
+    skin_mask = flag_mask(skin_type_suitability, skin_type_columns)
+    condition = (catalog.skin_flags[positions] & skin_mask) == skin_mask
+
+    # ...and target at least one of the selected skincare improvements
+    concern_flags = catalog.concern_flags[positions]
     if skincare_improvement:
-        skincare_condition = recommended_df[skincare_columns][skincare_improvement].any(axis=1)
-    else:
-        skincare_condition = pd.Series([True] * len(recommended_df), index=recommended_df.index)
+        condition &= (concern_flags & flag_mask(skincare_improvement, concern_columns)) != 0
 
     # Check if the user is above 30 and adding Anti-aging
     if age > 30:
-        anti_aging_condition = recommended_df['Anti_Aging'] == 1
-    else:
-        anti_aging_condition = pd.Series([True] * len(recommended_df), index=recommended_df.index)
-
-    filtered_products_list = []
-
-    # Filter and recommend products for each product label
+        condition &= (concern_flags & flag_mask(['Anti_Aging'], concern_columns)) != 0
+
+    prices = catalog.price[positions]
+    condition &= (prices >= price_range[0]) & (prices <= price_range[1])
+    return condition
+
+# Filter products for every requested label in one pass and return {label: top k products}, best ranked first
+# (by the ranking weights, see ranking.py)
+@instrumented(rows_in=lambda recommended, *args, **kwargs: len(recommended),
+              rows_out=lambda results: sum(len(products) for products in results.values()))
+def filter_exact_matches_by_label(recommended, product_labels, skin_type_suitability, skincare_improvement, price_range, age, k=5,
+                                  weights=None):
+    selection = _as_selection(recommended)
+    catalog = selection.catalog
+    keys = ranking_keys(catalog, weights)
+
+    candidates = np.flatnonzero(_exact_match_condition(selection, skin_type_suitability, skincare_improvement, price_range, age))
+
+    # Group the matching rows by label code, like a groupby on 'Label'
+    codes = catalog.label_codes[selection.positions[candidates]]
+    order = np.argsort(codes, kind='stable')
+    candidates, codes = candidates[order], codes[order]
+
+    results = {}
     for product_label in product_labels:
-        filtered_products = recommended_df[
-            (recommended_df['Label'] == product_label) &
-            skin_type_condition &
-            skincare_condition &
-            (recommended_df['Price'] >= price_range[0]) &
-            (recommended_df['Price'] <= price_range[1]) &
-            anti_aging_condition
-        ]
+        if product_label in catalog.label_ranges:
+            code = catalog.labels.index(product_label)
+            start, stop = np.searchsorted(codes, [code, code + 1])
+            top = _top_k_distinct(selection, candidates[start:stop], k, keys)
+        else:
+            top = np.array([], dtype=np.intp)
+        results[product_label] = selection.rows(top)
 
-        filtered_products = filtered_products.drop_duplicates(subset='Name')
-        filtered_products = filtered_products.sort_values(by='Rating', ascending=False)
-        top_5_products = filtered_products.head(5)
+    return results
 
-        filtered_products_list.append(top_5_products)
+# Filter products based on exact matches for skin type, price range, and skincare improvements
+@instrumented(rows_in=lambda recommended, *args, **kwargs: len(recommended), rows_out=len)
+def filter_exact_matches(recommended, product_labels, skin_type_suitability, skincare_improvement, price_range, age, weights=None):
+    filtered_products = filter_exact_matches_by_label(recommended, product_labels, skin_type_suitability, skincare_improvement, price_range, age,
+                                                      weights=weights)
+    filtered_products_list = [filtered_products[product_label] for product_label in product_labels]
 
     return pd.concat(filtered_products_list, ignore_index=True) if filtered_products_list else pd.DataFrame()
 
 # Recommend sunscreens based on skin type, SPF recommendation, and price range
-def recommend_sunscreens(df, user_skin_type_suitability, price_range, uv_index_max):
+@instrumented(rows_in=lambda recommended, *args, **kwargs: len(recommended), rows_out=len)
+def recommend_sunscreens(recommended, user_skin_type_suitability, price_range, uv_index_max, weights=None):
+    selection = _as_selection(recommended)
+    catalog = selection.catalog
+    positions = selection.positions
     spf_recommended = get_spf_recommendation(uv_index_max)
 
-    label_encoder_product = LabelEncoder()
-    df['Label'] = label_encoder_product.fit_transform(df['Label'])
-
-    skin_type_columns = ['Combination', 'Dry', 'Normal', 'Oily', 'Sensitive']
-    user_skin_type_binary = [1 if skin_type in user_skin_type_suitability else 0 for skin_type in skin_type_columns]
-    df['Skin Type Match Score'] = df[skin_type_columns].dot(user_skin_type_binary)
-
-    skin_type_condition = df[skin_type_columns].dot(user_skin_type_binary) > 0
-    spf_condition = df['SPF'] >= spf_recommended
-    price_condition = (df['Price'] >= price_range[0]) & (df['Price'] <= price_range[1])
-
-    filtered_products = df[skin_type_condition & spf_condition & price_condition]
-
-    filtered_products = filtered_products.drop_duplicates(subset='Name')
-    filtered_products = filtered_products.sort_values(by='Rating', ascending=False)
+    skin_type_condition = (catalog.skin_flags[positions] & flag_mask(user_skin_type_suitability, skin_type_columns)) != 0
+    spf_condition = catalog.spf[positions] >= spf_recommended
+    prices = catalog.price[positions]
+    price_condition = (prices >= price_range[0]) & (prices <= price_range[1])
 
-    top_5_products = filtered_products.head(5)
-    top_5_products['Label'] = label_encoder_product.inverse_transform(top_5_products['Label'])
+    candidates = np.flatnonzero(skin_type_condition & spf_condition & price_condition)
+    candidates = candidates[np.argsort(ranking_keys(catalog, weights)[positions[candidates]])]
 
-    return top_5_products
+    return selection.rows(_top_distinct_names(selection, candidates))
@@ -0,0 +1,99 @@
+'''
+recommendation_cache.py
+
+This module memoizes complete recommendation results, so the identical requests Streamlit makes on every rerun
+(and popular profiles asked for by different sessions) are answered from memory instead of recomputed.
+Queries are normalized before lookup: the product labels, skin types and improvements are sorted, the age is reduced to
+the bucket the filters use (over 30 or not), and the UV index to its recommended SPF tier. Results are kept in a bounded
+least-recently-used cache per process and tagged with the dataset fingerprint, so a new dataset version invalidates them.
+
+'''
+
+import threading
+from collections import OrderedDict
+from config import merged_dataset_path, recommendation_cache_size, ranking_weights
+from recommendation import (get_catalog, get_spf_recommendation, recommend_products, filter_exact_matches_by_label,
+                            recommend_sunscreens)
+
+
+class RecommendationCache:
+    """Bounded LRU of recommendation results for one dataset version, with hit/miss counters."""
+
+    def __init__(self, max_entries=recommendation_cache_size):
+        self.max_entries = max_entries
+        self.fingerprint = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Return the cached result of a key for a dataset version, or None
+    def get(self, fingerprint, key):
+        with self._lock:
+            if fingerprint != self.fingerprint:
+                # Results computed from another dataset version are never served
+                self._entries.clear()
+                self.fingerprint = fingerprint
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, fingerprint, key, result):
+        with self._lock:
+            if fingerprint != self.fingerprint:
+                return  # The dataset changed while the result was being computed
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def info(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'size': len(self._entries), 'max_entries': self.max_entries, 'fingerprint': self.fingerprint}
+
+_cache = RecommendationCache()
+
+# Normalize a recommendation request to the values the recommendation functions actually depend on
+def query_key(product_labels, skin_type_suitability, skincare_improvement, price_range, age, uv_index_max):
+    return (tuple(sorted(set(product_labels))),
+            tuple(sorted(set(skin_type_suitability))),
+            tuple(sorted(set(skincare_improvement))),
+            (float(price_range[0]), float(price_range[1])),
+            age > 30,
+            get_spf_recommendation(uv_index_max))
+
+# Return ({label: top products}, sunscreen products) for a request, from the cache or freshly computed.
+# Batch callers pass the catalog they resolved once, so every request of the batch sees the same dataset version.
+# The returned DataFrames are shared between callers and must not be modified in place
+def get_recommendations(product_labels, skin_type_suitability, skincare_improvement, price_range, age, uv_index_max,
+                        dataset_path=merged_dataset_path, cache=_cache, catalog=None, weights=None):
+    if catalog is None:
+        catalog = get_catalog(dataset_path)
+    weights = ranking_weights if weights is None else weights
+    key = (query_key(product_labels, skin_type_suitability, skincare_improvement, price_range, age, uv_index_max),
+           tuple(sorted(weights.items())))
+
+    result = cache.get(catalog.fingerprint, key)
+    if result is None:
+        labels, skin_types, improvements, prices, _, _ = key[0]
+        recommended = recommend_products(catalog, labels, skin_types, uv_index_max)
+        result = (filter_exact_matches_by_label(recommended, labels, skin_types, improvements, prices, age, weights=weights),
+                  recommend_sunscreens(recommended, skin_types, prices, uv_index_max, weights=weights))
+        cache.put(catalog.fingerprint, key, result)
+    return result
+
+# Hit/miss counters and size of the process-wide recommendation cache
+def recommendation_cache_info():
+    return _cache.info()
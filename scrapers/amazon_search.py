@@ -0,0 +1,306 @@
+'''
+amazon_search.py
+
+Shared machinery for scraping Amazon search result pages.
+A pool of workers takes search terms from one work queue, a global rate limiter spaces out requests across all of them,
+failed searches are retried with exponential backoff, and every finished term is appended to a checkpoint file
+so an interrupted scrape resumes where it stopped.
+Pages are fetched by a pluggable backend: a pooled HTTP client by default, with a headless Chrome driver as fallback.
+The page parsing is a plain function of the HTML (lxml with precompiled XPath selectors), so it can be run against saved pages.
+
+'''
+
+import json
+import os
+import queue
+import random
+import threading
+import time
+import lxml.html
+from lxml import etree
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from tqdm import tqdm
+from config import HEADERS, amazon_base_url, amazon_fetch_backend
+
+# XPath test for "the class attribute contains any of these classes", like BeautifulSoup's class_=[...]
+def _has_any_class(class_names):
+    return " or ".join(f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')" for name in class_names)
+
+# Selectors are compiled once and reused for every page
+_link_xpath = etree.XPath(f"//a[{_has_any_class(['a-size-base-plus', 'a-color-base', 'a-text-normal', 's-underline-text'])}]")
+_star_xpath = etree.XPath(f"//i[{_has_any_class(['a-icon', 'a-icon-star-small', 'a-star-small-4', 'aok-align-bottom'])}]")
+_rating_xpath = etree.XPath(f"(.//span[{_has_any_class(['a-icon-alt'])}])[1]")
+
+# Extract link text, star rating and product URL from the HTML of a search results page
+def parse_search_results(html_content, base_url=amazon_base_url):
+    if not html_content.strip():
+        return []
+    try:
+        document = lxml.html.fromstring(html_content)
+    except ValueError:
+        # lxml refuses str input that carries an XML encoding declaration
+        document = lxml.html.fromstring(html_content.encode('utf-8'))
+
+    # Find all relevant <a> and <i> tags
+    a_tags = _link_xpath(document)
+    i_tags = _star_xpath(document)
+
+    # Extract ratings from <i> tags
+    ratings = []
+    for i_tag in i_tags[:len(a_tags)]:
+        rating_span = _rating_xpath(i_tag)
+        ratings.append(rating_span[0].text_content().strip() if rating_span else None)
+
+    # Pair links with ratings (the shorter list decides) and combine text, rating, and hyperlink
+    return [{'Link Text': a_tag.text_content().strip(), 'Rating': rating, 'URL': f"{base_url}{a_tag.attrib['href']}"}
+            for a_tag, rating in zip(a_tags, ratings)]
+
+# Build the search URL for a 'brand name + product name' search term
+def build_search_url(search_term, base_url=amazon_base_url):
+    # Remove quotes and special characters from the search term
+    search_term = search_term.replace("'", "").replace('"', "").replace("&", "and")
+
+    # Replace spaces with '+' to make the query valid
+    search_term = search_term.lower().replace(" ", "+")
+
+    return f'{base_url}/s?k={search_term}'
+
+# Start a headless Chrome driver configured like a regular browser
+def create_chrome_driver():
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
+    chrome_options = Options()
+    chrome_options.add_argument("--headless=new")
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument(f"user-agent={HEADERS['User-Agent']}")
+    return webdriver.Chrome(options=chrome_options)
+
+
+class BlockedPageError(Exception):
+    """Raised when a page is a bot check instead of search results."""
+
+
+class HttpFetcher:
+    """Fetches pages over a pooled HTTP session that sends the browser-like config.HEADERS."""
+
+    def __init__(self, timeout=15, pool_size=4):
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def fetch(self, url):
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        if 'validateCaptcha' in response.text or 'api-services-support@amazon.com' in response.text:
+            raise BlockedPageError(f"Bot check served for {url}")
+        return response.text
+
+    def close(self):
+        self.session.close()
+
+
+class SeleniumFetcher:
+    """Fetches pages with a headless Chrome driver, waiting for the results to render."""
+
+    def __init__(self, make_driver=create_chrome_driver, page_load_wait=(3, 6)):
+        self.make_driver = make_driver
+        self.page_load_wait = page_load_wait
+        self.driver = None
+
+    def fetch(self, url):
+        if self.driver is None:
+            self.driver = self.make_driver()
+        try:
+            self.driver.get(url)
+            time.sleep(random.uniform(*self.page_load_wait))
+            return self.driver.page_source
+        except Exception:
+            # Start over with a fresh driver next time in case the session itself died
+            self.close()
+            raise
+
+    def close(self):
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except Exception:
+                pass
+            self.driver = None
+
+
+class FallbackFetcher:
+    """Tries the primary fetcher and falls back to the secondary one (created on first use) when it fails."""
+
+    def __init__(self, primary, make_fallback):
+        self.primary = primary
+        self.make_fallback = make_fallback
+        self.fallback = None
+
+    def fetch(self, url):
+        try:
+            return self.primary.fetch(url)
+        except Exception as e:
+            print(f"Primary fetch failed for {url} ({e}), falling back")
+            if self.fallback is None:
+                self.fallback = self.make_fallback()
+            return self.fallback.fetch(url)
+
+    def close(self):
+        self.primary.close()
+        if self.fallback is not None:
+            self.fallback.close()
+
+# Build a fetcher for one worker: 'http' (with Selenium as fallback) or 'selenium'
+def create_fetcher(backend=amazon_fetch_backend):
+    if backend == 'http':
+        return FallbackFetcher(HttpFetcher(), SeleniumFetcher)
+    if backend == 'selenium':
+        return SeleniumFetcher()
+    raise ValueError(f"Unknown fetch backend: {backend}")
+
+
+class RateLimiter:
+    """Spaces out requests from all workers so that at most one starts every `interval` seconds (plus jitter)."""
+
+    def __init__(self, interval, jitter=0.0):
+        self.interval = interval
+        self.jitter = jitter
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval + random.uniform(0, self.jitter)
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class ScrapeCheckpoint:
+    """Append-only JSON-lines file holding the scraped rows of every finished search term."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    # Return {search term: rows} for every term already scraped, dropping a torn last line left by a crash
+    def load(self):
+        completed = {}
+        if not os.path.exists(self.path):
+            return completed
+        good_length = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                completed[record['term']] = record['rows']
+                good_length += len(line)
+        if good_length < os.path.getsize(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(good_length)
+        return completed
+
+    def record(self, search_term, rows):
+        line = json.dumps({'term': search_term, 'rows': rows}) + "\n"
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+# Scrape every search term with a pool of fetchers, checkpointing each term, and save all rows to output_path
+def scrape_search_terms(search_terms, output_path, checkpoint_path, workers=1, make_fetcher=create_fetcher,
+                        base_url=amazon_base_url, request_interval=5.0, request_jitter=5.0, retries=3, backoff=10.0):
+    search_terms = list(dict.fromkeys(term.lower() for term in search_terms))
+    checkpoint = ScrapeCheckpoint(checkpoint_path)
+    completed = checkpoint.load()
+    if completed:
+        print(f"Resuming from checkpoint: {len(completed)} of {len(search_terms)} search terms already scraped")
+
+    work_queue = queue.Queue()
+    for search_term in search_terms:
+        if search_term not in completed:
+            work_queue.put(search_term)
+
+    rate_limiter = RateLimiter(request_interval, request_jitter)
+    progress = tqdm(total=work_queue.qsize(), desc="Scraping Products", unit="product")
+    progress_lock = threading.Lock()
+
+    def worker():
+        fetcher = None
+        try:
+            # A fetcher that fails to start (e.g. Chrome can't launch) ends the worker; its terms are reported below
+            fetcher = make_fetcher()
+            while True:
+                try:
+                    search_term = work_queue.get_nowait()
+                except queue.Empty:
+                    return
+
+                for attempt in range(retries + 1):
+                    try:
+                        rate_limiter.wait()
+                        search_url = build_search_url(search_term, base_url)
+                        print(f"Searching Amazon: {search_url}")
+                        product_data = parse_search_results(fetcher.fetch(search_url), base_url)
+                        break
+                    except Exception as e:
+                        print(f"Error encountered while searching for '{search_term}' (attempt {attempt + 1}): {e}")
+                        if attempt < retries:
+                            time.sleep(backoff * 2 ** attempt + random.uniform(0, backoff))
+                else:
+                    with progress_lock:
+                        progress.update(1)
+                    continue
+
+                if not product_data:
+                    print(f"No data returned for search: {search_term}")
+                checkpoint.record(search_term, product_data)
+                with progress_lock:
+                    completed[search_term] = product_data
+                    progress.update(1)
+        except Exception as e:
+            print(f"Scraping worker stopped: {e}")
+        finally:
+            if fetcher is not None:
+                fetcher.close()
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, workers))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    progress.close()
+
+    # Save rows in search list order so the output doesn't depend on worker scheduling
+    all_data = [row for search_term in search_terms for row in completed.get(search_term, [])]
+    if all_data:
+        pd.DataFrame(all_data).to_csv(output_path, index=False)
+        print(f"Scraping complete! Data saved to '{output_path}'.")
+
+    # Terms that ran out of retries, and terms no worker got to because the workers stopped early
+    failed_terms = [search_term for search_term in search_terms if search_term not in completed]
+
+    # Keep the checkpoint while some terms are still missing, so the next run only retries those
+    if failed_terms:
+        print(f"{len(failed_terms)} search terms failed and will be retried on the next run")
+    else:
+        checkpoint.clear()
+
+    return all_data, failed_terms
@@ -11,7 +11,9 @@ from selenium.webdriver.common.by import By
 import os
 import time
 from config import download_dir, raw_dataset_folder_path
+from instrumentation import instrumented
 
+@instrumented()
 def scrape_banned_ingredients_dataset():
     
     chrome_options = webdriver.ChromeOptions()
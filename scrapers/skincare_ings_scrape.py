@@ -10,7 +10,9 @@ from selenium.webdriver.common.by import By
 import os
 import time
 from config import download_dir, raw_dataset_folder_path
+from instrumentation import instrumented
 
+@instrumented()
 def scrape_skincare_ingredients_dataset():
     
     chrome_options = webdriver.ChromeOptions()
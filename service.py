@@ -0,0 +1,314 @@
+'''
+service.py
+
+Headless recommendation service for machine-to-machine clients (the mobile app, nightly batch jobs), without Streamlit.
+It offers a plain Python API (recommend, recommend_batch) and an asyncio HTTP server with JSON endpoints:
+    GET  /health            dataset fingerprint and recommendation cache counters
+    POST /recommend         one user profile -> its recommendations
+    POST /recommend/batch   {"profiles": [...]} -> {"results": [...]}, all answered from one catalog version and scored
+                            in one vectorized pass (see bulk_scoring.py)
+    GET  /metrics           span timings of this process in Prometheus text format (see instrumentation.py)
+The catalog is loaded once when the service starts and only swapped when the dataset changes (see catalog.py), and the
+recommendation work runs in worker threads so the event loop keeps accepting requests.
+
+A profile is a JSON object such as
+    {"labels": ["moisturizer"], "skin_types": ["Dry"], "improvements": ["Hydration"], "max_price": 100, "age": 25, "uv_index_max": 6}
+where "price_range": [min, max] may replace "max_price", and "city" may replace "uv_index_max" to use that city's UV index.
+
+Usage: python service.py [--host 127.0.0.1] [--port 8502]
+
+'''
+
+import argparse
+import asyncio
+import json
+import pandas as pd
+from config import merged_dataset_path, cities, service_host, service_port, service_max_body_bytes, service_max_batch_profiles
+from recommendation import get_catalog, get_spf_recommendation
+from recommendation_cache import RecommendationCache, get_recommendations, query_key, recommendation_cache_info
+from weather_api import get_weather_data
+from bulk_scoring import score_profiles
+from instrumentation import instrumented, prometheus_text
+
+# Product columns returned to clients
+product_columns = ['Label', 'Brand', 'Name', 'Product', 'Price', 'Rating', 'Review Count', 'SPF', 'Ingredients', 'URL',
+                   'Skin Type Match Score']
+
+http_reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+                500: 'Internal Server Error'}
+
+
+class ProfileError(ValueError):
+    """Raised when a user profile sent to the service is missing fields or has invalid values."""
+
+
+class HTTPError(Exception):
+    """An error answered to the HTTP client with the given status code."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _string_list(profile, field, required=False):
+    values = profile.get(field, [])
+    if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+        raise ProfileError(f"'{field}' must be a list of strings")
+    if required and not values:
+        raise ProfileError(f"'{field}' must not be empty")
+    return values
+
+# Validate a profile and return the recommendation arguments (labels, skin types, improvements, price range, age, UV index)
+def parse_profile(profile):
+    if not isinstance(profile, dict):
+        raise ProfileError("A profile must be a JSON object")
+    labels = _string_list(profile, 'labels', required=True)
+    skin_types = _string_list(profile, 'skin_types', required=True)
+    improvements = _string_list(profile, 'improvements')
+
+    try:
+        if 'price_range' in profile:
+            price_range = [float(profile['price_range'][0]), float(profile['price_range'][1])]
+        else:
+            price_range = [0, float(profile.get('max_price', 100.0))]
+        age = int(profile.get('age', 0))
+    except (TypeError, ValueError, IndexError, KeyError):
+        raise ProfileError("'price_range' must be [min, max], 'max_price' a number and 'age' an integer")
+
+    if 'uv_index_max' in profile:
+        try:
+            uv_index_max = float(profile['uv_index_max'])
+        except (TypeError, ValueError):
+            raise ProfileError("'uv_index_max' must be a number")
+    elif profile.get('city') in cities:
+        uv_index_max = get_weather_data(profile['city'])[1]
+        if uv_index_max is None:
+            raise ProfileError(f"No UV index available for {profile['city']}")
+    else:
+        raise ProfileError("Either 'uv_index_max' or a configured 'city' is required")
+
+    return labels, skin_types, improvements, price_range, age, uv_index_max
+
+def _records(df):
+    columns = [col for col in product_columns if col in df.columns]
+    return json.loads(df[columns].to_json(orient='records'))
+
+# Reject product labels the catalog does not have
+def _check_labels(args, catalog):
+    unknown = [label for label in args[0] if label not in catalog.label_ranges]
+    if unknown:
+        raise ProfileError(f"Unknown product labels: {', '.join(unknown)}")
+    return args
+
+def _build_response(args, products, sunscreens):
+    uv_index_max = args[5]
+    return {
+        'products': products,
+        'recommended_spf': get_spf_recommendation(uv_index_max),
+        # The app only suggests sunscreen on sunny days, but the matches are returned either way
+        'sunscreen_recommended': uv_index_max > 5,
+        'sunscreens': sunscreens,
+    }
+
+# JSON-ready responses of recent queries, so repeated requests skip serializing the DataFrames again
+_responses = RecommendationCache()
+
+def _response_key(args):
+    return (tuple(args[0]), query_key(*args))  # Responses list the labels in the order they were requested
+
+def _response(args, catalog):
+    key = _response_key(args)
+    response = _responses.get(catalog.fingerprint, key)
+    if response is not None:
+        return response
+
+    products_by_label, sunscreens = get_recommendations(*args, catalog=catalog)
+    response = _build_response(args, {label: _records(products_by_label[label]) for label in args[0]}, _records(sunscreens))
+    _responses.put(catalog.fingerprint, key, response)
+    return response
+
+# Responses for many parsed profiles, scored together by the bulk scoring engine and serialized in one go
+def _scored_responses(args_list, catalog):
+    profiles = pd.DataFrame({
+        'user_id': range(len(args_list)),
+        'labels': [list(args[0]) for args in args_list],
+        'skin_types': [list(args[1]) for args in args_list],
+        'improvements': [list(args[2]) for args in args_list],
+        'min_price': [args[3][0] for args in args_list],
+        'max_price': [args[3][1] for args in args_list],
+        'age': [args[4] for args in args_list],
+        'uv_index_max': [args[5] for args in args_list],
+    })
+    scored = score_profiles(profiles, catalog, columns=product_columns, all_sunscreens=True)
+
+    products = [{label: [] for label in args[0]} for args in args_list]
+    sunscreens = [[] for _ in args_list]
+    for user, kind, label, record in zip(scored['user_id'].tolist(), scored['kind'].tolist(), scored['label'].tolist(),
+                                         _records(scored)):
+        if kind == 'product':
+            products[user][label].append(record)
+        else:
+            sunscreens[user].append(record)
+    return [_build_response(args, products[user], sunscreens[user]) for user, args in enumerate(args_list)]
+
+# Recommendations for one profile, as a JSON-ready dict
+@instrumented(rows_in=lambda profile, *args, **kwargs: 1)
+def recommend(profile, dataset_path=merged_dataset_path):
+    catalog = get_catalog(dataset_path)
+    return _response(_check_labels(parse_profile(profile), catalog), catalog)
+
+# Recommendations for many profiles against a single catalog version (invalid profiles get an 'error' entry)
+@instrumented(rows_in=lambda profiles, *args, **kwargs: len(profiles), rows_out=len)
+def recommend_batch(profiles, dataset_path=merged_dataset_path):
+    catalog = get_catalog(dataset_path)
+    results = [None] * len(profiles)
+
+    # Answer cached queries and errors first; the other distinct queries are scored together
+    pending = {}  # response key -> (recommendation arguments, positions of the profiles asking for it)
+    for position, profile in enumerate(profiles):
+        try:
+            args = _check_labels(parse_profile(profile), catalog)
+        except ProfileError as e:
+            results[position] = {'error': str(e)}
+            continue
+        key = _response_key(args)
+        response = _responses.get(catalog.fingerprint, key) if key not in pending else None
+        if response is not None:
+            results[position] = response
+        else:
+            pending.setdefault(key, (args, []))[1].append(position)
+
+    if pending:
+        for key, response in zip(pending, _scored_responses([args for args, _ in pending.values()], catalog)):
+            _responses.put(catalog.fingerprint, key, response)
+            for position in pending[key][1]:
+                results[position] = response
+    return results
+
+def health():
+    return {'status': 'ok', 'fingerprint': get_catalog(merged_dataset_path).fingerprint,
+            'recommendation_cache': recommendation_cache_info(), 'response_cache': _responses.info()}
+
+# Handlers returning a str are answered in Prometheus text format instead of JSON
+def metrics():
+    return prometheus_text()
+
+def _batch_request(payload):
+    profiles = payload.get('profiles') if isinstance(payload, dict) else None
+    if not isinstance(profiles, list):
+        raise ProfileError("The request body must be {\"profiles\": [...]}")
+    if len(profiles) > service_max_batch_profiles:
+        raise ProfileError(f"At most {service_max_batch_profiles} profiles can be sent in one batch")
+    return {'results': recommend_batch(profiles)}
+
+# (method, path) -> (handler, whether it takes the JSON request body)
+routes = {
+    ('GET', '/health'): (health, False),
+    ('POST', '/recommend'): (recommend, True),
+    ('POST', '/recommend/batch'): (_batch_request, True),
+    ('GET', '/metrics'): (metrics, False),
+}
+
+async def _read_request(reader):
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    try:
+        method, target, version = request_line.decode('latin-1').split()
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise HTTPError(400, "Invalid Content-Length")
+    if length > service_max_body_bytes:
+        raise HTTPError(413, f"Request body is larger than {service_max_body_bytes} bytes")
+    body = await reader.readexactly(length) if length else b''
+
+    keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+    return method, target.split('?')[0], body, keep_alive
+
+async def _dispatch(method, path, body):
+    if path not in {route_path for _, route_path in routes}:
+        raise HTTPError(404, f"No endpoint at {path}")
+    if (method, path) not in routes:
+        raise HTTPError(405, f"{method} is not supported on {path}")
+    handler, takes_body = routes[(method, path)]
+
+    if not takes_body:
+        return await asyncio.to_thread(handler)
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPError(400, "The request body is not valid JSON")
+    try:
+        return await asyncio.to_thread(handler, payload)
+    except ProfileError as e:
+        raise HTTPError(400, str(e))
+
+def _write_response(writer, status, payload, keep_alive):
+    if isinstance(payload, str):
+        data, content_type = payload.encode(), 'text/plain; version=0.0.4'
+    else:
+        data, content_type = json.dumps(payload).encode(), 'application/json'
+    head = (f"HTTP/1.1 {status} {http_reasons[status]}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    writer.write(head.encode('latin-1') + data)
+
+# Serve the requests of one client connection (several of them when the client keeps the connection alive)
+async def _handle_connection(reader, writer):
+    try:
+        while True:
+            try:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, path, body, keep_alive = request
+                status, payload = 200, await _dispatch(method, path, body)
+            except HTTPError as e:
+                # The rest of a rejected request may still be unread, so the connection is not reused
+                status, payload, keep_alive = e.status, {'error': str(e)}, False
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            except Exception as e:
+                print(f"Error serving request: {e!r}")
+                status, payload, keep_alive = 500, {'error': "Internal server error"}, False
+
+            _write_response(writer, status, payload, keep_alive)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+# Load the catalog, then accept connections until the process is stopped
+async def serve(host=service_host, port=service_port):
+    catalog = await asyncio.to_thread(get_catalog, merged_dataset_path)
+    server = await asyncio.start_server(_handle_connection, host, port)
+    print(f"Serving recommendations for dataset {catalog.fingerprint[:12]} on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the SkinWiz recommendation HTTP service.")
+    parser.add_argument('--host', default=service_host)
+    parser.add_argument('--port', type=int, default=service_port)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
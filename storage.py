@@ -0,0 +1,201 @@
+'''
+storage.py
+
+Typed, columnar storage for the cleaned and merged datasets.
+Every dataset has a declared schema (categorical Label and Brand, int8 skin type and concern flags, numeric prices and ratings)
+that is applied once when the dataset is written, so readers no longer re-coerce columns on every read.
+Datasets are stored as Parquet, which lets readers load only the columns they use, with a CSV copy exported next to each
+file for humans. The dataset paths in config.py name the CSV copies; resolve_path maps them to the stored file.
+Without pyarrow (or with dataset_storage_format = 'csv') the CSV files are the storage and are read back with the same schema.
+
+'''
+
+import os
+import pandas as pd
+from config import dataset_storage_format, export_csv_copies
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+_skin_type_flags = {col: 'int8' for col in ['Combination', 'Dry', 'Normal', 'Oily', 'Sensitive']}
+_concern_flags = {col: 'int8' for col in ['Acne', 'Brightening', 'Hydration', 'Anti_Aging']}
+
+# Declared column types of every dataset; columns that are not listed keep the type they are read with
+schemas = {
+    'skincare_ingredients': {
+        'Label': 'category', 'Brand': 'category', 'Name': 'string', 'Price': 'float64', 'Rank': 'float64',
+        'Ingredients': 'string', **_skin_type_flags
+    },
+    'banned_skincare_ings': {
+        'Name': 'string', 'EC No.': 'string', 'CAS No.': 'string', 'Restriction(s)': 'string'
+    },
+    'amazon_data': {
+        'Product': 'string', 'Review Count': 'int64', 'Price': 'string', 'URL': 'string', 'Rating': 'float64'
+    },
+    'merged_data': {
+        'Label': 'category', 'Brand': 'category', 'Name': 'string', 'Price': 'float64', 'Rank': 'float64',
+        'Ingredients': 'string', **_skin_type_flags, 'Brand_Name': 'string', 'Product': 'string',
+        'Review Count': 'int64', 'URL': 'string', 'Rating': 'float64', 'SPF': 'int16', **_concern_flags,
+        'Smoothed Rating': 'float64', 'Review Score': 'float64', 'Price Percentile': 'float64', 'Concern Count': 'int8'
+    },
+}
+
+# Float columns whose source writes whole numbers without a decimal point (OpenML prices such as '175'): their CSV copies
+# keep that format instead of pandas' '175.0'. Ranks and Amazon ratings come as '4.0', so they keep the default format
+csv_whole_number_columns = {
+    'skincare_ingredients': ['Price'],
+}
+
+_arrow_types = {
+    'category': lambda: pa.dictionary(pa.int32(), pa.string()),
+    'string': lambda: pa.string(),
+    'float64': lambda: pa.float64(),
+    'int64': lambda: pa.int64(),
+    'int16': lambda: pa.int16(),
+    'int8': lambda: pa.int8(),
+}
+
+# Use Parquet only when it was selected and pyarrow is available
+def columnar_storage_enabled():
+    return dataset_storage_format == 'parquet' and pq is not None
+
+# Map a configured dataset path (the CSV copy) to the file the dataset is stored in
+def resolve_path(path):
+    if columnar_storage_enabled():
+        return os.path.splitext(path)[0] + '.parquet'
+    return path
+
+# Return the file a read of this dataset will actually load: the stored file, or the CSV copy if that is all there is
+def stored_path(path):
+    storage_path = resolve_path(path)
+    if storage_path != path and not os.path.exists(storage_path) and os.path.exists(path):
+        return path
+    return storage_path
+
+# Rename repeated column names the way read_csv does ('Name', 'Name.1', ...) and blank ones to 'Unnamed: i'
+def unique_columns(columns):
+    seen = set()
+    unique = []
+    for position, col in enumerate(columns):
+        col = str(col) if str(col) else f"Unnamed: {position}"
+        name, count = col, 0
+        while name in seen:
+            count += 1
+            name = f"{col}.{count}"
+        seen.add(name)
+        unique.append(name)
+    return unique
+
+# Coerce the columns of df to the declared types; integer columns use 0 for missing values
+def apply_schema(df, schema):
+    for col, dtype in schema.items():
+        if col not in df.columns or str(df[col].dtype) == dtype:
+            continue
+        if dtype == 'category':
+            df[col] = df[col].astype('category')
+        elif dtype == 'string':
+            if not pd.api.types.is_string_dtype(df[col]):
+                df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+        elif dtype.startswith('int'):
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(dtype)
+        else:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype(dtype)
+    return df
+
+# Arrow schema for a typed frame: declared columns get their fixed Arrow type so every batch of a dataset matches
+def arrow_schema(df, schema):
+    inferred = pa.Schema.from_pandas(df, preserve_index=False)
+    fields = [pa.field(field.name, _arrow_types[schema[field.name]]()) if field.name in schema else field
+              for field in inferred]
+    return pa.schema(fields, metadata=inferred.metadata)
+
+def _whole_number(value):
+    return int(value) if isinstance(value, float) and value.is_integer() else value
+
+# The frame as written to a CSV copy, with the whole numbers of its csv_whole_number_columns formatted as ints
+def csv_frame(df, name):
+    columns = [col for col in csv_whole_number_columns.get(name, []) if col in df.columns]
+    return df.assign(**{col: pd.Series([_whole_number(value) for value in df[col].tolist()], index=df.index, dtype=object)
+                        for col in columns}) if columns else df
+
+def _to_arrow(df, arrow_table_schema):
+    return pa.Table.from_pandas(df, schema=arrow_table_schema, preserve_index=False)
+
+# Read a dataset by its configured path, loading only the given columns
+def read_dataset(path, name, columns=None):
+    schema = schemas[name]
+    file_path = stored_path(path)
+    if file_path.endswith('.parquet'):
+        df = pd.read_parquet(file_path, columns=columns)
+    else:
+        string_columns = {col: str for col, dtype in schema.items() if dtype == 'string' and (columns is None or col in columns)}
+        df = pd.read_csv(file_path, usecols=columns, dtype=string_columns)
+    return apply_schema(df, schema)
+
+
+class DatasetWriter:
+    """Writes a dataset in batches (Parquet row groups plus the CSV copy) and publishes the files atomically on close."""
+
+    def __init__(self, path, name, columns):
+        self.path = path
+        self.name = name
+        self.schema = schemas[name]
+        self.columns = list(columns)
+        self.storage_path = resolve_path(path)
+        self.write_csv = self.storage_path == path or export_csv_copies
+        self._parquet_writer = None
+        self.rows_written = 0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+        # Write the CSV header first so an empty dataset still produces a valid file
+        if self.write_csv:
+            pd.DataFrame(columns=self.columns).to_csv(f"{self.path}.tmp", index=False)
+
+    def write(self, df):
+        # Columns are addressed by unique names (as read_csv would name them); the CSV header keeps the original ones
+        df = apply_schema(df.set_axis(unique_columns(df.columns), axis=1), self.schema)
+        if self.storage_path != self.path:
+            if self._parquet_writer is None:
+                self._arrow_schema = arrow_schema(df, self.schema)
+                self._parquet_writer = pq.ParquetWriter(f"{self.storage_path}.tmp", self._arrow_schema)
+            self._parquet_writer.write_table(_to_arrow(df, self._arrow_schema))
+        if self.write_csv:
+            csv_frame(df, self.name).to_csv(f"{self.path}.tmp", mode='a', header=False, index=False)
+        self.rows_written += len(df)
+
+    # Finish the files and move them into place so readers never see a partial dataset
+    def close(self):
+        if self.storage_path != self.path:
+            if self._parquet_writer is None:
+                self.write(pd.DataFrame(columns=self.columns))
+            self._parquet_writer.close()
+            os.replace(f"{self.storage_path}.tmp", self.storage_path)
+        if self.write_csv:
+            os.replace(f"{self.path}.tmp", self.path)
+
+    # Drop the temporary files of an unfinished write
+    def abort(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+        for tmp_path in (f"{self.storage_path}.tmp", f"{self.path}.tmp"):
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+# Write a whole dataset by its configured path, returning the stored file
+def write_dataset(df, path, name):
+    with DatasetWriter(path, name, df.columns) as writer:
+        writer.write(df)
+    return writer.storage_path
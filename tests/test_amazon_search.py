@@ -0,0 +1,101 @@
+import json
+import os
+import pytest
+from scrapers.amazon_search import ScrapeCheckpoint, build_search_url, parse_search_results, scrape_search_terms
+
+fixtures_dir = os.path.join(os.path.dirname(__file__), 'fixtures')
+base_url = 'https://www.amazon.com'
+
+def fixture(name):
+    with open(os.path.join(fixtures_dir, name), encoding='utf-8') as f:
+        return f.read()
+
+def test_parse_search_results():
+    assert parse_search_results(fixture('amazon_search_results.html'), base_url) == [
+        {'Link Text': 'La Mer  Crème de la Mer Moisturizing Cream, 1 oz', 'Rating': '4.5 out of 5 stars',
+         'URL': 'https://www.amazon.com/La-Mer-Moisturizing-Cream/dp/B000KPYAP4/ref=sr_1_1'},
+        {'Link Text': 'LA MER The Moisturizing Soft Cream & SPF 30 Fluid', 'Rating': '4.0 out of 5 stars',
+         'URL': 'https://www.amazon.com/Mer-Moisturizing-Soft-Cream/dp/B01N5T4KVH/ref=sr_1_2'},
+        # A star icon without its text, and a last link without a star icon (links and ratings are paired up)
+        {'Link Text': 'La Mer The Renewal Oil', 'Rating': None,
+         'URL': 'https://www.amazon.com/Mer-Renewal-Oil/dp/B07H8Q2K5P/ref=sr_1_3'},
+    ]
+    assert parse_search_results(fixture('amazon_search_no_results.html'), base_url) == []
+    assert parse_search_results('', base_url) == []
+    assert parse_search_results('<?xml version="1.0" encoding="utf-8"?>' + fixture('amazon_search_results.html'),
+                                base_url)[0]['Rating'] == '4.5 out of 5 stars'
+
+# The BeautifulSoup parsing that the lxml selectors replaced
+def parse_with_beautifulsoup(html_content):
+    bs4 = pytest.importorskip('bs4')
+    soup = bs4.BeautifulSoup(html_content, 'html.parser')
+    a_tags = soup.find_all('a', class_=["a-size-base-plus", "a-color-base", "a-text-normal", "s-underline-text"])
+    i_tags = soup.find_all('i', class_=["a-icon", "a-icon-star-small", "a-star-small-4", "aok-align-bottom"])
+    ratings = [i.find('span', class_='a-icon-alt').text.strip() if i.find('span', 'a-icon-alt') else None for i in i_tags]
+    return [{'Link Text': a_tags[i].text.strip(), 'Rating': ratings[i], 'URL': f"{base_url}{a_tags[i]['href']}"}
+            for i in range(min(len(a_tags), len(i_tags)))]
+
+@pytest.mark.parametrize('name', ['amazon_search_results.html', 'amazon_search_no_results.html'])
+def test_parse_search_results_matches_beautifulsoup(name):
+    assert parse_search_results(fixture(name), base_url) == parse_with_beautifulsoup(fixture(name))
+
+
+class FixtureFetcher:
+    """Serves the saved result pages by search URL, failing the searches it is told to."""
+
+    def __init__(self, pages, failures, fetched):
+        self.pages = pages
+        self.failures = failures
+        self.fetched = fetched
+
+    def fetch(self, url):
+        self.fetched.append(url)
+        if self.failures.get(url, 0):
+            self.failures[url] -= 1
+            raise ConnectionError(f"Connection reset fetching {url}")
+        return self.pages[url]
+
+    def close(self):
+        pass
+
+def scrape(tmp_path, search_terms, pages, failures, fetched, workers=2):
+    return scrape_search_terms(search_terms, str(tmp_path / 'amazon_data.csv'), str(tmp_path / 'checkpoint.jsonl'),
+                               workers=workers, make_fetcher=lambda: FixtureFetcher(pages, failures, fetched),
+                               base_url=base_url, request_interval=0, request_jitter=0, retries=2, backoff=0)
+
+def test_scrape_resumes_after_a_crash(tmp_path):
+    search_terms = ['La Mer Moisturizing Cream', 'Xyzzy Serum', 'Tatcha Water Cream', 'Clinique Soap']
+    urls = [build_search_url(term, base_url) for term in search_terms]
+    pages = dict(zip(urls, [fixture('amazon_search_results.html'), fixture('amazon_search_no_results.html'),
+                            fixture('amazon_search_results.html'), fixture('amazon_search_results.html')]))
+
+    # The first run loses one search to a dead connection, and then crashes while writing a checkpoint line
+    fetched = []
+    rows, failed_terms = scrape(tmp_path, search_terms, pages, {urls[2]: 3, urls[0]: 1}, fetched)
+    assert failed_terms == ['tatcha water cream']
+    assert fetched.count(urls[0]) == 2 and fetched.count(urls[2]) == 3
+    assert len(rows) == 6
+    with open(tmp_path / 'checkpoint.jsonl', 'a') as f:
+        f.write(json.dumps({'term': 'tatcha water cream', 'rows': []})[:20])
+    assert set(ScrapeCheckpoint(str(tmp_path / 'checkpoint.jsonl')).load()) == \
+        {'la mer moisturizing cream', 'xyzzy serum', 'clinique soap'}
+
+    # The next run only searches the missing terms, and keeps the rows in search term order
+    fetched = []
+    rows, failed_terms = scrape(tmp_path, search_terms, pages, {}, fetched)
+    assert failed_terms == []
+    assert fetched == [urls[2]]
+    assert len(rows) == 9
+    assert [row['URL'] for row in rows[:3]] == [row['URL'] for row in rows[3:6]]
+    assert not os.path.exists(tmp_path / 'checkpoint.jsonl')
+    assert (tmp_path / 'amazon_data.csv').read_text(encoding='utf-8').splitlines()[0] == 'Link Text,Rating,URL'
+
+def test_scrape_reports_the_terms_of_a_fetcher_that_fails_to_start(tmp_path):
+    def make_fetcher():
+        raise RuntimeError("Chrome failed to start")
+
+    rows, failed_terms = scrape_search_terms(['a', 'b'], str(tmp_path / 'amazon_data.csv'),
+                                             str(tmp_path / 'checkpoint.jsonl'), make_fetcher=make_fetcher,
+                                             request_interval=0, request_jitter=0)
+    assert (rows, failed_terms) == ([], ['a', 'b'])
+    assert not os.path.exists(tmp_path / 'amazon_data.csv')
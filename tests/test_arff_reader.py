@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+from processing.arff_reader import iter_arff_batches, read_arff, split_fields
+
+arff_text = r"""% OpenML skincare ingredients (excerpt)
+@RELATION skincare
+
+@ATTRIBUTE Label {Moisturizer,Cleanser}
+@ATTRIBUTE 'Brand Name' STRING
+@ATTRIBUTE Price NUMERIC
+@ATTRIBUTE Ingredients STRING
+
+@DATA
+Moisturizer,'LA MER',175,'Algae (Seaweed) Extract, Mineral Oil'
+Cleanser,'Kiehl\'s',22.5,"Water, \"Soap\" Base"
+% a comment line
+Moisturizer,'Dr. Jart+',?,'Water, Glycerin'
+Cleanser,'Unclosed,10,'Water'
+Moisturizer,'Too few fields'
+Cleanser,'O\'Keeffe\'s',8,'It\'s \\ a test'
+"""
+
+@pytest.fixture
+def arff_path(tmp_path):
+    path = tmp_path / 'skincare.arff'
+    path.write_text(arff_text)
+    return str(path)
+
+def test_read_arff_unescapes_quotes_and_skips_malformed_lines(arff_path):
+    df = read_arff(arff_path)
+    assert list(df.columns) == ['Label', 'Brand Name', 'Price', 'Ingredients']
+    assert df['Brand Name'].tolist() == ['LA MER', "Kiehl's", 'Dr. Jart+', "O'Keeffe's"]
+    assert df['Ingredients'].tolist() == ['Algae (Seaweed) Extract, Mineral Oil', 'Water, "Soap" Base', 'Water, Glycerin',
+                                          "It's \\ a test"]
+    assert df['Price'].isna().tolist() == [False, False, True, False]
+    assert df['Price'].dropna().tolist() == [175.0, 22.5, 8.0]
+    assert isinstance(df['Label'].dtype, pd.CategoricalDtype)
+    assert list(df['Label'].cat.categories) == ['Moisturizer', 'Cleanser']
+
+def test_read_arff_columns_and_batches(arff_path):
+    assert list(read_arff(arff_path, columns=['Price', 'Label']).columns) == ['Price', 'Label']
+    with pytest.raises(ValueError, match='Rating'):
+        read_arff(arff_path, columns=['Rating'])
+    assert [len(batch) for batch in iter_arff_batches(arff_path, batch_size=3)] == [3, 1]
+
+def test_read_arff_without_data(tmp_path):
+    path = tmp_path / 'empty.arff'
+    path.write_text("@RELATION empty\n@ATTRIBUTE Name STRING\n@ATTRIBUTE Price REAL\n@DATA\n")
+    df = read_arff(str(path))
+    assert len(df) == 0 and list(df.columns) == ['Name', 'Price']
+
+def test_split_fields():
+    assert split_fields(r"""'a\'b', "c,d" , ?,plain,'' """) == ["a'b", 'c,d', None, 'plain', '']
+    assert split_fields("'unclosed, x") is None
+    assert split_fields("% comment") is None
+    assert split_fields("   ") is None
@@ -0,0 +1,51 @@
+import os
+import pytest
+from processing.banned_skincare_ings_clean import clean_banned_skincare_ingredients, iter_banned_substances
+from storage import read_dataset
+
+header = ['Name', 'EC No.', 'CAS No.', 'Name', 'Restriction(s)', 'Reference']
+
+def export_line(fields):
+    return '\t'.join(f'"{field}"' for field in fields) + '\r\n'
+
+# An ECHA export: a preamble, the header row (with 'Name' repeated) and one line per substance and restriction
+export_text = (
+    'Regulation (EC) No 1223/2009 on cosmetic products\n'
+    'Annex II - list of prohibited substances\n'
+    + export_line(header)
+    + export_line(['Lead  acetate', '206-104-4', '301-04-2', 'lead acetate', 'Not permitted for all products', 'II/289'])
+    + export_line(['Hydroquinone', '204-617-8', '123-31-9', 'hydroquinone', 'Only in artificial nail systems', 'III/14'])
+    + export_line(['LEAD ACETATE', '206-104-4', '301-04-2', 'lead acetate', 'Not permitted for all products', 'II/290'])
+    + export_line(['Pyrogallol', '-', '', 'pyrogallol', 'Not permitted for all products (hair dyes)', 'II/1'])
+    + export_line(['Short line', 'Not permitted for all products'])
+    + export_line(['-', '-', '-', '-', 'Not permitted for all products', 'II/2'])
+)
+
+def write_export(path):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(export_text)
+
+def test_iter_banned_substances(tmp_path):
+    path = tmp_path / 'banned_skincare_ings.csv'
+    write_export(path)
+    assert list(iter_banned_substances(str(path))) == [
+        ('Lead acetate', '206-104-4', '301-04-2', 'Not permitted for all products'),
+        ('LEAD ACETATE', '206-104-4', '301-04-2', 'Not permitted for all products'),
+        ('Pyrogallol', None, None, 'Not permitted for all products (hair dyes)'),
+        (None, None, None, 'Not permitted for all products'),
+    ]
+    assert [row[0] for row in iter_banned_substances(str(path), 'Only in')] == ['Hydroquinone']
+
+def test_iter_banned_substances_without_header(tmp_path):
+    path = tmp_path / 'banned_skincare_ings.csv'
+    path.write_text('Not an export\n')
+    with pytest.raises(ValueError, match="No header row"):
+        list(iter_banned_substances(str(path)))
+
+def test_clean_keeps_every_substance_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('datasets/raw')
+    write_export('datasets/raw/banned_skincare_ings.csv')
+    clean_banned_skincare_ingredients(batch_size=1)
+    df = read_dataset('datasets/cleaned/banned_skincare_ings.csv', 'banned_skincare_ings')
+    assert df['Name'].tolist() == ['Lead acetate', 'Pyrogallol']
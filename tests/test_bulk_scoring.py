@@ -0,0 +1,124 @@
+import random
+import numpy as np
+import pandas as pd
+import pytest
+from bulk_scoring import score_profiles, first_k_distinct
+from catalog import ProductCatalog, skin_type_columns, concern_columns
+from ranking import add_ranking_features
+from recommendation import get_spf_recommendation
+from recommendation_cache import RecommendationCache, get_recommendations
+
+# Merged-dataset rows with few distinct names, so top-k lists have to skip repeated products
+@pytest.fixture(scope='module')
+def catalog():
+    rng = random.Random(0)
+    num_rows = 600
+    df = pd.DataFrame({
+        'Label': [rng.choice(['Cleanser', 'Moisturizer', 'Sun protect', 'Treatment']) for _ in range(num_rows)],
+        'Brand': [rng.choice(['CLINIQUE', 'TATCHA', 'LA MER']) for _ in range(num_rows)],
+        'Name': [f"product {rng.randint(0, 150)}" for _ in range(num_rows)],
+        'Product': [f"Amazon title {i}" for i in range(num_rows)],
+        'Price': [float(rng.randint(5, 200)) for _ in range(num_rows)],
+        'Rank': [round(rng.uniform(1, 5), 1) for _ in range(num_rows)],
+        'Rating': [rng.choice([3.5, 4.0, 4.5, 5.0, round(rng.uniform(1, 5), 1)]) for _ in range(num_rows)],
+        'Review Count': [rng.randint(0, 5000) for _ in range(num_rows)],
+        'SPF': [rng.choice([0, 0, 0, 15, 30, 50]) for _ in range(num_rows)],
+        'URL': [f"https://www.amazon.com/dp/{i:010d}" for i in range(num_rows)],
+        **{col: [int(rng.random() < 0.5) for _ in range(num_rows)] for col in skin_type_columns + concern_columns},
+    })
+    return ProductCatalog(add_ranking_features(df, concern_columns), fingerprint='test')
+
+def random_profiles(catalog, count, seed):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        min_price = rng.choice([0, 0, 20])
+        rows.append({
+            'user_id': f"u{i}",
+            'labels': ';'.join(rng.sample(catalog.labels + ['Unknown'], rng.randint(1, 3))),
+            'skin_types': ';'.join(rng.sample(skin_type_columns, rng.randint(1, 2))),
+            'improvements': ';'.join(rng.sample(concern_columns, rng.randint(0, 2))),
+            'min_price': min_price,
+            'max_price': min_price + rng.choice([30, 80, 200]),
+            'age': rng.randint(15, 60),
+            'uv_index_max': rng.choice([1, 4, 6, 8, 11]),
+        })
+    return pd.DataFrame(rows)
+
+@pytest.mark.parametrize('weights', [None, {'Smoothed Rating': 1.0, 'Review Score': 0.5, 'Price Percentile': -0.2}])
+@pytest.mark.parametrize('max_cells', [1_000_000, 1000])
+def test_score_profiles_matches_get_recommendations(catalog, weights, max_cells):
+    profiles = random_profiles(catalog, 150, seed=1)
+    scored = score_profiles(profiles, catalog, max_cells=max_cells, weights=weights)
+
+    for profile in profiles.to_dict('records'):
+        labels = [label for label in profile['labels'].split(';') if label in catalog.label_ranges]
+        mine = scored[scored['user_id'] == profile['user_id']]
+        if not labels:
+            assert mine.empty
+            continue
+        products_by_label, sunscreens = get_recommendations(
+            labels, profile['skin_types'].split(';'), [value for value in profile['improvements'].split(';') if value],
+            [profile['min_price'], profile['max_price']], profile['age'], profile['uv_index_max'],
+            cache=RecommendationCache(), catalog=catalog, weights=weights)
+
+        products = mine[mine['kind'] == 'product']
+        assert products['label'].drop_duplicates().tolist() == [label for label in labels
+                                                                  if not products_by_label[label].empty]
+        for label in labels:
+            assert products[products['label'] == label]['URL'].tolist() == products_by_label[label]['URL'].tolist()
+            assert products[products['label'] == label]['rank'].tolist() == list(range(1, len(products_by_label[label]) + 1))
+        expected_sunscreens = sunscreens['URL'].tolist() if get_spf_recommendation(profile['uv_index_max']) >= 30 else []
+        assert mine[mine['kind'] == 'sunscreen']['URL'].tolist() == expected_sunscreens
+
+def test_score_profiles_can_return_every_sunscreen_match(catalog):
+    profiles = random_profiles(catalog, 40, seed=2)
+    scored = score_profiles(profiles, catalog, all_sunscreens=True)
+    for profile in profiles.to_dict('records'):
+        labels = [label for label in profile['labels'].split(';') if label in catalog.label_ranges]
+        if not labels:
+            continue
+        _, sunscreens = get_recommendations(
+            labels, profile['skin_types'].split(';'), [value for value in profile['improvements'].split(';') if value],
+            [profile['min_price'], profile['max_price']], profile['age'], profile['uv_index_max'],
+            cache=RecommendationCache(), catalog=catalog)
+        mine = scored[(scored['user_id'] == profile['user_id']) & (scored['kind'] == 'sunscreen')]
+        assert mine['URL'].tolist() == sunscreens['URL'].tolist()
+
+def test_score_profiles_without_matches(catalog):
+    profiles = random_profiles(catalog, 3, seed=3).assign(labels='Unknown')
+    scored = score_profiles(profiles, catalog)
+    assert scored.empty and list(scored.columns[:4]) == ['user_id', 'kind', 'label', 'rank']
+
+# The first k matching columns of a row with distinct names, read one by one
+def first_k_distinct_loop(mask, name_codes, k):
+    rows, cols = [], []
+    for row in range(len(mask)):
+        seen = set()
+        for col in np.flatnonzero(mask[row]):
+            if name_codes[col] not in seen and len(seen) < k:
+                seen.add(name_codes[col])
+                rows.append(row)
+                cols.append(col)
+    return rows, cols
+
+def test_first_k_distinct_skips_duplicate_names():
+    name_codes = np.array([0, 0, 0, 0, 1, 0, 2, 1, 3, 4, 5])
+    mask = np.array([
+        [True] * 11,
+        [True, True, True, True, False, True, False, True, True, True, True],
+        [False] * 11,
+        [True, True, False, False, False, False, False, False, False, False, False],
+    ])
+    rows, cols = first_k_distinct(mask, name_codes, 3)
+    assert rows.tolist() == [0, 0, 0, 1, 1, 1, 3]
+    assert cols.tolist() == [0, 4, 6, 0, 7, 8, 0]
+
+@pytest.mark.parametrize('k', [1, 3, 5])
+def test_first_k_distinct_agrees_with_loop(k):
+    rng = np.random.default_rng(4)
+    mask = rng.random((200, 60)) < rng.random((200, 1))
+    name_codes = rng.integers(0, 12, 60)
+    rows, cols = first_k_distinct(mask, name_codes, k)
+    assert (rows.tolist(), cols.tolist()) == first_k_distinct_loop(mask, name_codes, k)
+    assert first_k_distinct(mask[:, :0], name_codes[:0], k)[0].tolist() == []
@@ -0,0 +1,16 @@
+from concurrent.futures import ThreadPoolExecutor
+from plots.figure_cache import _write_atomic
+
+def test_threads_writing_the_same_figure(tmp_path):
+    path = str(tmp_path / 'figure.png')
+    payloads = [bytes([thread]) * 4096 for thread in range(4)]
+
+    def write_many(data):
+        for _ in range(300):
+            _write_atomic(path, data)
+
+    with ThreadPoolExecutor(4) as executor:
+        list(executor.map(write_many, payloads))  # Re-raises the first failed write
+    with open(path, 'rb') as f:
+        assert f.read() in payloads
+    assert [file.name for file in tmp_path.iterdir()] == ['figure.png']
@@ -0,0 +1,37 @@
+import random
+import pytest
+from processing import ingredient_matcher
+from processing.ingredient_matcher import IngredientMatcher
+
+# Run every test with pyahocorasick (when installed) and with the pure-Python automaton
+@pytest.fixture(params=['pyahocorasick', 'python'])
+def backend(request, monkeypatch):
+    if request.param == 'pyahocorasick':
+        if ingredient_matcher.ahocorasick is None:
+            pytest.skip("pyahocorasick is not installed")
+    else:
+        monkeypatch.setattr(ingredient_matcher, 'ahocorasick', None)
+    return request.param
+
+def test_find_agrees_with_substring_checks(backend):
+    rng = random.Random(1)
+    patterns = ['retinol', 'retinyl palmitate', 'acid', 'salicylic acid', 'lactic acid', 'ac', 'c', 'niacinamide']
+    matcher = IngredientMatcher(patterns)
+    alphabet = 'acdeilmnoprtsy ,'
+    texts = [''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 40))) for _ in range(200)]
+    texts += ['Water, Salicylic Acid, Retinyl Palmitate', 'NIACINAMIDE', '']
+    for text in texts:
+        assert matcher.find(text) == {pattern for pattern in patterns if pattern in text.lower()}
+
+def test_patterns_are_case_insensitive(backend):
+    matcher = IngredientMatcher(['Lead Acetate', 'lead acetate', 'ACETATE'])
+    assert matcher.patterns == ['lead acetate', 'acetate']
+    assert matcher.find('Water, LEAD ACETATE') == {'lead acetate', 'acetate'}
+
+def test_empty_pattern_occurs_in_every_text(backend):
+    matcher = IngredientMatcher(['', 'zinc'])
+    assert matcher.find('') == {''}
+    assert matcher.find('zinc oxide') == {'', 'zinc'}
+
+def test_matcher_without_patterns(backend):
+    assert IngredientMatcher([]).find('water') == set()
@@ -0,0 +1,74 @@
+import os
+import pandas as pd
+import pytest
+import instrumentation
+from instrumentation import MetricsRecorder, capture_spans, instrumented, set_span_rows, span
+from processing.process_data import process_and_merge_data
+from storage import read_dataset, write_dataset
+
+@pytest.fixture
+def recorder(monkeypatch):
+    recorder = MetricsRecorder(path=None)
+    monkeypatch.setattr(instrumentation, '_recorder', recorder)
+    return recorder
+
+def test_spans_nest_and_count_rows(recorder):
+    @instrumented(rows_in=len, rows_out=len)
+    def keep_even(values):
+        set_span_rows(rows_in=len(values))
+        return [value for value in values if value % 2 == 0]
+
+    with capture_spans() as records:
+        with span('request') as request:
+            keep_even(list(range(10)))
+            request.rows_out = 5
+    assert [(record['name'], record['parent'], record['depth']) for record in records] == \
+        [('keep_even', 'request', 1), ('request', None, 0)]
+    assert (records[0]['rows_in'], records[0]['rows_out'], records[1]['rows_out']) == (10, 5, 5)
+    assert recorder.snapshot()['keep_even'].count == 1
+
+def test_failed_span_is_recorded(recorder):
+    with pytest.raises(KeyError):
+        with span('lookup'):
+            raise KeyError('missing')
+    assert recorder.snapshot()['lookup'].errors == 1
+    assert 'skinwiz_span_errors_total{span="lookup"} 1' in instrumentation.prometheus_text()
+
+def test_disabled_spans_take_rows_and_record_nothing(recorder, monkeypatch):
+    monkeypatch.setattr(instrumentation, 'instrumentation_enabled', False)
+    with capture_spans() as records:
+        with span('load', rows_in=3) as current:
+            assert (current.rows_in, current.rows_out) == (3, None)
+            current.rows_out = current.rows_in + 1
+        with span('load') as current:
+            assert (current.rows_in, current.rows_out) == (None, None)
+        assert instrumented(rows_out=len)(lambda: [1, 2])() == [1, 2]
+    assert records == [] and recorder.snapshot() == {}
+
+def test_merge_with_instrumentation_disabled(tmp_path, monkeypatch, recorder):
+    monkeypatch.setattr(instrumentation, 'instrumentation_enabled', False)
+    monkeypatch.chdir(tmp_path)
+    skincare = pd.DataFrame({
+        'Label': ['moisturizer', 'cleanser'], 'Brand': ['la mer', 'clinique'],
+        'Name': ['the moisturizing soft cream', 'liquid facial soap'], 'Price': [175, 19], 'Rank': [4.1, 4.0],
+        'Ingredients': ['algae extract, glycerin', 'water, niacinamide'],
+        'Combination': [1, 0], 'Dry': [1, 1], 'Normal': [1, 1], 'Oily': [1, 0], 'Sensitive': [0, 1],
+    })
+    amazon = pd.DataFrame({
+        'Product': ['LA MER The Moisturizing Soft Cream SPF 30', 'Clinique Liquid Facial Soap Mild', 'Unrelated Brush'],
+        'Review Count': [120, 3400, 10], 'Price': ['$175.00', '$19.00', '$5.00'],
+        'URL': ['https://www.amazon.com/dp/1', 'https://www.amazon.com/dp/2', 'https://www.amazon.com/dp/3'],
+        'Rating': [4.5, 4.7, 3.0],
+    })
+    banned = pd.DataFrame({'Name': ['lead acetate'], 'EC No.': ['206-104-4'], 'CAS No.': ['301-04-2'],
+                           'Restriction(s)': ['Not permitted for all products']})
+    write_dataset(skincare, 'datasets/cleaned/skincare_ingredients.csv', 'skincare_ingredients')
+    write_dataset(amazon, 'datasets/cleaned/amazon_data.csv', 'amazon_data')
+    write_dataset(banned, 'datasets/cleaned/banned_skincare_ings.csv', 'banned_skincare_ings')
+
+    process_and_merge_data(workers=1)
+    merged = read_dataset('datasets/merged/merged_data.csv', 'merged_data').sort_values('URL')
+    assert merged['URL'].tolist() == ['https://www.amazon.com/dp/1', 'https://www.amazon.com/dp/2']
+    assert merged['SPF'].tolist() == [30, 0]
+    assert merged['Brightening'].tolist() == [0, 1]
+    assert not os.path.exists('datasets/metrics')
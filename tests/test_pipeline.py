@@ -0,0 +1,42 @@
+from pipeline import Stage, file_hash, is_stale
+
+def write(path, text):
+    path.write_text(text)
+    return str(path)
+
+# The fingerprints run_pipeline records after a stage ran
+def fingerprints(stage):
+    return {'inputs': {path: file_hash(path) for path in stage.inputs},
+            'outputs': {path: file_hash(path) for path in stage.outputs}}
+
+def test_stage_is_fresh_until_an_input_or_output_changes(tmp_path):
+    source = write(tmp_path / 'raw.csv', 'a,b\n1,2\n')
+    output = write(tmp_path / 'cleaned.csv', 'a\n1\n')
+    stage = Stage('clean', 'module:function', inputs=[source], outputs=[output])
+    stage_state = fingerprints(stage)
+    assert not is_stale(stage, stage_state)
+
+    write(tmp_path / 'raw.csv', 'a,b\n1,3\n')
+    assert is_stale(stage, stage_state)
+    stage_state = fingerprints(stage)
+
+    # An output edited or deleted outside the pipeline is rebuilt
+    write(tmp_path / 'cleaned.csv', 'a\n2\n')
+    assert is_stale(stage, stage_state)
+    (tmp_path / 'cleaned.csv').unlink()
+    assert is_stale(stage, fingerprints(stage))
+
+def test_stage_without_recorded_state_is_stale(tmp_path):
+    stage = Stage('clean', 'module:function', inputs=[write(tmp_path / 'raw.csv', '1')],
+                  outputs=[write(tmp_path / 'cleaned.csv', '1')])
+    assert is_stale(stage, None)
+    assert is_stale(stage, {})
+
+def test_source_stage_only_reruns_on_refresh_or_missing_output(tmp_path):
+    output = tmp_path / 'scraped.csv'
+    stage = Stage('scrape', 'module:function', inputs=[], outputs=[str(output)], source=True)
+    assert is_stale(stage, None)
+
+    write(output, 'scraped')
+    assert not is_stale(stage, None)
+    assert is_stale(stage, None, refresh_sources=True)
@@ -0,0 +1,62 @@
+import random
+import pandas as pd
+import pytest
+from processing.process_data import extract_attributes, load_concern_rules, spf_pattern
+
+def test_load_concern_rules():
+    rules = load_concern_rules()
+    assert list(rules) == ['Acne', 'Brightening', 'Hydration', 'Anti_Aging']
+    # 'vitamin-c' and 'niacinamide' are two rules, not one 'vitamin-cniacinamide' pattern
+    assert rules['Brightening'] == ['vitamin c', 'vitamin-c', 'niacinamide', 'alpha-arbutin']
+    assert 'retinol' in rules['Acne'] and 'retinol' in rules['Anti_Aging']
+
+def test_load_concern_rules_normalizes_ingredients(tmp_path):
+    path = tmp_path / 'rules.csv'
+    path.write_text('concern,ingredient\nAcne, Retinol \nAcne,retinol\nHydration,Glycerin\n')
+    assert load_concern_rules(str(path)) == {'Acne': ['retinol'], 'Hydration': ['glycerin']}
+
+@pytest.mark.parametrize('text, message', [
+    ('concern,ingredients\nAcne,retinol\n', 'must have the columns concern,ingredient'),
+    ('concern,ingredient\nAcne,retinol\nHydration,\n', 'line 3: every rule needs a concern and an ingredient'),
+    ('concern,ingredient\n ,retinol\n', 'line 2'),
+])
+def test_load_concern_rules_rejects_bad_tables(tmp_path, text, message):
+    path = tmp_path / 'rules.csv'
+    path.write_text(text)
+    with pytest.raises(ValueError, match=message):
+        load_concern_rules(str(path))
+
+# The per-row extraction that extract_attributes replaced: the highest SPF of the two names, and a concern for any of
+# its ingredients in the ingredient list
+def extract_attributes_per_row(df, concern_rules):
+    rows = []
+    for brand_name, product, ingredients in zip(df['Brand_Name'], df['Product'], df['Ingredients']):
+        matches = [spf_pattern.search(text) for text in (brand_name, product) if isinstance(text, str)]
+        spfs = [int(match.group(1)) for match in matches if match]
+        text = ingredients.lower() if isinstance(ingredients, str) else ''
+        flags = [int(any(ingredient in text for ingredient in concern_ingredients))
+                 for concern_ingredients in concern_rules.values()]
+        rows.append([max(spfs, default=0)] + flags)
+    return pd.DataFrame(rows, columns=['SPF'] + list(concern_rules), index=df.index)
+
+def test_extract_attributes_matches_per_row_extraction():
+    rng = random.Random(0)
+    concern_rules = load_concern_rules()
+    words = ['water', 'Glycerin', 'Niacinamide', 'VITAMIN-C', 'vitamin c', 'peptides', 'Retinol', 'alcohol', 'ceramide np']
+    names = ['clinique moisture surge', 'supergoop spf 40 sunscreen', 'la roche-posay SPF50 fluid', 'spf',
+             'dual spf 15 and spf 30', None]
+    df = pd.DataFrame({
+        'Brand_Name': [rng.choice(names) for _ in range(300)],
+        'Product': [rng.choice(names) for _ in range(300)],
+        'Ingredients': [', '.join(rng.sample(words, rng.randint(0, 4))) if rng.random() < 0.95 else None
+                        for _ in range(300)],
+    }, index=range(100, 400))
+
+    attributes = extract_attributes(df, concern_rules)
+    pd.testing.assert_frame_equal(attributes, extract_attributes_per_row(df, concern_rules))
+
+def test_niacinamide_is_brightening():
+    df = pd.DataFrame({'Brand_Name': ['the ordinary niacinamide 10%'], 'Product': ['The Ordinary Serum'],
+                       'Ingredients': ['Aqua, Niacinamide, Pentylene Glycol']})
+    attributes = extract_attributes(df, load_concern_rules())
+    assert attributes.iloc[0].to_dict() == {'SPF': 0, 'Acne': 0, 'Brightening': 1, 'Hydration': 0, 'Anti_Aging': 0}
@@ -0,0 +1,21 @@
+import random
+from processing.product_matcher import build_token_index, match_token_set
+
+# The subset scan over every Amazon row that the inverted index replaced
+def subset_loop(query_set, token_sets):
+    return [row_id for row_id, token_set in enumerate(token_sets) if query_set.issubset(token_set)]
+
+def test_match_token_set_agrees_with_subset_loop():
+    rng = random.Random(0)
+    vocabulary = [f"t{i}" for i in range(30)]
+    token_sets = [set(rng.sample(vocabulary, rng.randint(0, 8))) for _ in range(300)]
+    token_index = build_token_index(token_sets)
+
+    queries = [set(rng.sample(vocabulary, rng.randint(0, 4))) for _ in range(300)]
+    queries += [{'unknown'}, {'t1', 'unknown'}, set(token_sets[0]), set()]
+    for query_set in queries:
+        assert match_token_set(query_set, token_index, len(token_sets)) == subset_loop(query_set, token_sets)
+
+def test_empty_query_matches_every_row():
+    token_sets = [{'a'}, set(), {'b', 'c'}]
+    assert match_token_set(set(), build_token_index(token_sets), len(token_sets)) == [0, 1, 2]
@@ -0,0 +1,37 @@
+import re
+import pytest
+from service import ProfileError, parse_profile
+
+def profile(**fields):
+    base = {'labels': ['Moisturizer'], 'skin_types': ['Dry'], 'improvements': ['Hydration'], 'max_price': 100, 'age': 25,
+            'uv_index_max': 6}
+    base.update(fields)
+    return {key: value for key, value in base.items() if value is not None}
+
+def test_parse_profile():
+    assert parse_profile(profile()) == (['Moisturizer'], ['Dry'], ['Hydration'], [0, 100.0], 25, 6.0)
+    assert parse_profile(profile(max_price=None, price_range=[10, '50'], improvements=None, age='40'))[2:5] == \
+        ([], [10.0, 50.0], 40)
+
+@pytest.mark.parametrize('fields, message', [
+    ({'labels': []}, "'labels' must not be empty"),
+    ({'labels': None}, "'labels' must not be empty"),
+    ({'labels': 'Moisturizer'}, "'labels' must be a list of strings"),
+    ({'skin_types': ['Dry', 3]}, "'skin_types' must be a list of strings"),
+    ({'improvements': {'Hydration': 1}}, "'improvements' must be a list of strings"),
+    ({'max_price': 'cheap'}, "'price_range' must be [min, max]"),
+    ({'price_range': [10]}, "'price_range' must be [min, max]"),
+    ({'price_range': 50}, "'price_range' must be [min, max]"),
+    ({'age': 'old'}, "'age' an integer"),
+    ({'uv_index_max': 'high'}, "'uv_index_max' must be a number"),
+    ({'uv_index_max': None}, "Either 'uv_index_max' or a configured 'city' is required"),
+    ({'uv_index_max': None, 'city': 'Atlantis'}, "Either 'uv_index_max' or a configured 'city' is required"),
+])
+def test_parse_profile_errors(fields, message):
+    with pytest.raises(ProfileError, match=re.escape(message)):
+        parse_profile(profile(**fields))
+
+@pytest.mark.parametrize('value', [None, [], 'profile'])
+def test_profile_must_be_an_object(value):
+    with pytest.raises(ProfileError, match="A profile must be a JSON object"):
+        parse_profile(value)
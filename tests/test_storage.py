@@ -0,0 +1,73 @@
+import pandas as pd
+import pytest
+import storage
+from storage import DatasetWriter, read_dataset, write_dataset
+
+# Run every test with Parquet storage (when pyarrow is installed) and with the CSV files as the storage
+@pytest.fixture(params=['parquet', 'csv'])
+def storage_format(request, monkeypatch):
+    if request.param == 'parquet' and storage.pq is None:
+        pytest.skip("pyarrow is not installed")
+    monkeypatch.setattr(storage, 'dataset_storage_format', request.param)
+    return request.param
+
+def skincare_frame():
+    return pd.DataFrame({
+        'Label': ['Moisturizer', 'Cleanser', 'Moisturizer'],
+        'Brand': ['LA MER', 'CLINIQUE', 'TATCHA'],
+        'Name': ['Crème de la Mer', 'Liquid Facial Soap', 'The Water Cream'],
+        'Price': [175, 19.5, 68],
+        'Rank': [4.1, 4.0, 4.2],
+        'Ingredients': ['Algae Extract, Glycerin', 'Water, Sodium Laurate', None],
+        'Combination': [1, 0, 1], 'Dry': [1, 1, 0], 'Normal': [1, 1, 1], 'Oily': [1, 0, 1], 'Sensitive': [0, 0, 1],
+    })
+
+def test_round_trip_applies_the_schema(tmp_path, storage_format):
+    path = str(tmp_path / 'cleaned' / 'skincare_ingredients.csv')
+    stored = write_dataset(skincare_frame(), path, 'skincare_ingredients')
+    assert stored.endswith('.parquet' if storage_format == 'parquet' else '.csv')
+
+    df = read_dataset(path, 'skincare_ingredients')
+    for col, dtype in storage.schemas['skincare_ingredients'].items():
+        if dtype == 'string':
+            assert pd.api.types.is_string_dtype(df[col]), col
+        else:
+            assert str(df[col].dtype) == dtype, col
+    assert df['Price'].tolist() == [175.0, 19.5, 68.0]
+    assert df['Name'].tolist() == skincare_frame()['Name'].tolist()
+    assert df['Ingredients'].isna().tolist() == [False, False, True]
+    assert df['Dry'].tolist() == [1, 1, 0]
+
+    df = read_dataset(path, 'skincare_ingredients', columns=['Name', 'Price'])
+    assert list(df.columns) == ['Name', 'Price']
+
+def test_csv_copy_keeps_the_source_number_format(tmp_path, storage_format):
+    path = tmp_path / 'skincare_ingredients.csv'
+    write_dataset(skincare_frame(), str(path), 'skincare_ingredients')
+    rows = path.read_text().splitlines()
+    assert rows[0] == 'Label,Brand,Name,Price,Rank,Ingredients,Combination,Dry,Normal,Oily,Sensitive'
+    assert rows[1] == 'Moisturizer,LA MER,Crème de la Mer,175,4.1,"Algae Extract, Glycerin",1,1,1,1,0'
+    assert rows[2].split(',')[3:5] == ['19.5', '4.0']
+
+def test_batches_and_empty_datasets(tmp_path, storage_format):
+    path = str(tmp_path / 'skincare_ingredients.csv')
+    df = skincare_frame()
+    with DatasetWriter(path, 'skincare_ingredients', df.columns) as writer:
+        writer.write(df.iloc[:2])
+        writer.write(df.iloc[2:])
+    assert writer.rows_written == 3
+    assert read_dataset(path, 'skincare_ingredients')['Brand'].tolist() == ['LA MER', 'CLINIQUE', 'TATCHA']
+
+    write_dataset(df.iloc[:0], path, 'skincare_ingredients')
+    empty = read_dataset(path, 'skincare_ingredients')
+    assert len(empty) == 0 and list(empty.columns) == list(df.columns)
+
+def test_failed_write_leaves_the_previous_dataset(tmp_path, storage_format):
+    path = str(tmp_path / 'skincare_ingredients.csv')
+    write_dataset(skincare_frame(), path, 'skincare_ingredients')
+    with pytest.raises(RuntimeError):
+        with DatasetWriter(path, 'skincare_ingredients', skincare_frame().columns) as writer:
+            writer.write(skincare_frame().iloc[:1])
+            raise RuntimeError("interrupted")
+    assert len(read_dataset(path, 'skincare_ingredients')) == 3
+    assert not [name for name in (tmp_path).iterdir() if name.suffix == '.tmp']
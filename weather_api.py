@@ -2,11 +2,23 @@
 weather_api.py
 
 This module handles fetching weather data, including the UV index, and calculating SPF recommendations based on the UV index using external API data.
+Readings come from a weather provider (Open-Meteo over a pooled HTTP session, or a local stub that needs no network)
+and are cached per city for the current local date, so most page renders never wait on the API.
 
 '''
 
+import asyncio
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
 import requests
-from config import cities, api_url
+from requests.adapters import HTTPAdapter
+from config import (cities, api_url, weather_provider, weather_request_timeout, weather_cache_ttl, weather_timezone,
+                    weather_table_path)
+from instrumentation import instrumented
 
 # SPF recommendation logic
 def get_spf_recommendation(uv_index_max):
@@ -21,27 +33,242 @@ def get_spf_recommendation(uv_index_max):
     else:
         return 50
 
-# Fetch weather data from API for the selected city using its latitude and longitude
-def get_weather_data(selected_city):
-    latitude = cities[selected_city]['latitude']
-    longitude = cities[selected_city]['longitude']
-    
-    params = {
-        "latitude": latitude,
-        "longitude": longitude,
-        "current_weather": "true",
-        "daily": "uv_index_max",
-        "timezone": "America/New_York"
-    }
-    
-    response = requests.get(api_url, params=params)
-    
-    if response.status_code == 200:
+
+class OpenMeteoProvider:
+    """Fetches the current temperature and today's maximum UV index from Open-Meteo, reusing pooled connections."""
+
+    def __init__(self, timeout=weather_request_timeout, pool_size=len(cities)):
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=2)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    # Return (current_temperature, uv_index_max) for a configured city, raising on any failure
+    def fetch(self, selected_city):
+        params = {
+            "latitude": cities[selected_city]['latitude'],
+            "longitude": cities[selected_city]['longitude'],
+            "current_weather": "true",
+            "daily": "uv_index_max",
+            "timezone": weather_timezone
+        }
+
+        response = self.session.get(api_url, params=params, timeout=self.timeout)
+        response.raise_for_status()
+
         weather_data = response.json()
-        current_temperature = weather_data['current_weather']['temperature']
-        uv_index_max = weather_data['daily']['uv_index_max'][0]
-        recommended_spf = get_spf_recommendation(uv_index_max)
-        return current_temperature, uv_index_max, recommended_spf
-    else:
-        print(f"Failed to get data: {response.status_code}")
+        return weather_data['current_weather']['temperature'], weather_data['daily']['uv_index_max'][0]
+
+    # Return {city: (current_temperature, uv_index_max)} for many cities with a single request
+    def fetch_many(self, city_names):
+        city_names = list(city_names)
+        params = {
+            "latitude": ",".join(str(cities[city]['latitude']) for city in city_names),
+            "longitude": ",".join(str(cities[city]['longitude']) for city in city_names),
+            "current_weather": "true",
+            "daily": "uv_index_max",
+            "timezone": weather_timezone
+        }
+
+        response = self.session.get(api_url, params=params, timeout=self.timeout)
+        response.raise_for_status()
+
+        # Open-Meteo answers a list of locations with a list of results in the same order
+        weather_data = response.json()
+        if isinstance(weather_data, dict):
+            weather_data = [weather_data]
+        return {city: (data['current_weather']['temperature'], data['daily']['uv_index_max'][0])
+                for city, data in zip(city_names, weather_data)}
+
+
+class StubWeatherProvider:
+    """Serves fixed readings without any network access, for offline development and demos."""
+
+    def __init__(self, readings=None, default=(20.0, 6.0)):
+        self.readings = readings or {}
+        self.default = default
+
+    def fetch(self, selected_city):
+        if selected_city not in cities:
+            raise KeyError(selected_city)
+        return self.readings.get(selected_city, self.default)
+
+    def fetch_many(self, city_names):
+        return {city: self.fetch(city) for city in city_names}
+
+
+# Read the city -> (temperature, uv_index_max, recommended_spf) table written by the last bulk refresh
+def load_weather_table(table_path=weather_table_path):
+    try:
+        with open(table_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+# Atomically write the weather table so readers never see a half-written file
+def write_weather_table(table, table_path=weather_table_path):
+    os.makedirs(os.path.dirname(table_path), exist_ok=True)
+    tmp_path = f"{table_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(table, f, indent=1)
+    os.replace(tmp_path, table_path)
+
+
+class WeatherCache:
+    """Per-city cache of readings for the current local date, with stale-while-revalidate refreshes."""
+
+    def __init__(self, provider, ttl=weather_cache_ttl, timezone=weather_timezone, table_path=weather_table_path):
+        self.provider = provider
+        self.ttl = ttl
+        self.timezone = ZoneInfo(timezone)
+        self.table_path = table_path
+        self._entries = {}  # city -> (local date, fetched at, temperature, uv index)
+        self._table_state = None  # (local date, table file mtime) the table was last read for
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def _local_date(self):
+        return datetime.now(self.timezone).date()
+
+    # Seed the cache from the precomputed weather table if it was written today, reading it again whenever the file
+    # changes (e.g. after a scheduled refresh later the same day)
+    def _load_table(self, today):
+        try:
+            mtime = os.stat(self.table_path).st_mtime_ns
+        except OSError:
+            return
+        with self._lock:
+            if self._table_state == (today, mtime):
+                return
+            self._table_state = (today, mtime)
+        table = load_weather_table(self.table_path)
+        if table.get('date') != today.isoformat():
+            return
+        with self._lock:
+            for selected_city, reading in table['cities'].items():
+                entry = self._entries.get(selected_city)
+                if entry is None or entry[1] < table['fetched_at']:
+                    self._entries[selected_city] = (today, table['fetched_at'], reading['temperature'], reading['uv_index_max'])
+
+    # Fetch a city from the provider and store the reading
+    def refresh(self, selected_city):
+        temperature, uv_index_max = self.provider.fetch(selected_city)
+        with self._lock:
+            self._entries[selected_city] = (self._local_date(), time.time(), temperature, uv_index_max)
+        return temperature, uv_index_max
+
+    # Fetch every city with one bulk request and publish the city -> (temperature, UV, SPF) table
+    def refresh_all(self, city_names=None):
+        readings = self.provider.fetch_many(list(city_names or cities))
+        today, fetched_at = self._local_date(), time.time()
+        with self._lock:
+            for selected_city, (temperature, uv_index_max) in readings.items():
+                self._entries[selected_city] = (today, fetched_at, temperature, uv_index_max)
+
+        table = {
+            'date': today.isoformat(),
+            'fetched_at': fetched_at,
+            'cities': {selected_city: {'temperature': temperature,
+                                       'uv_index_max': uv_index_max,
+                                       'recommended_spf': get_spf_recommendation(uv_index_max)}
+                       for selected_city, (temperature, uv_index_max) in readings.items()}
+        }
+        write_weather_table(table, self.table_path)
+        return table
+
+    def _refresh_in_background(self, selected_city):
+        def run():
+            try:
+                self.refresh(selected_city)
+            except Exception as e:
+                print(f"Background weather refresh failed for {selected_city}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(selected_city)
+
+        with self._lock:
+            if selected_city in self._refreshing:
+                return
+            self._refreshing.add(selected_city)
+        threading.Thread(target=run, daemon=True).start()
+
+    # Return (temperature, uv_index_max), serving cached readings whenever they are for today
+    def get(self, selected_city):
+        today = self._local_date()
+        self._load_table(today)
+        with self._lock:
+            entry = self._entries.get(selected_city)
+
+        if entry is not None and entry[0] == today:
+            # Today's reading past its TTL is still served while a refresh runs in the background
+            if time.time() - entry[1] > self.ttl:
+                self._refresh_in_background(selected_city)
+            return entry[2], entry[3]
+
+        try:
+            return self.refresh(selected_city)
+        except Exception:
+            # Offline fallback: an older reading beats no reading at all
+            if entry is not None:
+                return entry[2], entry[3]
+            raise
+
+    # Warm the cache for every configured city (in a daemon thread unless background is False)
+    def prefetch(self, city_names=None, background=True):
+        city_names = list(city_names or cities)
+
+        def run():
+            try:
+                self.refresh_all(city_names)
+                return
+            except Exception as e:
+                print(f"Bulk weather prefetch failed, fetching cities one by one: {e}")
+            for selected_city in city_names:
+                try:
+                    self.refresh(selected_city)
+                except Exception as e:
+                    print(f"Weather prefetch failed for {selected_city}: {e}")
+
+        if not background:
+            run()
+            return None
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+
+# Build the provider selected in config.py
+def create_weather_provider(name=weather_provider):
+    if name == "stub":
+        return StubWeatherProvider()
+    if name == "open-meteo":
+        return OpenMeteoProvider()
+    raise ValueError(f"Unknown weather provider: {name}")
+
+weather_cache = WeatherCache(create_weather_provider())
+
+# Fetch weather data for the selected city, using the cached reading when it is fresh
+@instrumented()
+def get_weather_data(selected_city):
+    try:
+        current_temperature, uv_index_max = weather_cache.get(selected_city)
+    except requests.RequestException as e:
+        print(f"Failed to get data: {e}")
         return None, None, None
+
+    recommended_spf = get_spf_recommendation(uv_index_max)
+    return current_temperature, uv_index_max, recommended_spf
+
+# Async variant of get_weather_data for event-loop callers
+async def get_weather_data_async(selected_city):
+    return await asyncio.to_thread(get_weather_data, selected_city)
+
+# Warm the weather cache for all configured cities in the background
+def prefetch_weather_data():
+    return weather_cache.prefetch()
+
+# Refresh the weather table for all cities in one request (run on a schedule, e.g. from cron)
+if __name__ == "__main__":
+    weather_table = weather_cache.refresh_all()
+    print(f"Weather table for {weather_table['date']} saved to '{weather_cache.table_path}'")